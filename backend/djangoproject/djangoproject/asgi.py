@@ -1,14 +1,13 @@
 import os
 import django
-import sys
 import logging
 
-print("===== ASGI MODULE LOADING =====")
+logger = logging.getLogger(__name__)
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoproject.settings')
 django.setup()  # Set up Django before importing models
 
-print("===== DJANGO SETUP COMPLETE =====")
+logger.debug("Django setup complete")
 
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
@@ -16,10 +15,8 @@ from channels.security.websocket import AllowedHostsOriginValidator, OriginValid
 
 from tasks.routing import websocket_urlpatterns
 from tasks.middleware import JWTAuthMiddleware
-from tasks.consumers import TaskConsumer
 
-print("===== ASGI IMPORTS COMPLETE =====")
-print(f"WebSocket URL patterns: {websocket_urlpatterns}")
+logger.debug(f"WebSocket URL patterns: {websocket_urlpatterns}")
 
 # Initialize Django ASGI application
 django_asgi_app = get_asgi_application()
@@ -30,16 +27,12 @@ class DebugOriginValidator:
         self.application = application
         
     async def __call__(self, scope, receive, send):
-        if scope["type"] == "websocket":
+        if scope["type"] == "websocket" and logger.isEnabledFor(logging.DEBUG):
             headers = dict(scope.get("headers", []))
             origin = headers.get(b"origin", b"").decode()
             host = headers.get(b"host", b"").decode()
-            print(f"===== WEBSOCKET CONNECTION =====")
-            print(f"Origin: {origin}")
-            print(f"Host: {host}")
-            print(f"Path: {scope.get('path')}")
-            print(f"Query String: {scope.get('query_string')}")
-            sys.stdout.flush()
+            logger.debug(f"WebSocket connection: origin={origin} host={host} "
+                         f"path={scope.get('path')} query_string={scope.get('query_string')}")
         
         return await self.application(scope, receive, send)
 
@@ -54,5 +47,4 @@ application = ProtocolTypeRouter({
     ),
 })
 
-print("===== ASGI APPLICATION CONFIGURED =====")
-sys.stdout.flush()
\ No newline at end of file
+logger.debug("ASGI application configured")
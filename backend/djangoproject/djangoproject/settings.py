@@ -236,6 +236,39 @@ REDIS_PORT = CONFIG['redis']['port']
 REDIS_TASKS_QUEUE = CONFIG['redis']['channels']['tasks_queue']
 REDIS_RESULTS_QUEUE = CONFIG['redis']['channels']['results_queue']
 
+# Connection pool shared by every Redis client in the process
+REDIS_POOL = CONFIG['redis'].get('pool', {})
+
+# Wire codec for task and result envelopes
+CODEC = CONFIG.get('codec', {})
+
+# Out-of-band storage of large task results
+CLAIM_CHECK = CONFIG.get('claim_check', {})
+
+# Redis Streams ingestion (durable alternative to the tasks pub/sub channel)
+REDIS_STREAMS = CONFIG['redis'].get('streams', {})
+REDIS_STREAMS_ENABLED = REDIS_STREAMS.get('enabled', False)
+REDIS_TASKS_STREAM = REDIS_STREAMS.get('tasks_stream', 'tasks_stream')
+REDIS_STREAM_MAXLEN = REDIS_STREAMS.get('maxlen', 100000)
+
+# Queue-depth admission control shared with the daemon
+ADMISSION = CONFIG.get('admission', {})
+
+# How long Idempotency-Key headers are remembered, in seconds
+IDEMPOTENCY_TTL = CONFIG.get('idempotency', {}).get('ttl_s', 86400)
+
+# Priority lanes and deadlines for submitted tasks
+TASK_PRIORITY = CONFIG.get('priority', {})
+
+# Workflow DAGs run in the worker tier
+WORKFLOW = CONFIG.get('workflow', {})
+
+# Task ownership and cancellation
+CANCELLATION = CONFIG.get('cancellation', {})
+
+# WebSocket result delivery
+WEBSOCKET = CONFIG.get('websocket', {})
+
 CELERY_BROKER_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
 CELERY_RESULT_BACKEND = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
 CELERY_ACCEPT_CONTENT = ['json']
@@ -5,8 +5,11 @@ import sys
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.conf import settings
-from redis.asyncio import Redis
+from daemon.utils.redis_pool import get_async_redis
+from daemon.utils.codec import get_codec, user_results_channel
 from channels.layers import get_channel_layer
+from .views import cancel_task
+from .results_router import get_results_router
 
 logger = logging.getLogger(__name__)
 
@@ -89,51 +92,52 @@ class TaskConsumer(AsyncWebsocketConsumer):
                 logger.info(f"Redis settings: host={settings.REDIS_HOST}, port={settings.REDIS_PORT}")
                 logger.info(f"Redis results queue: {settings.REDIS_RESULTS_QUEUE}")
                 
-                # Send info to client
-                await self.send(text_data=json.dumps({
-                    "type": "info",
-                    "message": f"Connecting to Redis at {settings.REDIS_HOST}:{settings.REDIS_PORT}"
-                }))
-                
-                self.redis = Redis(
-                    host=settings.REDIS_HOST,
-                    port=settings.REDIS_PORT,
-                    decode_responses=True
-                )
-                logger.info(f"Redis connection established to {settings.REDIS_HOST}:{settings.REDIS_PORT}")
-                
-                # Send confirmation to client
-                await self.send(text_data=json.dumps({
-                    "type": "info",
-                    "message": "Redis connection established"
-                }))
-                
-                # Test Redis connection first
-                redis_test = await self.test_redis_connection()
-                if redis_test:
-                    logger.info("Redis connection test passed")
+                # Per-socket Redis round trips are diagnostics only: results come from the shared router
+                if settings.DEBUG:
+                    # Send info to client
                     await self.send(text_data=json.dumps({
                         "type": "info",
-                        "message": "Redis connection test successful"
+                        "message": f"Connecting to Redis at {settings.REDIS_HOST}:{settings.REDIS_PORT}"
                     }))
-                else:
-                    logger.warning("Redis connection test failed")
+                
+                    # Client on the process-wide pool, used for the connection test only
+                    self.redis = get_async_redis(
+                        settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_POOL, decode_responses=False
+                    )
+                    self.codec = get_codec(settings.CODEC)
+                    logger.info(f"Redis connection established to {settings.REDIS_HOST}:{settings.REDIS_PORT}")
+                
+                    # Send confirmation to client
                     await self.send(text_data=json.dumps({
-                        "type": "warning",
-                        "message": "Redis connection test failed"
+                        "type": "info",
+                        "message": "Redis connection established"
                     }))
                 
-                # Create PubSub instance
-                self.pubsub = self.redis.pubsub()
-                logger.info("Created Redis PubSub instance")
+                    # Test Redis connection first
+                    redis_test = await self.test_redis_connection()
+                    if redis_test:
+                        logger.info("Redis connection test passed")
+                        await self.send(text_data=json.dumps({
+                            "type": "info",
+                            "message": "Redis connection test successful"
+                        }))
+                    else:
+                        logger.warning("Redis connection test failed")
+                        await self.send(text_data=json.dumps({
+                            "type": "warning",
+                            "message": "Redis connection test failed"
+                        }))
                 
-                # Subscribe to Redis channel - this method IS awaitable
-                await self.pubsub.subscribe(settings.REDIS_RESULTS_QUEUE)
-                logger.info(f"Subscribed to Redis results queue: {settings.REDIS_RESULTS_QUEUE}")
+                # Results arrive through the subscription shared by every socket in this process
+                self.results_router = get_results_router()
+                await self.results_router.register(self.user_id, self)
+                logger.info(f"Registered with the results router for user {self.user_id}")
                 
-                # Start listening for messages in a background task
-                self.listen_task = asyncio.create_task(self.listen_to_redis())
-                logger.info("Started Redis listener task")
+                await self.send(text_data=json.dumps({
+                    "type": "info",
+                    "message": f"Subscribed to Redis queue: "
+                               f"{user_results_channel(settings.REDIS_RESULTS_QUEUE, self.user_id)}"
+                }))
             except Exception as e:
                 logger.error(f"Error setting up Redis connection: {str(e)}")
                 traceback.print_exc(file=sys.stderr)
@@ -158,22 +162,14 @@ class TaskConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         logger.info(f"WebSocket disconnect called with code: {close_code}")
         
-        # Clean up Redis resources
-        if hasattr(self, 'listen_task'):
-            logger.info("Cancelling Redis listener task")
-            self.listen_task.cancel()
-            try:
-                await self.listen_task
-            except asyncio.CancelledError:
-                pass
-            
-        if hasattr(self, 'pubsub'):
-            logger.info("Unsubscribing from Redis")
-            await self.pubsub.unsubscribe()
+        # Stop routing results to this socket
+        if hasattr(self, 'results_router'):
+            logger.info("Unregistering from the results router")
+            await self.results_router.unregister(self.user_id, self)
             
         if hasattr(self, 'redis'):
-            logger.info("Closing Redis connection")
-            await self.redis.close()
+            logger.info("Releasing Redis client")
+            await self.redis.aclose()
         
         # Clean up channel resources
         if hasattr(self, 'group_name') and hasattr(self, 'channel_name'):
@@ -186,146 +182,20 @@ class TaskConsumer(AsyncWebsocketConsumer):
             except Exception as e:
                 logger.error(f"Error removing from group: {str(e)}")
     
-    async def listen_to_redis(self):
-        """
-        Listen for messages on the Redis results queue and forward them to the WebSocket.
-        This connects Celery task results to the WebSocket client.
-        """
-        logger.info(f"Redis listener started for user {self.user_id}")
-        logger.info(f"Listening on queue: {settings.REDIS_RESULTS_QUEUE}")
-        
-        # Set up the pubsub if not already done
-        if not hasattr(self, 'pubsub') or self.pubsub is None:
-            logger.warning("PubSub not initialized, creating new one")
-            self.pubsub = self.redis.pubsub()
-            await self.pubsub.subscribe(settings.REDIS_RESULTS_QUEUE)
-            
-        # Send confirmation to the client
-        await self.send(text_data=json.dumps({
-            "type": "info",
-            "message": f"Subscribed to Redis queue: {settings.REDIS_RESULTS_QUEUE}"
-        }))
-        
-        msg_count = 0
-        heartbeat_count = 0
-        
-        try:
-            while True:
-                try:
-                    # Increment heartbeat counter
-                    heartbeat_count += 1
-                    
-                    # Every 100 iterations, send a heartbeat message to confirm the connection is active
-                    if heartbeat_count >= 100:  # Every ~10 seconds
-                        heartbeat_count = 0
-                        logger.info(f"Redis listener heartbeat for user {self.user_id}")
-                        await self.send(text_data=json.dumps({
-                            "type": "heartbeat",
-                            "message": "Redis listener still active"
-                        }))
-                    
-                    # get_message is awaitable in the async Redis client
-                    message = await self.pubsub.get_message(ignore_subscribe_messages=True)
-                    
-                    if message:
-                        msg_count += 1
-                        logger.info(f"Redis message received #{msg_count}: {message}")
-                        
-                        # Inform client about message type for debugging
-                        await self.send(text_data=json.dumps({
-                            "type": "debug",
-                            "message": f"Received Redis message type: {message['type']}"
-                        }))
-                        
-                        if message['type'] == 'message':
-                            data = message['data']
-                            logger.info(f"Message data: {data}")
-                            
-                            try:
-                                # Parse the JSON data
-                                parsed_data = json.loads(data)
-                                logger.info(f"Parsed message data: {parsed_data}")
-                                
-                                # Check if this message is for the current user
-                                message_user_id = parsed_data.get('user_id')
-                                logger.info(f"Message user_id: {message_user_id}, current user_id: {self.user_id}")
-                                
-                                # For debugging, send info about the message
-                                await self.send(text_data=json.dumps({
-                                    "type": "debug",
-                                    "message": f"Message for user: {message_user_id}, current user: {self.user_id}"
-                                }))
-                                
-                                # If the message is for this user or no user is specified, forward it
-                                if message_user_id is not None and str(message_user_id) == str(self.user_id):
-                                    logger.info(f"Forwarding message to user {self.user_id}")
-                                    
-                                    # Format the message as a task result
-                                    result_message = {
-                                        "type": "task_result",
-                                        "data": parsed_data
-                                    }
-                                    
-                                    # Send to WebSocket
-                                    await self.send(text_data=json.dumps(result_message))
-                                    
-                                    # Log success
-                                    logger.info(f"Message forwarded to user {self.user_id}")
-                                else:
-                                    logger.info(f"Ignoring message for user {message_user_id} (not for current user {self.user_id})")
-                            except json.JSONDecodeError:
-                                logger.error(f"Failed to decode JSON from Redis: {data}")
-                                await self.send(text_data=json.dumps({
-                                    "type": "error",
-                                    "message": f"Failed to decode Redis message: {data[:100]}"
-                                }))
-                            except Exception as e:
-                                logger.error(f"Error processing Redis message: {str(e)}")
-                                traceback.print_exc(file=sys.stderr)
-                                await self.send(text_data=json.dumps({
-                                    "type": "error",
-                                    "message": f"Error processing Redis message: {str(e)}"
-                                }))
-                    
-                except asyncio.CancelledError:
-                    logger.info("Redis listener cancelled")
-                    raise
-                except Exception as e:
-                    logger.error(f"Error in Redis listener loop: {str(e)}")
-                    traceback.print_exc(file=sys.stderr)
-                    
-                    # Inform client about the error
-                    await self.send(text_data=json.dumps({
-                        "type": "error",
-                        "message": f"Redis listener error: {str(e)}"
-                    }))
-                    
-                    # Pause briefly before continuing
-                    await asyncio.sleep(1)
-                    
-                # Small delay to prevent CPU hogging
-                await asyncio.sleep(0.1)
-                
-        except asyncio.CancelledError:
-            logger.info(f"Redis listener task cancelled for user {self.user_id}")
-            raise
-        except Exception as e:
-            logger.error(f"Fatal error in Redis listener: {str(e)}")
-            traceback.print_exc(file=sys.stderr)
-            
-            # Try to inform the client
-            try:
-                await self.send(text_data=json.dumps({
-                    "type": "error",
-                    "message": f"Redis listener fatal error: {str(e)}"
-                }))
-            except:
-                pass
-
     async def receive(self, text_data):
         logger.info(f"Received message from WebSocket: {text_data}")
         
         try:
+            try:
+                message = json.loads(text_data)
+            except ValueError:
+                message = None
+            
+            # {"action": "cancel", "task_id": ...} cancels a task submitted by this user
+            if isinstance(message, dict) and message.get("action") == "cancel":
+                await self.cancel(message.get("task_id"))
+                return
+            
             # Echo back for testing
             await self.send(text_data=json.dumps({
                 "type": "echo",
@@ -334,6 +204,23 @@ class TaskConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Error in receive: {str(e)}")
     
+    async def cancel(self, task_id):
+        """Cancel a task at the request of the connected user"""
+        # Ownership check and enqueue use the synchronous pooled client
+        cancelled = bool(task_id) and await asyncio.to_thread(cancel_task, self.user_id, str(task_id))
+        if cancelled:
+            await self.send(text_data=json.dumps({
+                "type": "cancel",
+                "task_id": task_id,
+                "status": "cancelling"
+            }))
+        else:
+            await self.send(text_data=json.dumps({
+                "type": "error",
+                "task_id": task_id,
+                "message": f"Unknown task: {task_id}"
+            }))
+    
     async def chat_message(self, event):
         """Handle messages sent to the group"""
         logger.info(f"Received group message: {event}")
@@ -375,7 +262,7 @@ class TaskConsumer(AsyncWebsocketConsumer):
             result = await self.redis.get(test_key)
             logger.info(f"Got Redis test value: {result}")
             
-            if result != test_value:
+            if result is None or result.decode() != test_value:
                 logger.error(f"Redis test value mismatch: expected {test_value}, got {result}")
                 await self.send(text_data=json.dumps({
                     "type": "warning",
@@ -396,10 +283,10 @@ class TaskConsumer(AsyncWebsocketConsumer):
                 "result": {"message": "Connection test"}
             }
             
-            # Publish a message to the results queue
-            json_message = json.dumps(test_message)
-            pub_result = await self.redis.publish(settings.REDIS_RESULTS_QUEUE, json_message)
-            logger.info(f"Published test message to {settings.REDIS_RESULTS_QUEUE}, result: {pub_result}")
+            # Publish a message to the user's results channel
+            channel = user_results_channel(settings.REDIS_RESULTS_QUEUE, self.user_id)
+            pub_result = await self.redis.publish(channel, self.codec.encode(test_message))
+            logger.info(f"Published test message to {channel}, result: {pub_result}")
             
             # Send confirmation to client
             await self.send(text_data=json.dumps({
@@ -0,0 +1,184 @@
+"""
+One results subscription per ASGI process, shared by every WebSocket it serves.
+
+Consumers register with the process-wide `ResultsRouter` instead of opening
+their own Redis subscription. Results are published to per-user channels
+(`results:<user_id>`), and the router holds a single pub/sub connection
+subscribed to the channels of the users connected to this process: it
+subscribes when a user's first socket registers and unsubscribes when the
+last one leaves. Redis therefore only sends a process the results of its
+own users. Each message is decoded once and handed to the sockets of its
+`user_id` through an in-process map; claim-checked results are fetched
+once per message, not once per socket.
+
+Delivery is push-driven: the listener blocks on the subscription's socket
+until Redis sends a message, so a result is forwarded as soon as it arrives
+and an idle process does not wake up for it at all. Heartbeats go to every
+socket from one timer per process, every `websocket.heartbeat_interval_s`.
+"""
+import asyncio
+import json
+import logging
+import sys
+import traceback
+from collections import defaultdict
+
+from django.conf import settings
+from daemon.utils.redis_pool import get_async_redis
+from daemon.utils.codec import get_codec, dumps_json, user_results_channel, CodecError
+from daemon.utils.claim_check import ClaimCheck
+
+logger = logging.getLogger(__name__)
+
+
+class ResultsRouter:
+    """Route results from one shared subscription to the local sockets of each user"""
+
+    def __init__(self):
+        # user_id (str) -> consumers connected to this process for that user
+        self.sockets = defaultdict(set)
+        self.redis = None
+        self.pubsub = None
+        self.listen_task = None
+        self.heartbeat_task = None
+        self.heartbeat_interval = settings.WEBSOCKET.get('heartbeat_interval_s', 10)
+        self.codec = get_codec(settings.CODEC)
+        self.claim_check = ClaimCheck(self.codec, settings=settings.CLAIM_CHECK)
+        self._lock = asyncio.Lock()
+
+    async def register(self, user_id, consumer):
+        """Deliver the results of a user to a consumer, subscribing to the user's channel on first use"""
+        user_id = str(user_id)
+        async with self._lock:
+            first_socket = not self.sockets[user_id]
+            self.sockets[user_id].add(consumer)
+            if self.listen_task is None or self.listen_task.done():
+                # Subscribes to the channels of every registered user, this one included
+                await self.start()
+            elif first_socket:
+                await self.pubsub.subscribe(user_results_channel(settings.REDIS_RESULTS_QUEUE, user_id))
+        logger.info(f"Registered socket for user {user_id} "
+                    f"({sum(len(sockets) for sockets in self.sockets.values())} sockets in this process)")
+
+    async def unregister(self, user_id, consumer):
+        """Stop delivering results to a consumer, unsubscribing after the user's last socket"""
+        user_id = str(user_id)
+        async with self._lock:
+            sockets = self.sockets.get(user_id)
+            if sockets is None:
+                return
+            sockets.discard(consumer)
+            if not sockets:
+                del self.sockets[user_id]
+                if self.pubsub is not None:
+                    await self.pubsub.unsubscribe(user_results_channel(settings.REDIS_RESULTS_QUEUE, user_id))
+
+    async def start(self):
+        """Open the shared subscription and start the listener and heartbeat timer
+
+        The listener is started after subscribing, since it reads from the
+        subscription's connection. After a failure, this resubscribes the users
+        whose sockets are still open.
+        """
+        # Results are codec-encoded bytes, so responses are not decoded to str.
+        # Only the listener reads from the subscription: without health checks,
+        # subscribe/unsubscribe from register() and unregister() send their
+        # command without reading a PING reply the listener is waiting for.
+        # Dead connections are still detected by TCP keepalive.
+        self.redis = get_async_redis(
+            settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_POOL, decode_responses=False,
+            health_check=False
+        )
+        self.pubsub = self.redis.pubsub()
+        await self.pubsub.subscribe(*(
+            user_results_channel(settings.REDIS_RESULTS_QUEUE, user_id) for user_id in self.sockets
+        ))
+        self.listen_task = asyncio.create_task(self.listen())
+        if self.heartbeat_interval and (self.heartbeat_task is None or self.heartbeat_task.done()):
+            self.heartbeat_task = asyncio.create_task(self.heartbeat())
+        logger.info("Results router started")
+
+    async def listen(self):
+        """Route each message of the shared subscription as soon as Redis pushes it"""
+        try:
+            while True:
+                try:
+                    # Blocks until a message arrives, without polling; keeps reading
+                    # while no user is subscribed, so later subscriptions are served
+                    message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                    if message and message['type'] == 'message':
+                        await self.route(message['data'])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error in results router: {str(e)}")
+                    traceback.print_exc(file=sys.stderr)
+                    # Pause briefly before reconnecting
+                    await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            logger.info("Results router cancelled")
+            raise
+
+    async def heartbeat(self):
+        """Tell every socket in this process that its results subscription is alive"""
+        frame = json.dumps({
+            "type": "heartbeat",
+            "message": "Redis listener still active"
+        })
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if self.listen_task is None or self.listen_task.done():
+                continue
+            sockets = [consumer for consumers in self.sockets.values() for consumer in consumers]
+            await asyncio.gather(*(consumer.send(text_data=frame) for consumer in sockets),
+                                 return_exceptions=True)
+
+    async def route(self, data):
+        """Decode a result once and send it to the sockets of the user it is addressed to"""
+        try:
+            parsed_data = self.codec.decode(data)
+        except CodecError as e:
+            logger.error(f"Failed to decode message from Redis: {e}")
+            return
+
+        user_id = parsed_data.get('user_id')
+        sockets = self.sockets.get(str(user_id)) if user_id is not None else None
+        if not sockets:
+            return
+
+        # Large results were stored once; fetch them only for users connected here
+        if 'claim_check' in parsed_data:
+            parsed_data = await self.resolve_claim_check(user_id, parsed_data)
+
+        frame = dumps_json({"type": "task_result", "data": parsed_data})
+        # Copy: sockets may disconnect while the frame is being sent
+        results = await asyncio.gather(
+            *(consumer.send(text_data=frame) for consumer in list(sockets)),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to forward result to a socket of user {user_id}: {result}")
+
+    async def resolve_claim_check(self, user_id, data):
+        """Replace a claim-check reference with the result it points to"""
+        reference = data.pop('claim_check')
+        result = await self.claim_check.fetch_async(self.redis, user_id, reference)
+        if result is None:
+            logger.warning(f"Claim-checked result {reference.get('id')} expired before delivery")
+            data['status'] = 'error'
+            data['error'] = "Result expired before it could be delivered"
+        else:
+            data['result'] = result
+        return data
+
+
+_router = None
+
+
+def get_results_router():
+    """Get the results router of this ASGI process"""
+    global _router
+    if _router is None:
+        _router = ResultsRouter()
+    return _router
@@ -1,13 +1,44 @@
 from rest_framework import serializers
 
-class GenerateRandomNumberSerializer(serializers.Serializer):
-    """Serializer for generating random number task request"""
-    min_value = serializers.IntegerField(default=1)
-    max_value = serializers.IntegerField(default=100)
-
-class ReverseStringSerializer(serializers.Serializer):
-    """Serializer for reversing a string task request"""
-    text = serializers.CharField(max_length=1000)
+from daemon.tasks.registry import TASK_REGISTRY
+
+
+def build_param_field(param):
+    """Build the DRF field matching a task parameter declaration"""
+    kwargs = {}
+    if param.required:
+        kwargs['required'] = True
+    else:
+        kwargs['default'] = param.default
+    if param.description:
+        kwargs['help_text'] = param.description
+    
+    if param.type == 'integer':
+        if param.min_value is not None:
+            kwargs['min_value'] = param.min_value
+        if param.max_value is not None:
+            kwargs['max_value'] = param.max_value
+        return serializers.IntegerField(**kwargs)
+    
+    if param.max_length is not None:
+        kwargs['max_length'] = param.max_length
+    return serializers.CharField(**kwargs)
+
+
+def build_task_serializer(spec):
+    """Generate the request serializer for a task declared in the registry"""
+    # e.g. reverse_string -> ReverseStringSerializer
+    class_name = ''.join(part.title() for part in spec.name.split('_')) + 'Serializer'
+    attrs = {param.name: build_param_field(param) for param in spec.params}
+    attrs['__doc__'] = f"Serializer for {spec.name} task request"
+    return type(class_name, (serializers.Serializer,), attrs)
+
+
+# Task serializers - maps task_type to its generated serializer class
+TASK_SERIALIZERS = {
+    task_type: build_task_serializer(spec)
+    for task_type, spec in TASK_REGISTRY.items()
+}
 
 class TaskResponseSerializer(serializers.Serializer):
     """Serializer for task responses"""
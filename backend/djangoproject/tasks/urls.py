@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import TaskDispatcherView, TasksInfoView, test_redis_publish
+from .views import TaskCancelView, TaskDispatcherView, TasksInfoView, WorkflowView, test_redis_publish
 from .diagnostic_views import websocket_diagnostics, test_channel_layer
 
 urlpatterns = [
@@ -11,6 +11,12 @@ urlpatterns = [
     path('test-channel/', test_channel_layer, name='test-channel'),
     path('test-redis/', test_redis_publish, name='test-redis'),
     
+    # Workflow DAGs of registered tasks
+    path('workflow/', WorkflowView.as_view(), name='workflow'),
+    
+    # Cancel a submitted task or workflow by id
+    path('<str:task_id>/cancel/', TaskCancelView.as_view(), name='task-cancel'),
+    
     # Generic task dispatcher - handles all task types
     # Note: This must be last as it's a catch-all pattern
     path('<str:task_type>/', TaskDispatcherView.as_view(), name='task-dispatcher'),
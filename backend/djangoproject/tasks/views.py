@@ -1,38 +1,118 @@
-import json
+import time
+import uuid
 from django.conf import settings
 from rest_framework import status, views
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
-import redis
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import logging
 import traceback
 import sys
 
+from daemon.tasks.registry import TASK_REGISTRY
+from daemon.tasks.workflow import WORKFLOW_TASK_TYPE, Workflow, WorkflowValidationError
+from daemon.utils.admission import AdmissionController
+from daemon.utils.idempotency import IdempotencyStore, MAX_KEY_LENGTH
+from daemon.utils.priority import PriorityLanes
+from daemon.utils.redis_pool import get_redis
+from daemon.utils.codec import get_codec, user_results_channel
+from daemon.utils.cancellation import TaskOwners, cancel_envelope
+
 from .serializers import (
-    GenerateRandomNumberSerializer, 
-    ReverseStringSerializer,
+    TASK_SERIALIZERS,
     TaskResponseSerializer, 
     TaskResultSerializer
 )
 
 
-# Task registry - maps task_type to serializer class
-TASK_SERIALIZERS = {
-    'generate_random_number': GenerateRandomNumberSerializer,
-    'reverse_string': ReverseStringSerializer,
-    # Add more task serializers here as they are created
-}
-
-# List of available tasks with descriptions
+# List of available tasks with descriptions, generated from the task registry
 AVAILABLE_TASKS = {
-    'generate_random_number': 'Generate a random number between a min and max value',
-    'reverse_string': 'Reverse a given text string',
-    # Add more task descriptions here
+    task_type: spec.description
+    for task_type, spec in TASK_REGISTRY.items()
 }
 
 
+# Priority lanes tasks can be submitted to
+PRIORITY_LANES = PriorityLanes(settings.TASK_PRIORITY)
+
+
+# Created on first use so every request in this process shares its broker samples
+_admission_controller = None
+
+
+def get_admission_controller():
+    """Get the process-wide admission controller"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController(
+            get_redis(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_POOL, decode_responses=False),
+            settings.ADMISSION
+        )
+    return _admission_controller
+
+
+def admission_rejection():
+    """Get the response refusing new work while the workers are overloaded, or None to accept it"""
+    admission = get_admission_controller()
+    decision = admission.check()
+    if decision:
+        return None
+    return Response(
+        {
+            "error": "Task queue overloaded, please retry later",
+            "retry_after": decision.retry_after
+        },
+        status=admission.reject_status,
+        headers={'Retry-After': str(decision.retry_after)}
+    )
+
+
+def get_task_owners(redis_client):
+    """Get the store of which user submitted each task"""
+    return TaskOwners(redis_client, settings.CANCELLATION.get('owner_ttl_s', 86400))
+
+
+def enqueue_task(redis_client, task_data, record_owner=True):
+    """Hand a task envelope to the daemon through the tasks stream or channel
+
+    Args:
+        record_owner (bool): Record the submitting user, who may later cancel the task
+    """
+    # One round trip for the owner record and the envelope
+    pipe = redis_client.pipeline(transaction=False)
+    if record_owner:
+        get_task_owners(redis_client).record(task_data["task_id"], task_data["user_id"], pipe=pipe)
+    if settings.REDIS_STREAMS_ENABLED:
+        # Append to the tasks stream so the task survives daemon restarts
+        pipe.xadd(
+            settings.REDIS_TASKS_STREAM,
+            {"data": get_codec(settings.CODEC).encode(task_data)},
+            maxlen=settings.REDIS_STREAM_MAXLEN,
+            approximate=True
+        )
+    else:
+        # Publish to Redis tasks queue
+        pipe.publish(
+            settings.REDIS_TASKS_QUEUE,
+            get_codec(settings.CODEC).encode(task_data)
+        )
+    pipe.execute()
+
+
+def cancel_task(user_id, task_id):
+    """Ask the daemon to cancel a task submitted by a user
+
+    Returns:
+        bool: False if the user did not submit the task (or it is too old to cancel)
+    """
+    redis_client = get_redis(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_POOL)
+    if not get_task_owners(redis_client).owns(task_id, user_id):
+        return False
+    enqueue_task(redis_client, cancel_envelope(user_id, task_id), record_owner=False)
+    return True
+
+
 class TaskDispatcherView(views.APIView):
     """
     Generic view to dispatch any supported task type.
@@ -49,15 +129,43 @@ class TaskDispatcherView(views.APIView):
                 required=True,
                 type=str,
                 enum=list(AVAILABLE_TASKS.keys())
+            ),
+            OpenApiParameter(
+                name='Idempotency-Key',
+                location=OpenApiParameter.HEADER,
+                description='Optional key identifying this submission; retries with the same key '
+                            'return the original task instead of creating a new one',
+                required=False,
+                type=str
+            ),
+            OpenApiParameter(
+                name='X-Task-Priority',
+                location=OpenApiParameter.HEADER,
+                description='Priority lane to run the task in (default: the task type\'s lane)',
+                required=False,
+                type=str,
+                enum=PRIORITY_LANES.names
+            ),
+            OpenApiParameter(
+                name='X-Task-Deadline',
+                location=OpenApiParameter.HEADER,
+                description='Seconds from submission after which the task is dropped instead of run',
+                required=False,
+                type=float
             )
         ],
         responses={
+            200: OpenApiResponse(
+                response=TaskResponseSerializer,
+                description="Repeated Idempotency-Key: the original task is returned and nothing is queued"
+            ),
             202: OpenApiResponse(
                 response=TaskResponseSerializer,
                 description="Task successfully submitted"
             ),
-            400: OpenApiResponse(description="Invalid parameters for task"),
-            404: OpenApiResponse(description="Task type not found")
+            400: OpenApiResponse(description="Invalid parameters, priority or deadline for task"),
+            404: OpenApiResponse(description="Task type not found"),
+            503: OpenApiResponse(description="Task queue overloaded, retry after the Retry-After header")
         },
         description="Generic endpoint to dispatch any supported task type",
     )
@@ -80,34 +188,178 @@ class TaskDispatcherView(views.APIView):
         serializer = serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         
+        # Optional client-supplied key that makes retries of this submission safe
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Optional priority lane and relative deadline
+        priority = request.headers.get('X-Task-Priority')
+        if priority is not None and priority not in PRIORITY_LANES:
+            return Response(
+                {"error": f"Unknown priority: {priority}. Expected one of {PRIORITY_LANES.names}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        deadline = None
+        timeout = request.headers.get('X-Task-Deadline')
+        if timeout is not None:
+            try:
+                timeout = float(timeout)
+            except ValueError:
+                timeout = -1
+            if not 0 < timeout <= PRIORITY_LANES.max_deadline:
+                return Response(
+                    {"error": f"X-Task-Deadline must be between 0 and {PRIORITY_LANES.max_deadline} seconds"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            deadline = time.time() + timeout
+        
+        # Refuse work the workers cannot reach in reasonable time
+        rejection = admission_rejection()
+        if rejection is not None:
+            return rejection
+        
+        # Pooled Redis client used to claim the idempotency key and queue the task
+        redis_client = get_redis(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_POOL)
+        
+        # The task id is assigned here so the client can correlate WebSocket results
+        task_id = str(uuid.uuid4())
+        
+        if idempotency_key:
+            idempotency = IdempotencyStore(redis_client, settings.IDEMPOTENCY_TTL)
+            original = idempotency.claim(request.user.id, idempotency_key, task_id)
+            if original is not None:
+                # Repeated submission: report the original task instead of queueing again
+                return Response({
+                    'task_id': original['task_id'],
+                    'task_type': task_type,
+                    'status': original['status']
+                }, status=status.HTTP_200_OK)
+        
         # Create task message
         task_data = {
             "user_id": request.user.id,
+            "task_id": task_id,
             "task_type": task_type,
             "parameters": serializer.validated_data
         }
+        if idempotency_key:
+            task_data["idempotency_key"] = idempotency_key
+        if priority:
+            task_data["priority"] = priority
+        if deadline is not None:
+            task_data["deadline"] = deadline
         
-        # Send task to Redis queue
-        redis_client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            decode_responses=True
-        )
-        
-        # Publish to Redis tasks queue
-        redis_client.publish(
-            settings.REDIS_TASKS_QUEUE,
-            json.dumps(task_data)
-        )
+        try:
+            enqueue_task(redis_client, task_data)
+        except Exception:
+            # The task never left the API, so a retry with the same key must go through
+            if idempotency_key:
+                idempotency.release(request.user.id, idempotency_key)
+            raise
         
         # Return a response with task info
         return Response({
-            'task_id': 'pending',  # Actual task ID will be generated by Celery
+            'task_id': task_id,
             'task_type': task_type,
             'status': 'submitted'
         }, status=status.HTTP_202_ACCEPTED)
 
 
+class WorkflowView(views.APIView):
+    """
+    Submit a DAG of registered tasks that runs entirely in the worker tier.
+    
+    Only the final result (and, with `step_events`, one event per completed
+    step) is pushed to the user's WebSocket, under the returned task id.
+    """
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='X-Task-Priority',
+                location=OpenApiParameter.HEADER,
+                description='Priority lane every step of the workflow runs in',
+                required=False,
+                type=str,
+                enum=PRIORITY_LANES.names
+            )
+        ],
+        responses={
+            202: OpenApiResponse(
+                response=TaskResponseSerializer,
+                description="Workflow successfully submitted"
+            ),
+            400: OpenApiResponse(description="Invalid workflow or priority"),
+            503: OpenApiResponse(description="Task queue overloaded, retry after the Retry-After header")
+        },
+        description="Submit a workflow: steps keyed by id, each a registered task type with parameters; "
+                    "a parameter {\"$ref\": \"<step>.<field>\"} takes a field of another step's result",
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            workflow = Workflow.from_dict(request.data, settings.WORKFLOW.get('max_steps', 20))
+        except WorkflowValidationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        priority = request.headers.get('X-Task-Priority')
+        if priority is not None and priority not in PRIORITY_LANES:
+            return Response(
+                {"error": f"Unknown priority: {priority}. Expected one of {PRIORITY_LANES.names}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        rejection = admission_rejection()
+        if rejection is not None:
+            return rejection
+        
+        task_id = str(uuid.uuid4())
+        task_data = {
+            "user_id": request.user.id,
+            "task_id": task_id,
+            "task_type": WORKFLOW_TASK_TYPE,
+            "parameters": workflow.to_dict()
+        }
+        if priority:
+            task_data["priority"] = priority
+        enqueue_task(get_redis(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_POOL), task_data)
+        
+        return Response({
+            'task_id': task_id,
+            'task_type': WORKFLOW_TASK_TYPE,
+            'status': 'submitted'
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class TaskCancelView(views.APIView):
+    """
+    Cancel a submitted task or workflow.
+    
+    A queued task is discarded and a running one is terminated; the outcome
+    is pushed to the user's WebSocket with status `cancelled` under the task id.
+    """
+    @extend_schema(
+        responses={
+            202: OpenApiResponse(description="Cancellation requested"),
+            404: OpenApiResponse(description="No task with this id was submitted by the user")
+        },
+        description="Cancel a task by the id returned when it was submitted",
+    )
+    def post(self, request, task_id, *args, **kwargs):
+        if not cancel_task(request.user.id, task_id):
+            return Response(
+                {"error": f"Unknown task: {task_id}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({
+            'task_id': task_id,
+            'status': 'cancelling'
+        }, status=status.HTTP_202_ACCEPTED)
+
+
 class TasksInfoView(views.APIView):
     """
     View to list all available tasks and their descriptions.
@@ -145,22 +397,19 @@ def test_redis_publish(request):
             "result": {"message": message}
         }
         
-        # Connect to Redis
-        redis_client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            decode_responses=True
-        )
+        # Pooled connection to Redis
+        redis_client = get_redis(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_POOL)
         
-        # Publish to results queue
-        result = redis_client.publish(settings.REDIS_RESULTS_QUEUE, json.dumps(payload))
+        # Publish to the user's results channel
+        channel = user_results_channel(settings.REDIS_RESULTS_QUEUE, user_id)
+        result = redis_client.publish(channel, get_codec(settings.CODEC).encode(payload))
         
         logger.info(f"Published test message to Redis for user {user_id}, result: {result}")
         
         return JsonResponse({
             "status": "success",
             "message": f"Test message published to Redis for user {user_id}",
-            "queue": settings.REDIS_RESULTS_QUEUE,
+            "queue": channel,
             "payload": payload,
             "redis_publish_result": result
         })
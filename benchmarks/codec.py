@@ -0,0 +1,85 @@
+"""
+Encode/decode cost of the wire codec per envelope size.
+
+Builds result envelopes with payloads of increasing size and times
+`Codec.encode` and `Codec.decode` for every available format: stdlib JSON
+(untagged, as before the codec existed), tagged JSON (orjson when installed)
+and tagged msgpack (when installed).
+
+Usage (from the project root):
+    python benchmarks/codec.py
+    python benchmarks/codec.py --sizes 100 10000 1000000 --number 2000
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from daemon.utils import codec as codec_module  # noqa: E402
+from daemon.utils.codec import Codec  # noqa: E402
+
+
+def build_envelope(size):
+    """A result envelope whose payload is roughly `size` bytes of mixed JSON"""
+    items = max(size // 40, 1)
+    return {
+        "user_id": 42,
+        "task_id": "0b7c6f8e-3f7a-4d8e-9a51-6d2c9a1f0e11",
+        "task_type": "reverse_string",
+        "status": "completed",
+        "result": {
+            "rows": [{"id": i, "value": i * 0.5, "label": f"item-{i}"} for i in range(items)]
+        },
+    }
+
+
+class StdlibJson:
+    """Plain json.dumps/json.loads, the behaviour before the codec layer"""
+
+    @staticmethod
+    def encode(obj):
+        return json.dumps(obj).encode()
+
+    @staticmethod
+    def decode(data):
+        return json.loads(data)
+
+
+def available_codecs():
+    """(label, codec) for every format that can be benchmarked here"""
+    codecs = [
+        ('stdlib json (untagged)', StdlibJson()),
+        ('orjson (tagged)' if codec_module.orjson else 'json (tagged, no orjson)', Codec('json')),
+    ]
+    if codec_module.msgpack is not None:
+        codecs.append(('msgpack (tagged)', Codec('msgpack')))
+    return codecs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200, 2000, 20000, 200000],
+                        help='Approximate payload sizes in bytes')
+    parser.add_argument('--number', type=int, default=0,
+                        help='Iterations per measurement (default: scaled to the size)')
+    args = parser.parse_args()
+
+    print(f"{'format':<28} {'size':>10} {'encoded':>10} {'encode us':>11} {'decode us':>11}")
+    for size in args.sizes:
+        envelope = build_envelope(size)
+        number = args.number or max(20, 2_000_000 // max(size, 1))
+        for label, codec in available_codecs():
+            encoded = codec.encode(envelope)
+            assert codec.decode(encoded) == envelope
+            encode = min(timeit.repeat(lambda: codec.encode(envelope), number=number, repeat=3)) / number
+            decode = min(timeit.repeat(lambda: codec.decode(encoded), number=number, repeat=3)) / number
+            print(f"{label:<28} {size:>10} {len(encoded):>10} "
+                  f"{encode * 1e6:>11.2f} {decode * 1e6:>11.2f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
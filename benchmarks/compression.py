@@ -0,0 +1,67 @@
+"""
+Size and CPU trade-off of compressing envelopes before they reach Redis.
+
+Builds result envelopes with payloads of increasing size, encodes them with
+the wire codec and reports, for every available algorithm and level, the
+compressed size and the time to compress and decompress. Envelopes below the
+configured threshold are sent uncompressed, so the smallest sizes show what
+the threshold saves.
+
+Usage (from the project root):
+    python benchmarks/compression.py
+    python benchmarks/compression.py --sizes 1000 100000 --levels 1 6 9
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.codec import build_envelope  # noqa: E402
+from daemon.utils import compression  # noqa: E402
+from daemon.utils.codec import Codec  # noqa: E402
+
+
+def available_algorithms():
+    """Algorithm names that can be benchmarked here"""
+    names = ['zlib']
+    if compression.zstandard is not None:
+        names.append('zstd')
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='Approximate payload sizes in bytes')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 3, 6],
+                        help='Compression levels to compare')
+    parser.add_argument('--number', type=int, default=0,
+                        help='Iterations per measurement (default: scaled to the size)')
+    args = parser.parse_args()
+
+    print(f"{'algorithm':<10} {'level':>5} {'size':>10} {'encoded':>10} {'ratio':>7} "
+          f"{'compress us':>12} {'decompress us':>14}")
+    for size in args.sizes:
+        payload = Codec('json', tagged=False).encode(build_envelope(size))
+        number = args.number or max(10, 1_000_000 // max(size, 1))
+        for name in available_algorithms():
+            algorithm_id = compression.ALGORITHMS[name]
+            for level in args.levels:
+                compressed = compression.compress(payload, algorithm_id, level)
+                assert compression.decompress(compressed, algorithm_id) == payload
+                compress = min(timeit.repeat(
+                    lambda: compression.compress(payload, algorithm_id, level), number=number, repeat=3
+                )) / number
+                decompress = min(timeit.repeat(
+                    lambda: compression.decompress(compressed, algorithm_id), number=number, repeat=3
+                )) / number
+                print(f"{name:<10} {level:>5} {len(payload):>10} {len(compressed):>10} "
+                      f"{len(compressed) / len(payload):>7.2f} "
+                      f"{compress * 1e6:>12.2f} {decompress * 1e6:>14.2f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Startup benchmark for the daemon, the Celery workers and the ASGI app.
+
+Measures, in fresh interpreter processes:
+
+- import time of `daemon.processor`, `daemon.tasks.tasks` and `djangoproject.asgi`
+- with `--live`, time-to-first-task: how long after being launched the daemon
+  answers its first task, a Celery worker publishes its first result and the
+  ASGI app serves its first HTTP request
+
+Import times need the Python dependencies only; `--live` also needs Redis.
+
+Usage (from the project root):
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 10 --live
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DJANGO_ROOT = PROJECT_ROOT / 'backend' / 'djangoproject'
+
+# Prints the import time of a module, in milliseconds, from a fresh interpreter
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import {module}
+print((time.perf_counter() - started) * 1000)
+"""
+
+# Serves one HTTP request through the ASGI app and prints the time since launch
+ASGI_FIRST_REQUEST_SNIPPET = """
+import asyncio, sys, time
+launched = float(sys.argv[1])
+from djangoproject.asgi import application
+
+async def first_request():
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/tasks/', 'raw_path': b'/api/tasks/',
+             'query_string': b'', 'headers': [(b'host', b'localhost')], 'http_version': '1.1',
+             'scheme': 'http', 'server': ('localhost', 8000), 'client': ('127.0.0.1', 0)}
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    status = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+asyncio.run(first_request())
+print((time.time() - launched) * 1000)
+"""
+
+TARGETS = {
+    'daemon': ('daemon.processor', PROJECT_ROOT),
+    'worker': ('daemon.tasks.tasks', PROJECT_ROOT),
+    'asgi': ('djangoproject.asgi', DJANGO_ROOT),
+}
+
+
+def subprocess_env(cwd):
+    """Environment for a child interpreter that can import the project from `cwd`"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(cwd), str(PROJECT_ROOT), env.get('PYTHONPATH')]))
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'djangoproject.settings')
+    return env
+
+
+def measure_import(module, cwd):
+    """Return (import ms, process wall ms) for importing a module in a new interpreter"""
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SNIPPET.format(module=module)],
+        cwd=cwd, env=subprocess_env(cwd), capture_output=True, text=True, check=True
+    ).stdout
+    wall = (time.perf_counter() - started) * 1000
+    return float(output.strip().splitlines()[-1]), wall
+
+
+def wait_for_result(pubsub, codec, user_id, timeout):
+    """Wait for a message for `user_id` on the results channel; return its arrival time"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        message = pubsub.get_message(timeout=0.01)
+        if message and message['type'] == 'message' and codec.decode(message['data']).get('user_id') == user_id:
+            return time.monotonic()
+    raise TimeoutError(f"No result for {user_id} within {timeout} seconds")
+
+
+def terminate(process):
+    """Stop a launched process"""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def daemon_first_task(client, config, timeout):
+    """Launch the daemon and probe it with an unknown task type until it answers
+
+    Unknown task types are answered by the daemon itself, so no Celery worker is needed.
+    """
+    from daemon.utils.codec import get_codec, user_results_channel
+
+    user_id = f"startup-bench-{uuid.uuid4()}"
+    pubsub = client.pubsub()
+    pubsub.subscribe(user_results_channel(config.redis_results_channel, user_id))
+    codec = get_codec(config.codec_settings)
+    probe = codec.encode({'user_id': user_id, 'task_type': 'startup_probe', 'parameters': {}})
+
+    launched = time.monotonic()
+    process = subprocess.Popen([sys.executable, '-m', 'daemon', '--single'], cwd=PROJECT_ROOT,
+                               env=subprocess_env(PROJECT_ROOT),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if config.redis_streams_enabled:
+            client.xadd(config.redis_tasks_stream, {'data': probe})
+            return (wait_for_result(pubsub, codec, user_id, timeout) - launched) * 1000
+
+        # Pub/sub messages sent before the daemon subscribes are lost, so keep probing
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            client.publish(config.redis_tasks_channel, probe)
+            try:
+                return (wait_for_result(pubsub, codec, user_id, 0.05) - launched) * 1000
+            except TimeoutError:
+                continue
+        raise TimeoutError(f"Daemon did not answer within {timeout} seconds")
+    finally:
+        terminate(process)
+        pubsub.close()
+
+
+def worker_first_task(client, config, timeout):
+    """Queue a task, launch a Celery worker and wait for it to publish the result"""
+    from daemon.tasks.tasks import app
+    from daemon.utils.codec import get_codec, user_results_channel
+    from daemon.utils.priority import PriorityLanes
+
+    user_id = f"startup-bench-{uuid.uuid4()}"
+    pubsub = client.pubsub()
+    pubsub.subscribe(user_results_channel(config.redis_results_channel, user_id))
+    queues = PriorityLanes(config.priority_settings).queues
+    app.send_task('daemon.tasks.tasks.generate_random_number', args=(user_id,), queue=queues[0])
+
+    launched = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'celery', '-A', 'daemon.tasks.tasks', 'worker',
+         '-Q', ','.join(queues), '--pool=solo', '--concurrency=1', '--loglevel=warning',
+         '-n', f'startup-bench-{os.getpid()}@%h'],
+        cwd=PROJECT_ROOT, env=subprocess_env(PROJECT_ROOT),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        return (wait_for_result(pubsub, get_codec(config.codec_settings), user_id, timeout) - launched) * 1000
+    finally:
+        terminate(process)
+        pubsub.close()
+
+
+def asgi_first_request(timeout):
+    """Launch an interpreter that serves one request through the ASGI app"""
+    output = subprocess.run(
+        [sys.executable, '-c', ASGI_FIRST_REQUEST_SNIPPET, str(time.time())],
+        cwd=DJANGO_ROOT, env=subprocess_env(DJANGO_ROOT),
+        capture_output=True, text=True, check=True, timeout=timeout
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def summarize(name, samples):
+    """Print the median, min and max of a list of milliseconds"""
+    print(f"  {name:<28} median {statistics.median(samples):8.1f} ms   "
+          f"min {min(samples):8.1f} ms   max {max(samples):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (default: 5)')
+    parser.add_argument('--targets', nargs='+', choices=sorted(TARGETS), default=sorted(TARGETS))
+    parser.add_argument('--live', action='store_true',
+                        help='Also measure time-to-first-task (needs Redis)')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for a first task')
+    args = parser.parse_args()
+
+    print("Import time")
+    for target in args.targets:
+        module, cwd = TARGETS[target]
+        try:
+            runs = [measure_import(module, cwd) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"  {target}: import failed\n{e.stderr}")
+            continue
+        summarize(f"{target} ({module})", [imported for imported, _ in runs])
+        summarize(f"{target} process wall", [wall for _, wall in runs])
+
+    if not args.live:
+        return
+
+    sys.path.insert(0, str(PROJECT_ROOT))
+    import redis
+    from daemon.utils.config import config
+
+    client = redis.Redis(host=config.redis_host, port=config.redis_port)
+    measurements = {
+        'daemon': lambda: daemon_first_task(client, config, args.timeout),
+        'worker': lambda: worker_first_task(client, config, args.timeout),
+        'asgi': lambda: asgi_first_request(args.timeout),
+    }
+
+    print("Time to first task (from launch)")
+    for target in args.targets:
+        try:
+            summarize(target, [measurements[target]() for _ in range(args.repeat)])
+        except Exception as e:
+            print(f"  {target}: failed: {e}")
+
+
+if __name__ == '__main__':
+    main()
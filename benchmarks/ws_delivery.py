@@ -0,0 +1,193 @@
+"""
+Latency floor and idle CPU of WebSocket result delivery.
+
+Connects `--connections` simulated sockets, one user each, and compares:
+
+- `socket-poll`: a subscription per socket, polled every 100 ms (the
+  consumer loop before results were routed per process)
+- `shared-poll`: one subscription per process, polled every 100 ms
+- `push`: the `ResultsRouter`, blocking on one subscription until Redis
+  pushes a message
+
+For each mode it reports the CPU the process burns while no results are
+published (per second, and per 1k connections) and the latency from
+publishing a result to the socket receiving its frame, for `--messages`
+results published at random intervals to random users.
+
+Needs Redis and the Python dependencies of the Django backend.
+
+Usage (from the project root):
+    python benchmarks/ws_delivery.py
+    python benchmarks/ws_delivery.py --connections 5000 --idle 10 --modes shared-poll push
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DJANGO_ROOT = PROJECT_ROOT / 'backend' / 'djangoproject'
+sys.path[:0] = [str(PROJECT_ROOT), str(DJANGO_ROOT)]
+
+import redis.asyncio  # noqa: E402
+from daemon.utils.config import config  # noqa: E402
+from daemon.utils.codec import get_codec, dumps_json, user_results_channel  # noqa: E402
+from daemon.utils.redis_client import build_result_envelope  # noqa: E402
+
+# Poll interval of the loops replaced by push delivery
+POLL_INTERVAL = 0.1
+
+MODES = ('socket-poll', 'shared-poll', 'push')
+
+
+class BenchSocket:
+    """Stands in for a TaskConsumer and records when each result frame arrives"""
+
+    def __init__(self, user_id, latencies):
+        self.user_id = user_id
+        self.latencies = latencies
+
+    async def send(self, text_data):
+        frame = json.loads(text_data)
+        if frame.get('type') == 'task_result':
+            self.latencies.append(time.perf_counter() - frame['data']['result']['sent'])
+
+
+class PollingDelivery:
+    """Subscriptions read with get_message() and a fixed sleep, as before push delivery"""
+
+    def __init__(self, client, sockets, shared):
+        self.client = client
+        self.sockets = {socket.user_id: socket for socket in sockets}
+        self.shared = shared
+        self.codec = get_codec(config.codec_settings)
+        self.tasks = []
+        self.pubsubs = []
+
+    async def start(self):
+        groups = [list(self.sockets)] if self.shared else [[user_id] for user_id in self.sockets]
+        for user_ids in groups:
+            pubsub = self.client.pubsub()
+            await pubsub.subscribe(*(user_results_channel(config.redis_results_channel, user_id)
+                                     for user_id in user_ids))
+            self.pubsubs.append(pubsub)
+            self.tasks.append(asyncio.create_task(self.poll(pubsub)))
+
+    async def poll(self, pubsub):
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True)
+            if message and message['type'] == 'message':
+                data = self.codec.decode(message['data'])
+                await self.sockets[data['user_id']].send(dumps_json({"type": "task_result", "data": data}))
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for pubsub in self.pubsubs:
+            await pubsub.aclose()
+
+
+class PushDelivery:
+    """The ResultsRouter of the Django backend"""
+
+    def __init__(self, sockets):
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoproject.settings')
+        import django
+        django.setup()
+        from tasks.results_router import ResultsRouter
+
+        self.router = ResultsRouter()
+        # No heartbeat frames during the idle measurement
+        self.router.heartbeat_interval = 0
+        self.sockets = sockets
+
+    async def start(self):
+        for socket in self.sockets:
+            await self.router.register(socket.user_id, socket)
+
+    async def stop(self):
+        for socket in self.sockets:
+            await self.router.unregister(socket.user_id, socket)
+        self.router.listen_task.cancel()
+        await asyncio.gather(self.router.listen_task, return_exceptions=True)
+        await self.router.pubsub.aclose()
+
+
+async def run_mode(mode, args):
+    """Measure idle CPU and delivery latency of one delivery mode"""
+    client = redis.asyncio.Redis(host=config.redis_host, port=config.redis_port)
+    codec = get_codec(config.codec_settings)
+    latencies = []
+    prefix = f"ws-bench-{uuid.uuid4().hex[:8]}"
+    sockets = [BenchSocket(f"{prefix}-{index}", latencies) for index in range(args.connections)]
+
+    if mode == 'push':
+        delivery = PushDelivery(sockets)
+    else:
+        delivery = PollingDelivery(client, sockets, shared=(mode == 'shared-poll'))
+    await delivery.start()
+    try:
+        # Let subscriptions settle before measuring
+        await asyncio.sleep(1)
+        cpu_started = time.process_time()
+        await asyncio.sleep(args.idle)
+        idle_cpu = (time.process_time() - cpu_started) / args.idle
+
+        for _ in range(args.messages):
+            socket = random.choice(sockets)
+            envelope = build_result_envelope(socket.user_id, str(uuid.uuid4()), 'bench',
+                                             result={"sent": time.perf_counter()})
+            await client.publish(user_results_channel(config.redis_results_channel, socket.user_id),
+                                 codec.encode(envelope))
+            # Random spacing, so results do not line up with a poll interval
+            await asyncio.sleep(random.uniform(0, args.spacing_ms / 1000))
+
+        deadline = time.monotonic() + 5
+        while len(latencies) < args.messages and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+    finally:
+        await delivery.stop()
+        await client.aclose()
+    return idle_cpu, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--connections', type=int, default=1000, help='Simulated sockets (default: 1000)')
+    parser.add_argument('--idle', type=float, default=5, help='Seconds of idle CPU measurement')
+    parser.add_argument('--messages', type=int, default=200, help='Results published per mode')
+    parser.add_argument('--spacing-ms', type=float, default=20,
+                        help='Maximum random gap between published results')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    print(f"{args.connections} connections, {args.messages} results per mode")
+    print(f"{'mode':<12} {'idle CPU ms/s':>14} {'per 1k conns':>13} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'delivered':>10}")
+    for mode in args.modes:
+        try:
+            idle_cpu, latencies = asyncio.run(run_mode(mode, args))
+        except Exception as e:
+            print(f"{mode:<12} failed: {e}")
+            continue
+        per_1k = idle_cpu * 1000 / args.connections
+        if latencies:
+            latencies = sorted(latency * 1000 for latency in latencies)
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            timing = f"{statistics.median(latencies):>8.2f} {p99:>8.2f} {latencies[-1]:>8.2f}"
+        else:
+            timing = f"{'-':>8} {'-':>8} {'-':>8}"
+        print(f"{mode:<12} {idle_cpu * 1000:>14.2f} {per_1k * 1000:>13.2f} {timing} "
+              f"{len(latencies):>10}")
+
+
+if __name__ == '__main__':
+    main()
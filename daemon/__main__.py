@@ -0,0 +1,45 @@
+"""
+Run the task processor daemon with `python -m daemon`.
+
+By default this starts the multi-process supervisor; `--single` runs a
+single in-process task processor as `python processor.py` does.
+"""
+import argparse
+import logging
+import sys
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('daemon')
+
+
+def main():
+    """Parse arguments and start the supervisor or a single processor"""
+    parser = argparse.ArgumentParser(prog='python -m daemon', description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='Number of processor worker processes (default: daemon.supervisor.workers, or one per core)'
+    )
+    parser.add_argument(
+        '--single', action='store_true',
+        help='Run one task processor in this process instead of the supervisor'
+    )
+    args = parser.parse_args()
+
+    if args.single:
+        from daemon.processor import main as processor_main
+        processor_main()
+        return
+
+    from daemon.supervisor import Supervisor
+    try:
+        Supervisor(num_workers=args.workers).run()
+    except Exception as e:
+        logger.error(f"Fatal error: {e}", exc_info=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Asyncio task processor for the event-driven architecture.
+
+Functionally equivalent to `TaskProcessor`, but intake, validation and
+dispatch run as separate stages connected by bounded queues:
+
+    reader -> intake queue -> N validators -> dispatch queue -> N dispatchers
+
+A slow broker call only occupies one dispatcher, and when every queue is
+full the reader stops pulling messages from Redis, so backpressure reaches
+the source instead of growing memory.
+
+Task semantics (validation, admission control, idempotency) are shared with
+`TaskProcessor`: its synchronous `prepare_task` runs in the thread pool.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import redis
+
+from daemon.utils.config import config
+from daemon.utils.redis_pool import get_async_redis
+from daemon.dispatch import DispatchMetrics
+from daemon.processor import TaskProcessor
+from daemon.utils.priority import is_expired
+from daemon.utils.codec import CodecError
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTaskProcessor:
+    """
+    Process tasks received from Redis and send them to Celery using asyncio.
+
+    Celery's publishing API and the pre-dispatch checks are synchronous, so
+    validators and dispatchers run them in a shared thread pool.
+    """
+    def __init__(self):
+        """Initialize queues, the shared task processor and the async Redis client"""
+        logger.info("Initializing AsyncTaskProcessor...")
+
+        # Envelopes are codec-encoded bytes
+        self.redis = get_async_redis(
+            config.redis_host, config.redis_port, config.redis_pool_settings, decode_responses=False
+        )
+        # Reuse the synchronous processor for validation and pre-dispatch checks
+        self.processor = TaskProcessor(subscribe=False)
+        self.metrics = DispatchMetrics(config.metrics_interval)
+        self.validators = config.asyncio_validators
+        self.dispatchers = config.asyncio_dispatchers
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.validators + self.dispatchers,
+            thread_name_prefix='async-processor'
+        )
+
+        # Each item is (raw_data, stream_entry_id); entry id is None for pub/sub
+        self.intake = asyncio.Queue(maxsize=config.asyncio_intake_queue_size)
+        # Ordered by lane and then earliest deadline; the counter keeps FIFO order for ties
+        self.dispatch_queue = asyncio.PriorityQueue(maxsize=config.asyncio_dispatch_queue_size)
+        self._sequence = itertools.count()
+
+        # Stream entries that are fully processed and waiting to be acked
+        self._acks = []
+        self.consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+
+    def _done(self, entry_id):
+        """Mark a stream entry as processed so it is acked on the next read"""
+        if entry_id is not None:
+            self._acks.append(entry_id)
+
+    async def read_pubsub(self):
+        """Feed messages from the tasks channel into the intake queue"""
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(config.redis_tasks_channel)
+        logger.info(f"Listening for tasks on Redis channel: {config.redis_tasks_channel}")
+
+        async for message in pubsub.listen():
+            if message['type'] == 'message':
+                # Blocks while the pipeline is saturated
+                await self.intake.put((message['data'], None))
+
+    async def read_stream(self):
+        """Feed entries from the tasks stream into the intake queue"""
+        stream = config.redis_tasks_stream
+        group = config.redis_consumer_group
+
+        try:
+            await self.redis.xgroup_create(stream, group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        logger.info(f"Consuming tasks stream {stream} as {self.consumer_name} in group {group}")
+
+        claim_interval = config.redis_stream_claim_idle_ms / 1000
+        last_claim = 0.0
+
+        while True:
+            await self.flush_acks()
+
+            entries = []
+            now = time.monotonic()
+            if now - last_claim >= claim_interval:
+                last_claim = now
+                response = await self.redis.xautoclaim(
+                    stream, group, self.consumer_name,
+                    min_idle_time=config.redis_stream_claim_idle_ms,
+                    start_id='0-0',
+                    count=config.redis_stream_batch_size
+                )
+                entries = [(entry_id, fields) for entry_id, fields in response[1] if fields]
+                trimmed = [entry_id for entry_id, fields in response[1] if not fields]
+                if trimmed:
+                    await self.redis.xack(stream, group, *trimmed)
+                if entries:
+                    logger.warning(f"Reclaimed {len(entries)} stale stream entries")
+
+            if not entries:
+                response = await self.redis.xreadgroup(
+                    group, self.consumer_name, {stream: '>'},
+                    count=config.redis_stream_batch_size,
+                    block=config.redis_stream_block_ms
+                )
+                entries = response[0][1] if response else []
+
+            for entry_id, fields in entries:
+                # Blocks while the pipeline is saturated
+                await self.intake.put((fields.get(b'data'), entry_id))
+
+    async def flush_acks(self):
+        """Acknowledge every stream entry processed since the last flush"""
+        if not self._acks:
+            return
+        acks, self._acks = self._acks, []
+        await self.redis.xack(config.redis_tasks_stream, config.redis_consumer_group, *acks)
+
+    async def validate(self):
+        """Parse and validate intake messages, forwarding dispatchable tasks"""
+        loop = asyncio.get_running_loop()
+        while True:
+            raw_data, entry_id = await self.intake.get()
+            try:
+                data = self.processor.redis_client.codec.decode(raw_data)
+                job = await loop.run_in_executor(self.executor, self.processor.prepare_task, data)
+                if job is None:
+                    self._done(entry_id)
+                    continue
+
+                # Blocks while every dispatcher is busy
+                await self.dispatch_queue.put(
+                    (job.sort_key, next(self._sequence), time.monotonic(), job, entry_id)
+                )
+            except CodecError as e:
+                logger.error(f"Invalid message: {e}")
+                self._done(entry_id)
+            except Exception as e:
+                logger.error(f"Error processing message: {e}", exc_info=True)
+                self._done(entry_id)
+            finally:
+                self.intake.task_done()
+
+    async def dispatch(self):
+        """Publish validated tasks to the broker"""
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, queued_at, job, entry_id = await self.dispatch_queue.get()
+            started = time.monotonic()
+            try:
+                # The deadline may have passed while the job was queued
+                if is_expired(job.deadline):
+                    await loop.run_in_executor(self.executor, self.processor.expired, job)
+                    continue
+                if self.processor.is_cancelled(job):
+                    await loop.run_in_executor(self.executor, self.processor.dropped_cancelled, job)
+                    continue
+
+                await loop.run_in_executor(
+                    self.executor,
+                    partial(
+                        job.celery_task.apply_async,
+                        args=(job.user_id,),
+                        kwargs=job.kwargs,
+                        task_id=job.task_id,
+                        **job.options
+                    )
+                )
+                self.metrics.record_batch(1, [started - queued_at], time.monotonic() - started)
+                self.metrics.report_if_due()
+                await loop.run_in_executor(self.executor, self.processor.dispatched, job)
+                logger.info(f"Task {job.task_type} dispatched with ID: {job.task_id}")
+            except Exception as e:
+                logger.error(f"Failed to dispatch {job.task_type} ({job.task_id}): {e}", exc_info=True)
+                await loop.run_in_executor(self.executor, self.processor.dispatch_failed, job, e)
+            finally:
+                self._done(entry_id)
+                self.dispatch_queue.task_done()
+
+    async def run(self):
+        """Run the reader, validator and dispatchers until cancelled"""
+        logger.info(f"Async task processor started with {self.validators} validators "
+                    f"and {self.dispatchers} dispatchers")
+        reader = self.read_stream() if config.redis_streams_enabled else self.read_pubsub()
+        stages = [asyncio.create_task(reader)]
+        stages += [asyncio.create_task(self.validate()) for _ in range(self.validators)]
+        stages += [asyncio.create_task(self.dispatch()) for _ in range(self.dispatchers)]
+
+        try:
+            # The stages run forever; return as soon as one of them fails
+            done, _ = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+            for stage in done:
+                stage.result()
+        finally:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            self.executor.shutdown(wait=True)
+            self.processor.dispatcher.close()
+            if config.redis_streams_enabled:
+                await self.flush_acks()
+            await self.redis.close()
@@ -0,0 +1,198 @@
+"""
+Celery dispatch strategies for the task processor.
+
+The processor hands every validated task to a dispatcher. `DirectDispatcher`
+publishes each task to the broker as soon as it arrives, while
+`BatchDispatcher` collects tasks for a short window and publishes the whole
+batch over a single broker connection.
+"""
+import logging
+import threading
+import time
+
+from celery.utils import uuid
+
+from daemon.utils.config import config
+from daemon.utils.batching import FlushBuffer
+
+logger = logging.getLogger(__name__)
+
+
+def _run_callback(callback, *args):
+    """Run a dispatch callback without letting it break the batch"""
+    if callback is None:
+        return
+    try:
+        callback(*args)
+    except Exception as e:
+        logger.error(f"Dispatch callback failed: {e}")
+
+
+class DispatchMetrics:
+    """Thread-safe counters describing batch sizes and dispatch latency"""
+
+    def __init__(self, interval=60):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last_report = time.monotonic()
+        self._reset()
+
+    def _reset(self):
+        self.batches = 0
+        self.tasks = 0
+        self.max_batch_size = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_publish_time = 0.0
+
+    def record_batch(self, size, waits, publish_time):
+        """Record a flushed batch
+
+        Args:
+            size (int): Number of tasks in the batch
+            waits (list): Seconds each task spent buffered before the flush started
+            publish_time (float): Seconds spent publishing the batch to the broker
+        """
+        with self._lock:
+            self.batches += 1
+            self.tasks += size
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.total_wait += sum(waits)
+            self.max_wait = max(self.max_wait, max(waits, default=0.0))
+            self.total_publish_time += publish_time
+
+    def snapshot(self):
+        """Get the metrics collected since the last report"""
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'tasks': self.tasks,
+                'avg_batch_size': self.tasks / self.batches if self.batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'avg_added_latency_ms': 1000 * self.total_wait / self.tasks if self.tasks else 0.0,
+                'max_added_latency_ms': 1000 * self.max_wait,
+                'avg_publish_ms': 1000 * self.total_publish_time / self.batches if self.batches else 0.0,
+            }
+
+    def report_if_due(self):
+        """Log and reset the metrics once per reporting interval"""
+        now = time.monotonic()
+        if now - self._last_report < self.interval:
+            return
+        stats = self.snapshot()
+        with self._lock:
+            self._last_report = now
+            self._reset()
+        logger.info(
+            "Dispatch metrics: {tasks} tasks in {batches} batches "
+            "(avg size {avg_batch_size:.1f}, max {max_batch_size}), "
+            "added latency avg {avg_added_latency_ms:.2f} ms / max {max_added_latency_ms:.2f} ms, "
+            "publish avg {avg_publish_ms:.2f} ms per batch".format(**stats)
+        )
+
+
+class DirectDispatcher:
+    """Publish each task to the broker immediately"""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics or DispatchMetrics(config.metrics_interval)
+
+    def dispatch(self, task, args, kwargs, task_id=None, on_error=None, on_success=None, **options):
+        """Publish a task and return its id
+
+        `on_success()` runs once the broker accepted the task, `on_error(exc)` if it did not.
+        """
+        task_id = task_id or uuid()
+        started = time.monotonic()
+        try:
+            task.apply_async(args=args, kwargs=kwargs, task_id=task_id, **options)
+        except Exception as e:
+            logger.error(f"Failed to dispatch {task.name} ({task_id}): {e}", exc_info=True)
+            _run_callback(on_error, e)
+            return task_id
+        _run_callback(on_success)
+        self.metrics.record_batch(1, [0.0], time.monotonic() - started)
+        self.metrics.report_if_due()
+        return task_id
+
+    def flush(self):
+        """Nothing is buffered, so there is nothing to flush"""
+
+    def close(self):
+        """Release dispatcher resources"""
+
+
+class BatchDispatcher:
+    """Collect tasks for up to `max_wait_ms` or `max_messages` and publish them together
+
+    All tasks in a batch share one producer and broker connection instead of
+    checking one out per task.
+    """
+
+    def __init__(self, app, max_messages=100, max_wait_ms=10, metrics=None):
+        self.app = app
+        self.metrics = metrics or DispatchMetrics(config.metrics_interval)
+        self._buffer = FlushBuffer(self._publish_batch, max_messages, max_wait_ms, name='batch-dispatcher')
+
+    def dispatch(self, task, args, kwargs, task_id=None, on_error=None, on_success=None, **options):
+        """Queue a task for the next batch and return the id it will be published with
+
+        The callbacks run when the batch is published, as in `DirectDispatcher.dispatch`.
+        """
+        task_id = task_id or uuid()
+        self._buffer.add((task, args, kwargs, task_id, on_error, on_success, options))
+        return task_id
+
+    def flush(self):
+        """Publish everything currently buffered"""
+        self._buffer.flush()
+
+    def _publish_batch(self, batch):
+        started = time.monotonic()
+        # Tasks handled so far; the rest fail with the batch if the connection does
+        handled = 0
+        try:
+            with self.app.producer_or_acquire() as producer:
+                for _, (task, args, kwargs, task_id, on_error, on_success, options) in batch:
+                    try:
+                        task.apply_async(
+                            args=args,
+                            kwargs=kwargs,
+                            task_id=task_id,
+                            producer=producer,
+                            **options
+                        )
+                    except Exception as e:
+                        logger.error(f"Failed to dispatch {task.name} ({task_id}): {e}", exc_info=True)
+                        _run_callback(on_error, e)
+                    else:
+                        _run_callback(on_success)
+                    handled += 1
+        except Exception as e:
+            logger.error(f"Failed to publish a batch of {len(batch)} tasks: {e}", exc_info=True)
+            for _, (task, args, kwargs, task_id, on_error, on_success, options) in batch[handled:]:
+                _run_callback(on_error, e)
+
+        self.metrics.record_batch(
+            len(batch),
+            [started - queued_at for queued_at, _ in batch],
+            time.monotonic() - started
+        )
+        self.metrics.report_if_due()
+
+    def close(self):
+        """Stop the timer thread and publish anything still buffered"""
+        self._buffer.close()
+
+
+def create_dispatcher(app):
+    """Create the dispatcher selected in config.json"""
+    if config.dispatch_batch_enabled:
+        logger.info(f"Batching Celery dispatch: up to {config.dispatch_batch_max_messages} tasks "
+                    f"or {config.dispatch_batch_max_wait_ms} ms per batch")
+        return BatchDispatcher(
+            app,
+            max_messages=config.dispatch_batch_max_messages,
+            max_wait_ms=config.dispatch_batch_max_wait_ms
+        )
+    return DirectDispatcher()
@@ -0,0 +1,184 @@
+"""
+Launch the Celery worker pools from config.json and autoscale them locally.
+
+Run with `python -m daemon.pools`. Every pool in `worker_pools.pools` starts
+`min_workers` Celery worker processes with the pool's pool type,
+concurrency, prefetch and max-tasks-per-child. Every `autoscale_interval_s`
+the manager samples the depth of each pool's queues and the number of tasks
+its workers finished, estimates how long a newly queued task waits
+(queue depth / throughput) and:
+
+- starts another worker, up to `max_workers`, while the estimate is above
+  the pool's `target_latency_ms`
+- stops the newest worker, down to `min_workers`, once the pool's queues
+  have been empty for `scale_down_after_s`
+
+Stopped workers get a warm shutdown and finish the tasks they hold. Workers
+that exit on their own are replaced.
+"""
+import argparse
+import logging
+import math
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from daemon.utils.admission import ThroughputEstimator
+from daemon.utils.config import config
+from daemon.utils.priority import PriorityLanes
+from daemon.utils.redis_client import RedisClient
+from daemon.utils.worker_pools import WorkerPools
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+class PoolState:
+    """Worker processes and throughput estimate of one pool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.workers = []
+        self.next_index = 0
+        self.throughput = ThroughputEstimator()
+        self.idle_since = None
+
+
+class PoolManager:
+    """Start the worker processes of every pool and scale them with the backlog"""
+
+    def __init__(self, pool_names=None):
+        """
+        Args:
+            pool_names (list): Pools to run on this host (default: all of them)
+        """
+        self.worker_pools = WorkerPools(config.worker_pool_settings, PriorityLanes(config.priority_settings))
+        if not self.worker_pools.pools:
+            raise ValueError("No worker pools are configured in worker_pools.pools")
+        if not self.worker_pools.enabled:
+            logger.warning("worker_pools.enabled is false: the daemon routes every task to the lane "
+                           "queues, so only the default pool receives work")
+
+        names = pool_names or list(self.worker_pools.pools)
+        unknown = set(names) - set(self.worker_pools.pools)
+        if unknown:
+            raise ValueError(f"Unknown worker pools: {', '.join(sorted(unknown))}")
+        self.states = [PoolState(self.worker_pools.pools[name]) for name in names]
+
+        self.redis_client = RedisClient()
+        self.redis_client.test_connection()
+        self._stopping = threading.Event()
+
+    def start_worker(self, state):
+        """Start one more Celery worker process for a pool"""
+        pool = state.pool
+        command = [sys.executable, '-m', 'celery', '-A', 'daemon.tasks.tasks', 'worker',
+                   '--loglevel=info'] + pool.worker_args(state.next_index)
+        process = subprocess.Popen(command, cwd=PROJECT_ROOT)
+        state.next_index += 1
+        state.workers.append(process)
+        logger.info(f"Started worker {process.pid} for pool {pool.name} "
+                    f"({len(state.workers)}/{pool.max_workers}): {' '.join(command[3:])}")
+
+    def stop_worker(self, state):
+        """Stop the newest worker process of a pool with a warm shutdown"""
+        process = state.workers.pop()
+        process.send_signal(signal.SIGTERM)
+        logger.info(f"Stopping worker {process.pid} of pool {state.pool.name} "
+                    f"({len(state.workers)}/{state.pool.max_workers} left)")
+
+    def sample(self, state, now):
+        """Read the depth of a pool's queues and update its throughput estimate
+
+        Returns:
+            int: Number of tasks waiting in the pool's queues
+        """
+        pipe = self.redis_client.client.pipeline(transaction=False)
+        for queue in state.pool.queues:
+            pipe.llen(queue)
+        pipe.get(state.pool.completed_key)
+        *lengths, completed = pipe.execute()
+        state.throughput.update(completed, now)
+        return sum(lengths)
+
+    def autoscale(self, state):
+        """Replace exited workers and grow or shrink a pool towards its latency target"""
+        pool = state.pool
+        for process in [process for process in state.workers if process.poll() is not None]:
+            logger.error(f"Worker {process.pid} of pool {pool.name} exited with code {process.returncode}")
+            state.workers.remove(process)
+        while len(state.workers) < pool.min_workers:
+            self.start_worker(state)
+
+        now = time.monotonic()
+        depth = self.sample(state, now)
+        if depth:
+            state.idle_since = None
+            throughput = state.throughput.rate
+            wait = depth / throughput if throughput > 0 else math.inf
+            if wait > pool.target_latency and len(state.workers) < pool.max_workers:
+                logger.info(f"Pool {pool.name}: {depth} queued, {throughput:.1f}/s, "
+                            f"estimated wait {wait:.1f}s over target {pool.target_latency:.1f}s")
+                self.start_worker(state)
+        else:
+            if state.idle_since is None:
+                state.idle_since = now
+            if (now - state.idle_since >= self.worker_pools.scale_down_after
+                    and len(state.workers) > pool.min_workers):
+                self.stop_worker(state)
+                state.idle_since = now
+
+    def stop(self):
+        """Stop every worker process and wait for their warm shutdown"""
+        self._stopping.set()
+        processes = [process for state in self.states for process in state.workers]
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def run(self):
+        """Start every pool's workers and autoscale them until interrupted"""
+        for state in self.states:
+            logger.info(f"Pool {state.pool.name}: {state.pool.pool} x{state.pool.concurrency}, "
+                        f"queues {', '.join(state.pool.queues)}")
+        try:
+            while not self._stopping.is_set():
+                for state in self.states:
+                    try:
+                        self.autoscale(state)
+                    except Exception as e:
+                        logger.error(f"Autoscaling pool {state.pool.name} failed: {e}")
+                self._stopping.wait(self.worker_pools.autoscale_interval)
+        except KeyboardInterrupt:
+            logger.info("Pool manager shutting down")
+        finally:
+            self.stop()
+
+
+def main():
+    """Parse arguments and run the pool manager"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(prog='python -m daemon.pools', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('pools', nargs='*', help='Pools to run on this host (default: all)')
+    args = parser.parse_args()
+
+    try:
+        PoolManager(args.pools).run()
+    except Exception as e:
+        logger.error(f"Fatal error: {e}", exc_info=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,20 +7,104 @@ processes them, and dispatches the appropriate Celery tasks.
 import json
 import logging
 import traceback
-import importlib
+import os
+import socket
 import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+from celery.utils import uuid
+
 # Import utils and tasks
 from daemon.utils.redis_client import RedisClient
 from daemon.utils.config import config
-from daemon.tasks.tasks import generate_random_number, reverse_string
+from daemon.tasks.registry import TASK_REGISTRY, TaskValidationError
+from daemon.tasks.workflow import WORKFLOW_TASK_TYPE, Workflow
+from daemon.tasks.tasks import app as celery_app
+from daemon.tasks.base import FAN_OUT_KEY, FAN_OUT_CANCELLED_KEY, PROGRESS_TTL
+from daemon.dispatch import create_dispatcher
+from daemon.utils.admission import AdmissionController
+from daemon.utils.idempotency import IdempotencyStore
+from daemon.utils.result_cache import create_result_cache
+from daemon.utils.single_flight import create_single_flight
+from daemon.utils.codec import CodecError, truncate_for_log
+from daemon.utils.priority import PriorityLanes, is_expired, deadline_sort_key, deadline_to_datetime
+from daemon.utils.worker_pools import WorkerPools
+from daemon.utils.cancellation import CANCEL_ACTION, TaskOwners
+
+
+def build_dispatch_table():
+    """Compile the task registry into a task_type -> (validator, celery task) lookup
+
+    Validators and Celery task objects are resolved once at startup, so dispatch
+    cost does not grow with the number of registered task types.
+    """
+    table = {}
+    for task_type, spec in TASK_REGISTRY.items():
+        celery_task = celery_app.tasks.get(spec.celery_task)
+        if celery_task is None:
+            logger.error(f"Celery task {spec.celery_task} for {task_type} is not registered")
+            continue
+        table[task_type] = (spec.compile_validator(), celery_task)
+
+    # Workflows are validated here and run by the orchestration task in the workers
+    max_steps = config.workflow_settings.get('max_steps', 20)
+    table[WORKFLOW_TASK_TYPE] = (
+        lambda parameters: {'workflow': Workflow.from_dict(parameters, max_steps).to_dict()},
+        celery_app.tasks['daemon.tasks.orchestration.run_workflow']
+    )
+    return table
+
+
+class TaskRejected(Exception):
+    """Raised when a task cannot be dispatched; the message is reported to the user"""
+
+
+def resolve_task(dispatch_table, task_type, parameters):
+    """Look up a task in the dispatch table and validate its parameters
+
+    Returns:
+        tuple: (celery_task, kwargs) ready to be dispatched
+    """
+    entry = dispatch_table.get(task_type)
+    if entry is None:
+        raise TaskRejected(f"Task type not found: {task_type}")
+    
+    validate, celery_task = entry
+    try:
+        return celery_task, validate(parameters)
+    except TaskValidationError as e:
+        raise TaskRejected(str(e))
+
+
+class DispatchJob:
+    """A validated task, ready to be published to Celery"""
+    
+    def __init__(self, celery_task, user_id, task_type, kwargs, task_id,
+                 idempotency_key=None, options=None, lane=None, deadline=None):
+        self.celery_task = celery_task
+        self.user_id = user_id
+        self.task_type = task_type
+        self.kwargs = kwargs
+        self.task_id = task_id
+        self.idempotency_key = idempotency_key
+        # Extra apply_async options
+        self.options = options or {}
+        self.lane = lane
+        # Unix timestamp after which the task is no longer worth running
+        self.deadline = deadline
+        # Set when the job leads a single flight that other requests may attach to
+        self.single_flight = False
+    
+    @property
+    def sort_key(self):
+        """Dispatch order: higher priority lanes first, earliest deadline first within a lane"""
+        return (self.lane.rank if self.lane else 0, deadline_sort_key(self.deadline))
+
 
 class TaskProcessor:
     """
@@ -30,14 +114,46 @@ class TaskProcessor:
     It listens for task messages from the frontend (via Django API),
     and forwards them to the appropriate Celery task.
     """
-    def __init__(self):
-        """Initialize the task processor with Redis connection"""
+    def __init__(self, subscribe=True):
+        """Initialize the task processor with Redis connection
+        
+        Args:
+            subscribe (bool): Subscribe to the tasks channel or stream. Workers run by
+                the supervisor receive their tasks from it instead.
+        """
         logger.info("Initializing TaskProcessor...")
         
         try:
-            # Create Redis client
+            # Create Redis client and fail fast if Redis is unreachable
             self.redis_client = RedisClient()
-            self.pubsub = self.redis_client.create_pubsub()
+            self.redis_client.test_connection()
+            
+            # Subscribe to the tasks channel, or join the stream consumer group
+            if not subscribe:
+                self.pubsub = None
+            elif config.redis_streams_enabled:
+                self.consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+                self.redis_client.create_consumer_group()
+                self.pubsub = None
+            else:
+                self.pubsub = self.redis_client.create_pubsub()
+            
+            # Compile the dispatch table from the task registry
+            self.dispatch_table = build_dispatch_table()
+            self.dispatcher = create_dispatcher(celery_app)
+            self.admission = AdmissionController(self.redis_client.client, config.admission_settings)
+            self.idempotency = IdempotencyStore(self.redis_client.client, config.idempotency_ttl)
+            self.result_cache = create_result_cache(self.redis_client.client)
+            self.lanes = PriorityLanes(config.priority_settings)
+            self.worker_pools = WorkerPools(config.worker_pool_settings, self.lanes)
+            self.single_flight = create_single_flight(self.redis_client.client)
+            self.owners = TaskOwners(self.redis_client.client,
+                                     config.cancellation_settings.get('owner_ttl_s', 86400))
+            # Ids of recently cancelled tasks, so jobs still waiting for dispatch are dropped.
+            # Dispatch runs on executor threads, so access goes through the lock.
+            self.cancelled = OrderedDict()
+            self._cancelled_lock = threading.Lock()
+            self.remembered_cancellations = config.cancellation_settings.get('remembered_cancellations', 10000)
             
             # Print available tasks
             self.list_available_tasks()
@@ -47,107 +163,483 @@ class TaskProcessor:
             raise
     
     def list_available_tasks(self):
-        """List all available Celery tasks"""
-        try:
-            # Get tasks module
-            task_module = importlib.import_module('daemon.tasks.tasks')
-            
-            # Find all callable functions that don't start with _
-            tasks = [name for name in dir(task_module) 
-                    if callable(getattr(task_module, name)) and not name.startswith('_')]
-            
-            # Filter out non-task functions
-            tasks = [name for name in tasks if hasattr(getattr(task_module, name), 'delay')]
-            
-            logger.info(f"Available tasks: {tasks}")
-        except Exception as e:
-            logger.error(f"Error listing tasks: {e}")
+        """List all task types that can be dispatched"""
+        logger.info(f"Available tasks: {list(self.dispatch_table)}")
     
     def process_message(self, message):
-        """Process a message from Redis and dispatch to Celery"""
+        """Process a pub/sub message from Redis and dispatch to Celery"""
         if message['type'] == 'message':
             logger.info(f"Processing message: {message}")
-            
+            self.process_task_data(message['data'])
+    
+    def process_stream_entries(self, entries):
+        """Process a batch of stream entries and acknowledge them"""
+        entry_ids = []
+        jobs = []
+        for entry_id, fields in entries:
+            logger.info(f"Processing stream entry {entry_id}")
+            job = self.parse_task(fields.get(b'data'))
+            if job is not None:
+                jobs.append(job)
+            entry_ids.append(entry_id)
+        
+        # Earliest deadline first within each lane
+        jobs.sort(key=lambda job: job.sort_key)
+        for job in jobs:
             try:
-                # Parse the message
-                data = json.loads(message['data'])
-                user_id = data.get('user_id')
-                task_type = data.get('task_type')
-                parameters = data.get('parameters', {})
-                
-                logger.info(f"Received task: {task_type} (User: {user_id}, Parameters: {parameters})")
-                
-                if not task_type or not user_id:
-                    logger.error(f"Missing required task data: task_type={task_type}, user_id={user_id}")
-                    return
-                
-                # Process task based on type
-                if task_type == 'generate_random_number':
-                    min_value = parameters.get('min_value', 1)
-                    max_value = parameters.get('max_value', 100)
-                    
-                    logger.info(f"Dispatching generate_random_number({user_id}, {min_value}, {max_value})")
-                    
-                    # Dispatch task
-                    task = generate_random_number.delay(user_id, min_value, max_value)
-                    logger.info(f"Task dispatched with ID: {task.id}")
-                    
-                elif task_type == 'reverse_string':
-                    text = parameters.get('text', '')
-                    
-                    if not text:
-                        logger.error("Missing text for reverse_string task")
-                        # Publish error
-                        self.redis_client.publish_error(
-                            user_id=user_id,
-                            task_type=task_type,
-                            error_message="Missing 'text' parameter"
-                        )
-                        return
-                    
-                    logger.info(f"Dispatching reverse_string({user_id}, {text})")
-                    
-                    # Dispatch task
-                    task = reverse_string.delay(user_id, text)
-                    logger.info(f"Task dispatched with ID: {task.id}")
-                    
-                else:
-                    logger.warning(f"Unknown task type: {task_type}")
-                    
-                    # Publish error
-                    self.redis_client.publish_error(
-                        user_id=user_id,
-                        task_type=task_type,
-                        error_message=f"Task type not found: {task_type}"
-                    )
-                    
-            except json.JSONDecodeError as e:
-                logger.error(f"Invalid JSON in message: {e}", exc_info=True)
+                self.dispatch_job(job)
             except Exception as e:
-                logger.error(f"Error processing message: {e}", exc_info=True)
+                logger.error(f"Error dispatching {job.task_type} ({job.task_id}): {e}", exc_info=True)
+        
+        # Make sure every task in the batch reached the broker before acking
+        self.dispatcher.flush()
+        
+        # Entries are acked even when the task was rejected: errors have already
+        # been published to the user and redelivery would not change the outcome
+        self.redis_client.ack_tasks(entry_ids)
+    
+    def process_task_data(self, raw_data):
+        """Parse a task envelope and dispatch it to Celery"""
+        job = self.parse_task(raw_data)
+        if job is None:
+            return
+        try:
+            self.dispatch_job(job)
+        except Exception as e:
+            logger.error(f"Error processing message: {e}", exc_info=True)
+    
+    def parse_task(self, raw_data):
+        """Parse and prepare a raw task envelope
+        
+        Returns:
+            DispatchJob or None: The job to dispatch, or None if the message was rejected
+        """
+        try:
+            # Parse the message
+            data = self.redis_client.codec.decode(raw_data)
+            return self.prepare_task(data)
+        except CodecError as e:
+            logger.error(f"Invalid message: {e}")
+        except Exception as e:
+            logger.error(f"Error processing message: {e}", exc_info=True)
+        return None
+    
+    def prepare_task(self, data):
+        """Validate a task envelope and run the checks that precede dispatch
+        
+        Rejected tasks are reported to the user from here.
+        
+        Returns:
+            DispatchJob or None: The job to dispatch, or None if the task was rejected
+        """
+        if data.get('action') == CANCEL_ACTION:
+            self.cancel(data.get('user_id'), data.get('task_id'))
+            return None
+        
+        user_id = data.get('user_id')
+        task_type = data.get('task_type')
+        parameters = data.get('parameters', {})
+        
+        logger.info(f"Received task: {task_type} (User: {user_id}, Parameters: {truncate_for_log(parameters)})")
+        
+        if not task_type or not user_id:
+            logger.error(f"Missing required task data: task_type={task_type}, user_id={user_id}")
+            return None
+        
+        try:
+            celery_task, kwargs = resolve_task(self.dispatch_table, task_type, parameters)
+        except TaskRejected as e:
+            logger.warning(f"Rejected {task_type} task: {e}")
+            self.reject(data, str(e))
+            return None
+        
+        # Workflows have no declaration of their own
+        spec = TASK_REGISTRY.get(task_type)
+        
+        # Route to the requested lane, or the task type's default lane
+        priority = data.get('priority')
+        if priority is not None and not isinstance(priority, str):
+            logger.warning(f"Rejected {task_type} task: invalid priority {priority!r}")
+            self.reject(data, "Invalid priority: expected a lane name")
+            return None
+        try:
+            lane = self.lanes.get(priority, fallback=spec.priority if spec else None)
+        except KeyError:
+            logger.warning(f"Rejected {task_type} task: unknown priority {priority}")
+            self.reject(data, f"Unknown priority: {priority}")
+            return None
+        
+        deadline = data.get('deadline')
+        if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float))):
+            logger.warning(f"Rejected {task_type} task: invalid deadline {deadline!r}")
+            self.reject(data, "Invalid deadline: expected a Unix timestamp")
+            return None
+        # Past deadlines are reported as expired below; far-future ones would overflow `expires`
+        if deadline is not None and not 0 <= deadline <= time.time() + self.lanes.max_deadline:
+            logger.warning(f"Rejected {task_type} task: deadline {deadline!r} out of range")
+            self.reject(data, f"Invalid deadline: must be at most {self.lanes.max_deadline} seconds from now")
+            return None
+        
+        # Answer repeated calls of deterministic tasks without going through Celery
+        if self.serve_cached_result(data, task_type, kwargs):
+            return None
+        
+        # Shed load instead of queueing work that would wait too long
+        decision = self.admission.check()
+        if not decision:
+            logger.warning(f"Rejecting {task_type} task, broker overloaded: {decision}")
+            self.reject(data, f"System overloaded, retry in {decision.retry_after} seconds")
+            return None
+        
+        job = DispatchJob(
+            celery_task=celery_task,
+            user_id=user_id,
+            task_type=task_type,
+            kwargs=kwargs,
+            task_id=data.get('task_id') or uuid(),
+            idempotency_key=data.get('idempotency_key'),
+            options=self.dispatch_options(task_type, lane, deadline),
+            lane=lane,
+            deadline=deadline
+        )
+        
+        # Nobody is waiting for the result any more
+        if is_expired(deadline):
+            self.expired(job)
+            return None
+        
+        # Suppress repeated submissions of the same idempotency key
+        if job.idempotency_key:
+            original = self.idempotency.claim(user_id, job.idempotency_key, job.task_id)
+            if original is not None:
+                logger.info(f"Duplicate submission of {task_type} (key {job.idempotency_key}), "
+                            f"original task {original.get('task_id')}")
+                self.redis_client.publish_task_result(
+                    user_id=user_id,
+                    task_id=job.task_id,
+                    task_type=task_type,
+                    status="duplicate",
+                    result={
+                        "original_task_id": original.get('task_id'),
+                        "original_status": original.get('status')
+                    }
+                )
+                return None
+        
+        # Attach to an identical task that is already running instead of dispatching again
+        if self.single_flight is not None and spec is not None and spec.single_flight:
+            leader = self.single_flight.join(task_type, kwargs, user_id, job.task_id, lane=lane.name)
+            if leader is not None:
+                logger.info(f"Coalescing {task_type} task {job.task_id} into in-flight task {leader}")
+                if job.idempotency_key:
+                    self.idempotency.update_status(user_id, job.idempotency_key, job.task_id, 'coalesced')
+                return None
+            job.single_flight = True
+        
+        return job
+    
+    def dispatch_options(self, task_type, lane, deadline=None):
+        """Get the apply_async options routing a task to its lane, with its limits and deadline"""
+        options = lane.apply_async_options()
+        # Task types with a dedicated worker pool use the pool's queue for the lane
+        options['queue'] = self.worker_pools.queue_for(task_type, lane)
+        if deadline is not None:
+            # Workers discard the task if it is still queued when the deadline passes
+            options['expires'] = deadline_to_datetime(deadline)
+        spec = TASK_REGISTRY.get(task_type)
+        if spec is not None:
+            options.update(spec.time_limit_options())
+        return options
+    
+    def serve_cached_result(self, data, task_type, kwargs):
+        """Publish the cached result of a cacheable task, if there is one
+        
+        Returns:
+            bool: True if the task was answered from the cache
+        """
+        spec = TASK_REGISTRY.get(task_type)
+        if self.result_cache is None or spec is None or not spec.cacheable:
+            return False
+        
+        result = self.result_cache.get(task_type, kwargs)
+        self.result_cache.report_if_due()
+        if result is None:
+            return False
+        
+        task_id = data.get('task_id') or uuid()
+        logger.info(f"Serving {task_type} task {task_id} from the result cache")
+        self.redis_client.publish_task_result(
+            user_id=data['user_id'],
+            task_id=task_id,
+            task_type=task_type,
+            result=result,
+            extra={"cached": True}
+        )
+        if data.get('idempotency_key'):
+            self.idempotency.update_status(data['user_id'], data['idempotency_key'], task_id, 'completed')
+        return True
+    
+    def reject(self, data, error_message):
+        """Report a task rejected before dispatch and free its idempotency key
+        
+        The API claims the key before queueing the task, so without releasing
+        it a retry with the same key would get the id of a task that never ran.
+        """
+        user_id = data.get('user_id')
+        self.redis_client.publish_error(
+            user_id=user_id,
+            task_type=data.get('task_type'),
+            error_message=error_message
+        )
+        if data.get('idempotency_key'):
+            self.idempotency.release(user_id, data['idempotency_key'], task_id=data.get('task_id'))
+    
+    def cancel(self, user_id, task_id):
+        """Cancel a task at its user's request
+        
+        The task is revoked in Celery, so workers discard it if it is queued and
+        terminate it if it is running, and reports it to the user. A job still
+        waiting for dispatch here is dropped by `dispatch_job` instead.
+        """
+        if not task_id or not self.owners.owns(task_id, user_id):
+            logger.warning(f"Ignoring cancellation of task {task_id} by user {user_id}: not its owner")
+            return
+        
+        with self._cancelled_lock:
+            self.cancelled[task_id] = True
+            while len(self.cancelled) > self.remembered_cancellations:
+                self.cancelled.popitem(last=False)
+        
+        flight = self.single_flight.leave(task_id) if self.single_flight is not None else None
+        if flight is not None:
+            role, task, successor = flight
+            if role == 'waiter':
+                # Coalesced into another request, so there is nothing to revoke
+                logger.info(f"Cancelled task {task_id} for user {user_id}: left its single flight")
+                self.redis_client.publish_cancelled(user_id, task['task_type'] if task else None, task_id)
+                return
+            if successor is not None:
+                self.dispatch_successor(task, successor)
+        
+        # Running workflows are stopped between steps: no further step is started
+        workflow_key = f"workflow:{task_id}"
+        if self.redis_client.client.exists(workflow_key):
+            if self.redis_client.client.hsetnx(workflow_key, 'failed', 'cancelled'):
+                logger.info(f"Cancelled workflow {task_id} for user {user_id}")
+                self.redis_client.publish_cancelled(user_id, WORKFLOW_TASK_TYPE, task_id)
+            return
+        
+        celery_app.control.revoke(task_id, terminate=True, signal='SIGTERM')
+        logger.info(f"Revoked task {task_id} for user {user_id}")
+        self.cancel_fan_out(user_id, task_id)
+    
+    def cancel_fan_out(self, user_id, task_id):
+        """Revoke the chunk and reduce tasks of a task that fanned out into a chord
+        
+        The task itself finished when it sent the chord, so revoking its id
+        does not stop them, and no worker reports them as cancelled.
+        """
+        record = self.redis_client.client.get(FAN_OUT_KEY.format(task_id=task_id))
+        if record is None:
+            return
+        fan_out = json.loads(record)
+        self.redis_client.client.set(FAN_OUT_CANCELLED_KEY.format(task_id=task_id), 1, ex=PROGRESS_TTL)
+        celery_app.control.revoke(fan_out['task_ids'], terminate=True, signal='SIGTERM')
+        logger.info(f"Revoked {len(fan_out['task_ids'])} chord tasks of {task_id} for user {user_id}")
+        self.redis_client.publish_cancelled(user_id, fan_out['task_type'], task_id, terminated=True)
+    
+    def dispatch_successor(self, task, successor):
+        """Dispatch the waiter that took over the flight of a cancelled leader
+        
+        Args:
+            task (dict): The flight's {task_type, params, lane}
+            successor (dict): The {user_id, task_id} of the waiter
+        """
+        if task is None or task['task_type'] not in self.dispatch_table:
+            self.redis_client.publish_error(
+                user_id=successor['user_id'],
+                task_type=task['task_type'] if task else None,
+                error_message="Shared task was cancelled",
+                task_id=successor['task_id']
+            )
+            return
+        
+        task_type = task['task_type']
+        spec = TASK_REGISTRY.get(task_type)
+        lane = self.lanes.get(task.get('lane'), fallback=spec.priority if spec else None)
+        job = DispatchJob(
+            celery_task=self.dispatch_table[task_type][1],
+            user_id=successor['user_id'],
+            task_type=task_type,
+            kwargs=task['params'],
+            task_id=successor['task_id'],
+            options=self.dispatch_options(task_type, lane),
+            lane=lane
+        )
+        # The flight now belongs to this job; its waiters get its result
+        job.single_flight = True
+        logger.info(f"Task {successor['task_id']} takes over the single flight of a cancelled {task_type} task")
+        self.dispatch_job(job)
+    
+    def is_cancelled(self, job):
+        """Whether a job was cancelled before it was dispatched"""
+        with self._cancelled_lock:
+            return job.task_id in self.cancelled
+    
+    def dispatch_job(self, job):
+        """Hand a prepared job to the dispatcher"""
+        # The deadline may have passed while the job waited behind others
+        if is_expired(job.deadline):
+            self.expired(job)
+            return
+        if self.is_cancelled(job):
+            self.dropped_cancelled(job)
+            return
+        
+        logger.info(f"Dispatching {job.task_type}({job.user_id}, {truncate_for_log(job.kwargs)}) to {job.lane.name} lane")
+        
+        # Dispatch task
+        self.dispatcher.dispatch(
+            job.celery_task,
+            args=(job.user_id,),
+            kwargs=job.kwargs,
+            task_id=job.task_id,
+            on_error=partial(self.dispatch_failed, job),
+            on_success=partial(self.dispatched, job),
+            **job.options
+        )
+        logger.info(f"Task dispatched with ID: {job.task_id}")
+    
+    def dispatched(self, job):
+        """Record that a job was accepted by the broker"""
+        if job.idempotency_key:
+            self.idempotency.update_status(job.user_id, job.idempotency_key, job.task_id, 'dispatched')
+    
+    def expired(self, job):
+        """Report a job dropped because its deadline passed before dispatch"""
+        logger.warning(f"Dropping {job.task_type} task {job.task_id}: deadline passed before dispatch")
+        self.redis_client.publish_task_result(
+            user_id=job.user_id,
+            task_id=job.task_id,
+            task_type=job.task_type,
+            status="expired",
+            result={"deadline": job.deadline}
+        )
+        if job.idempotency_key:
+            self.idempotency.update_status(job.user_id, job.idempotency_key, job.task_id, 'expired')
+        self.abandon_flight(job, "Shared task expired before it could be dispatched")
+    
+    def dropped_cancelled(self, job):
+        """Report a job dropped because it was cancelled before dispatch"""
+        logger.info(f"Dropping {job.task_type} task {job.task_id}: cancelled before dispatch")
+        self.redis_client.publish_cancelled(job.user_id, job.task_type, job.task_id)
+        if job.idempotency_key:
+            self.idempotency.update_status(job.user_id, job.idempotency_key, job.task_id, 'cancelled')
+        self.abandon_flight(job, "Shared task was cancelled before it could be dispatched")
+    
+    def dispatch_failed(self, job, exc):
+        """Report a job the broker did not accept"""
+        self.redis_client.publish_error(
+            user_id=job.user_id,
+            task_type=job.task_type,
+            error_message=f"Failed to dispatch task: {exc}",
+            task_id=job.task_id
+        )
+        # Let a retry with the same key go through
+        if job.idempotency_key:
+            self.idempotency.release(job.user_id, job.idempotency_key)
+        self.abandon_flight(job, f"Failed to dispatch task: {exc}")
+    
+    def abandon_flight(self, job, error_message):
+        """End the flight led by a job that will not run, failing the requests attached to it"""
+        if not job.single_flight:
+            return
+        for waiter in self.single_flight.complete(job.task_type, job.kwargs, job.task_id):
+            self.redis_client.publish_error(
+                user_id=waiter['user_id'],
+                task_type=job.task_type,
+                error_message=error_message,
+                task_id=waiter['task_id']
+            )
+    
+    def reclaim_stale_tasks(self):
+        """Take over and process entries left pending by a crashed daemon instance"""
+        entries = self.redis_client.claim_stale_tasks(
+            self.consumer_name,
+            min_idle_ms=config.redis_stream_claim_idle_ms,
+            count=config.redis_stream_batch_size
+        )
+        if entries:
+            logger.warning(f"Reclaimed {len(entries)} stale stream entries")
+            self.process_stream_entries(entries)
+    
+    def run_streams(self):
+        """Consume the tasks stream in batches as a member of the consumer group"""
+        logger.info(f"Consuming tasks stream {config.redis_tasks_stream} "
+                    f"as {self.consumer_name} in group {config.redis_consumer_group}")
+        
+        claim_interval = config.redis_stream_claim_idle_ms / 1000
+        last_claim = 0.0
+        
+        while True:
+            # Periodically recover entries whose consumer died before acking
+            now = time.monotonic()
+            if now - last_claim >= claim_interval:
+                last_claim = now
+                self.reclaim_stale_tasks()
+            
+            entries = self.redis_client.read_task_batch(
+                self.consumer_name,
+                count=config.redis_stream_batch_size,
+                block_ms=config.redis_stream_block_ms
+            )
+            if entries:
+                self.process_stream_entries(entries)
     
     def run(self):
         """Run the task processor"""
         logger.info("Task processor started")
-        logger.info(f"Listening for tasks on Redis channel: {config.redis_tasks_channel}")
         
         try:
-            # Listen for messages
-            for message in self.pubsub.listen():
-                self.process_message(message)
+            if config.redis_streams_enabled:
+                self.run_streams()
+            else:
+                logger.info(f"Listening for tasks on Redis channel: {config.redis_tasks_channel}")
+                
+                # Listen for messages
+                for message in self.pubsub.listen():
+                    self.process_message(message)
         except KeyboardInterrupt:
             logger.info("Task processor shutting down")
         except Exception as e:
             logger.error(f"Error in processor main loop: {e}", exc_info=True)
             raise
+        finally:
+            # Publish any tasks still waiting in a dispatch batch
+            self.dispatcher.close()
 
 
 def main():
     """Main entry point for the daemon"""
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     try:
         logger.info("Starting task processor...")
-        processor = TaskProcessor()
-        processor.run()
+        if config.asyncio_enabled:
+            # Imported here because the async processor reuses this module's helpers
+            import asyncio
+            from daemon.async_processor import AsyncTaskProcessor
+            try:
+                asyncio.run(AsyncTaskProcessor().run())
+            except KeyboardInterrupt:
+                logger.info("Task processor shutting down")
+        else:
+            processor = TaskProcessor()
+            processor.run()
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
         sys.exit(1)
@@ -0,0 +1,259 @@
+"""
+Multi-process supervisor for the task processor.
+
+The supervisor owns the only subscription to the tasks channel (or stream)
+and routes every task to one of N processor worker processes by hashing its
+`user_id`. Tasks from the same user always land on the same worker, so they
+are dispatched in the order they were submitted, while different users are
+spread across all cores. Crashed workers are restarted on the same shard and
+per-shard throughput is logged periodically.
+
+With Redis Streams, workers ack the entries they were handed only after
+their dispatcher has flushed them to the broker, so entries still queued or
+in flight when a process dies stay pending and are reclaimed. The
+supervisor tracks the entries it handed to workers until they are acked and
+does not reclaim those, so an entry waiting behind a slow worker is not
+routed twice.
+"""
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import socket
+import threading
+import time
+import zlib
+
+from daemon.utils.config import config
+from daemon.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(user_id, num_shards):
+    """Map a user id to a shard index
+
+    Uses CRC32 rather than hash() so the mapping is stable across processes
+    and restarts.
+    """
+    return zlib.crc32(str(user_id).encode()) % num_shards
+
+
+def worker_main(shard, queue, counter, acked):
+    """Entry point of a processor worker: dispatch every task routed to this shard
+
+    Queue items are `(raw_data, entry_id)`; `entry_id` is the stream entry to
+    ack once the task reached the broker, or None for pub/sub messages. Acked
+    entry ids are reported back to the supervisor on `acked`.
+    """
+    # Imported in the worker so the supervisor itself never loads Celery
+    from daemon.processor import TaskProcessor
+
+    logger.info(f"Processor worker for shard {shard} started (pid {os.getpid()})")
+    processor = TaskProcessor(subscribe=False)
+    try:
+        stopping = False
+        while not stopping:
+            # Take whatever is already queued, up to a stream batch
+            items = [queue.get()]
+            while len(items) < config.redis_stream_batch_size:
+                try:
+                    items.append(queue.get_nowait())
+                except queue_module.Empty:
+                    break
+            if None in items:
+                stopping = True
+                items = items[:items.index(None)]
+
+            entry_ids = []
+            for raw_data, entry_id in items:
+                processor.process_task_data(raw_data)
+                if entry_id is not None:
+                    entry_ids.append(entry_id)
+
+            # Make sure every task in the batch reached the broker before acking
+            processor.dispatcher.flush()
+            if entry_ids:
+                processor.redis_client.ack_tasks(entry_ids)
+                acked.put(entry_ids)
+            with counter.get_lock():
+                counter.value += len(items)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        processor.dispatcher.close()
+        logger.info(f"Processor worker for shard {shard} stopped")
+
+
+class Supervisor:
+    """Start, route tasks to, monitor and restart processor worker processes"""
+
+    def __init__(self, num_workers=None):
+        self.num_workers = num_workers or config.supervisor_workers or os.cpu_count() or 1
+        self.ctx = multiprocessing.get_context()
+        self.queues = [self.ctx.Queue(maxsize=config.supervisor_queue_size)
+                       for _ in range(self.num_workers)]
+        self.counters = [self.ctx.Value('L', 0) for _ in range(self.num_workers)]
+        self.workers = [None] * self.num_workers
+        # Stream entries handed to a worker and not acked yet -> shard
+        self.in_flight = {}
+        self.acked = self.ctx.Queue()
+        self._in_flight_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.redis_client = RedisClient()
+        self.redis_client.test_connection()
+
+    def start_worker(self, shard):
+        """Start (or restart) the worker process for a shard"""
+        process = self.ctx.Process(
+            target=worker_main,
+            args=(shard, self.queues[shard], self.counters[shard], self.acked),
+            name=f"task-processor-{shard}",
+            daemon=True
+        )
+        process.start()
+        self.workers[shard] = process
+        logger.info(f"Started worker {process.pid} for shard {shard}")
+
+    def route(self, raw_data, entry_id=None):
+        """Hand a raw task envelope to the worker owning its user
+
+        Args:
+            entry_id: Stream entry the worker acks after dispatching the task
+        """
+        try:
+            user_id = self.redis_client.codec.decode(raw_data).get('user_id')
+        except (TypeError, ValueError, AttributeError):
+            # Let a worker log and discard the malformed message
+            user_id = None
+        shard = shard_for(user_id, self.num_workers)
+        if entry_id is not None:
+            with self._in_flight_lock:
+                self.in_flight[entry_id] = shard
+        # Blocks while the worker is behind, which slows down intake
+        self.queues[shard].put((raw_data, entry_id))
+
+    def collect_acks(self):
+        """Forget the entries workers have acked since the last call"""
+        while True:
+            try:
+                entry_ids = self.acked.get_nowait()
+            except queue_module.Empty:
+                return
+            with self._in_flight_lock:
+                for entry_id in entry_ids:
+                    self.in_flight.pop(entry_id, None)
+
+    def forget_shard(self, shard):
+        """Let the entries of a crashed worker be reclaimed
+
+        Some may still be in its queue and get dispatched twice, which
+        at-least-once delivery allows.
+        """
+        with self._in_flight_lock:
+            self.in_flight = {
+                entry_id: owner for entry_id, owner in self.in_flight.items() if owner != shard
+            }
+
+    def monitor(self):
+        """Restart crashed workers and log per-shard throughput"""
+        last_counts = [0] * self.num_workers
+        last_report = time.monotonic()
+
+        while not self._stopping.wait(1):
+            for shard, process in enumerate(self.workers):
+                if not process.is_alive():
+                    logger.error(f"Worker for shard {shard} exited with code {process.exitcode}, restarting")
+                    self.forget_shard(shard)
+                    time.sleep(config.supervisor_restart_delay)
+                    if not self._stopping.is_set():
+                        self.start_worker(shard)
+
+            now = time.monotonic()
+            if now - last_report >= config.metrics_interval:
+                counts = [counter.value for counter in self.counters]
+                elapsed = now - last_report
+                rates = ", ".join(
+                    f"shard {shard}: {(counts[shard] - last_counts[shard]) / elapsed:.1f}/s"
+                    for shard in range(self.num_workers)
+                )
+                logger.info(f"Processor throughput - {rates}")
+                last_counts = counts
+                last_report = now
+
+    def read_pubsub(self):
+        """Route messages from the tasks channel"""
+        logger.info(f"Listening for tasks on Redis channel: {config.redis_tasks_channel}")
+        for message in self.redis_client.create_pubsub().listen():
+            if message['type'] == 'message':
+                self.route(message['data'])
+
+    def read_stream(self):
+        """Route entries from the tasks stream
+
+        Workers ack the entries after dispatching them; entries lost with a
+        worker or the supervisor stay pending and are reclaimed here once they
+        have been idle for `claim_idle_ms`. Entries still waiting in a worker's
+        queue are skipped.
+        """
+        consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+        self.redis_client.create_consumer_group()
+        logger.info(f"Consuming tasks stream {config.redis_tasks_stream} as {consumer_name}")
+
+        claim_interval = config.redis_stream_claim_idle_ms / 1000
+        last_claim = 0.0
+        while True:
+            self.collect_acks()
+            entries = []
+            now = time.monotonic()
+            if now - last_claim >= claim_interval:
+                last_claim = now
+                entries = self.redis_client.claim_stale_tasks(
+                    consumer_name,
+                    min_idle_ms=config.redis_stream_claim_idle_ms,
+                    count=config.redis_stream_batch_size
+                )
+                with self._in_flight_lock:
+                    entries = [entry for entry in entries if entry[0] not in self.in_flight]
+            if not entries:
+                entries = self.redis_client.read_task_batch(
+                    consumer_name,
+                    count=config.redis_stream_batch_size,
+                    block_ms=config.redis_stream_block_ms
+                )
+            for entry_id, fields in entries:
+                self.route(fields.get(b'data'), entry_id)
+
+    def stop(self):
+        """Ask every worker to finish its queue and exit"""
+        self._stopping.set()
+        for queue in self.queues:
+            try:
+                # A dead worker leaves its queue full; it is terminated below
+                queue.put(None, timeout=1)
+            except queue_module.Full:
+                pass
+        for process in self.workers:
+            if process is not None:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+
+    def run(self):
+        """Start the workers and route tasks until interrupted"""
+        logger.info(f"Starting supervisor with {self.num_workers} processor workers")
+        for shard in range(self.num_workers):
+            self.start_worker(shard)
+
+        monitor = threading.Thread(target=self.monitor, name='supervisor-monitor', daemon=True)
+        monitor.start()
+
+        try:
+            if config.redis_streams_enabled:
+                self.read_stream()
+            else:
+                self.read_pubsub()
+        except KeyboardInterrupt:
+            logger.info("Supervisor shutting down")
+        finally:
+            self.stop()
@@ -0,0 +1,497 @@
+"""
+Base class and shared runtime for Celery tasks that report to users over Redis.
+
+Task functions only compute their result. `EventTask` serves it from the
+result cache when the task is cacheable, publishes it (or the error) to the
+results channel, shares it with requests coalesced into the task's single
+flight, and records timing and completion for admission control.
+
+Task functions written as generators stream what they yield to the user
+as throttled progress frames (see `progress.py`) before the final result;
+bound tasks can call `self.report_progress` instead.
+
+Tasks declared with a `Split` in the registry fan large inputs out as a
+Celery chord: one `map_chunk` per chunk, in parallel across workers, and a
+`reduce_chunks` callback that combines the chunk results with the task's
+`combine` function and publishes a single result. Chunk tasks keep their
+results in the backend, since the chord collects them from there.
+
+Tasks run under the soft and hard time limits declared in the registry
+(or the `time_limits` defaults). A task interrupted by its soft limit, or
+whose process is killed at the hard limit, is reported to its user as
+`timeout`; a task revoked by a cancellation request, whether discarded
+from the queue or terminated while running, as `cancelled`. A fanned-out
+task records its chord's task ids, which the daemon revokes on cancel.
+
+Results reach users over pub/sub, so tasks declared with
+`ignore_result=True` skip the Celery result backend and cost one Redis
+write instead of two. Keep the backend only for tasks whose results are read
+through `AsyncResult`.
+
+Like `tasks.py`, importing this module does no I/O: the Redis connection,
+the buffered publisher and the caches are created on first use.
+"""
+import inspect
+import json
+import logging
+import threading
+import time
+from functools import lru_cache
+from celery import Task, chord, shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import task_revoked, worker_process_shutdown, worker_shutdown
+from celery.utils import uuid
+from celery.worker.request import Request
+from ..utils.redis_client import RedisClient
+from ..utils.result_cache import create_result_cache
+from ..utils.single_flight import create_single_flight
+from ..utils.result_publisher import create_result_publisher
+from ..utils.config import config
+from ..utils.priority import PriorityLanes
+from ..utils.worker_pools import WorkerPools
+from .registry import get_task_spec
+from .progress import Progress, ProgressStream
+
+logger = logging.getLogger(__name__)
+
+# Seconds the per-task count of completed chunks is kept for progress frames
+PROGRESS_TTL = 3600
+
+# Task type and chord task ids of a fanned-out task, so cancelling it revokes its chunks
+FAN_OUT_KEY = 'map_reduce:{task_id}:tasks'
+
+# Set when a fanned-out task is cancelled, so its chord failure is not reported as an error
+FAN_OUT_CANCELLED_KEY = 'map_reduce:{task_id}:cancelled'
+
+# Buffered result publisher of this worker process, created on first publish
+_result_publisher = None
+_result_publisher_created = False
+_result_publisher_lock = threading.Lock()
+
+
+def get_result_publisher():
+    """Get this process's buffered result publisher, or None to publish directly"""
+    global _result_publisher, _result_publisher_created
+    if not _result_publisher_created:
+        with _result_publisher_lock:
+            if not _result_publisher_created:
+                _result_publisher = create_result_publisher(redis_client.client)
+                _result_publisher_created = True
+    return _result_publisher
+
+
+# Initialize Redis client (connects on first use); results go through the buffered publisher
+redis_client = RedisClient(publisher_factory=get_result_publisher)
+
+
+@lru_cache(maxsize=None)
+def get_result_cache():
+    """Per-worker result cache in front of the shared Redis tier, or None if disabled"""
+    return create_result_cache(redis_client.client)
+
+
+@lru_cache(maxsize=None)
+def get_single_flight():
+    """Tracks requests coalesced into the tasks this worker runs, or None if disabled"""
+    return create_single_flight(redis_client.client)
+
+
+@lru_cache(maxsize=None)
+def get_worker_pools():
+    """Configured worker pools, to attribute finished tasks to the pool that ran them"""
+    return WorkerPools(config.worker_pool_settings, PriorityLanes(config.priority_settings))
+
+
+def record_completion(request):
+    """Count a finished task for admission control and for its worker pool's autoscaler"""
+    queue = (request.delivery_info or {}).get('routing_key')
+    redis_client.record_task_completion(get_worker_pools().pool_for_queue(queue))
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_result_publisher(**kwargs):
+    """Publish buffered results before a worker process exits"""
+    if _result_publisher is not None:
+        _result_publisher.close()
+
+
+@task_revoked.connect
+def publish_revoked(sender=None, request=None, terminated=False, expired=False, **kwargs):
+    """Report a user-facing task that was revoked before or while it ran to its user
+
+    Tasks revoked by a cancellation request are reported as `cancelled`, tasks
+    discarded because their deadline passed in the queue as `expired`.
+    """
+    task_type = sender.get_task_type() if isinstance(sender, EventTask) else getattr(sender, 'task_type', None)
+    args = getattr(request, 'args', None) or ()
+    # Chunks and workflow steps are reported through the task they belong to
+    if task_type is None or not args:
+        return
+
+    user_id = args[0]
+    try:
+        if expired:
+            redis_client.publish_task_result(
+                user_id=user_id,
+                task_id=request.id,
+                task_type=task_type,
+                status="expired"
+            )
+        else:
+            logger.info(f"Task {task_type} ({request.id}) cancelled{' while running' if terminated else ''}")
+            redis_client.publish_cancelled(user_id, task_type, request.id, terminated=terminated)
+        if isinstance(sender, EventTask):
+            finish_flight(task_type, getattr(request, 'kwargs', None) or {}, request.id,
+                          error="Shared task was cancelled")
+        record_completion(request)
+    except Exception as e:
+        logger.error(f"Failed to report revoked task {task_type} ({request.id}): {e}")
+
+
+def run_cached(task_type, params, compute):
+    """Compute a task result, memoized if the task is declared cacheable
+
+    Args:
+        task_type (str): Registered task type
+        params (dict): Validated task parameters the result depends on
+        compute (callable): Produces the result published to the user
+
+    Returns:
+        tuple: (result, cached) where `cached` tells whether compute was skipped
+    """
+    result = lookup_cached(task_type, params)
+    if result is not None:
+        return result, True
+
+    result = compute()
+    store_cached(task_type, params, result)
+    return result, False
+
+
+def lookup_cached(task_type, params):
+    """Get the cached result of a cacheable task, or None"""
+    spec = get_task_spec(task_type)
+    result_cache = get_result_cache()
+    if result_cache is None or spec is None or not spec.cacheable:
+        return None
+    return result_cache.get(task_type, params)
+
+
+def store_cached(task_type, params, result):
+    """Cache the result of a cacheable task"""
+    spec = get_task_spec(task_type)
+    result_cache = get_result_cache()
+    if result_cache is None or spec is None or not spec.cacheable:
+        return
+    result_cache.set(task_type, params, result, ttl=spec.cache_ttl)
+    result_cache.report_if_due()
+
+
+def finish_flight(task_type, params, task_id, result=None, error=None):
+    """Publish a task's outcome to the requests that attached to its single flight
+
+    Args:
+        task_type (str): Registered task type
+        params (dict): Validated task parameters, as used by the daemon to join the flight
+        task_id (str): Id of the task that led the flight
+        result (dict): Result published to the user, on success
+        error (str): Error message, if the task failed
+    """
+    spec = get_task_spec(task_type)
+    single_flight = get_single_flight()
+    if single_flight is None or spec is None or not spec.single_flight:
+        return
+
+    try:
+        waiters = single_flight.complete(task_type, params, task_id)
+    except Exception as e:
+        logger.error(f"Failed to complete single flight of {task_type} ({task_id}): {e}")
+        return
+
+    for waiter in waiters:
+        if error is None:
+            redis_client.publish_task_result(
+                user_id=waiter['user_id'],
+                task_id=waiter['task_id'],
+                task_type=task_type,
+                result=result,
+                extra={"coalesced_with": task_id}
+            )
+        else:
+            redis_client.publish_error(
+                user_id=waiter['user_id'],
+                task_type=task_type,
+                error_message=error,
+                task_id=waiter['task_id']
+            )
+
+
+class EventRequest(Request):
+    """Worker-side request of an `EventTask`, reporting hard time limits to the user
+
+    A task that hits its hard time limit is killed with its worker process,
+    so the report is made from the worker's main process instead.
+    """
+
+    def on_timeout(self, soft, timeout):
+        super().on_timeout(soft, timeout)
+        # Soft limits are raised inside the task and reported by EventTask
+        if soft or not self.args:
+            return
+
+        task_type = self.task.get_task_type()
+        error = f"Task exceeded its time limit of {timeout} seconds"
+        try:
+            redis_client.publish_timeout(self.args[0], task_type, self.id, time_limit=timeout)
+            finish_flight(task_type, self.kwargs, self.id, error=error)
+            record_completion(self)
+        except Exception as e:
+            logger.error(f"Failed to report timeout of {task_type} ({self.id}): {e}")
+
+
+class EventTask(Task):
+    """Celery task whose result is published to the submitting user
+
+    The task function is called as `run(user_id, **params)` and returns the
+    result payload (a dict). Everything around it - caching, publishing,
+    error reporting, single-flight completion and timing - happens here.
+
+    Generator task functions yield `Progress` updates and partial results,
+    which are streamed to the user, and return the final result (by default
+    the last partial result). Tasks declared with `bind=True` can report
+    progress with `self.report_progress(percent, message, partial)`.
+
+    Splittable tasks also set `combine`, a staticmethod reducing
+    `(params, chunk_results)` to the result of the whole input.
+    """
+
+    Request = 'daemon.tasks.base:EventRequest'
+
+    # Registered task type; defaults to the last component of the Celery task name
+    task_type = None
+
+    # Reduces chunk results of a splittable task, in chunk order
+    combine = None
+
+    def get_task_type(self):
+        """Get the registered task type this task runs"""
+        return self.task_type or self.name.rsplit('.', 1)[-1]
+
+    def __call__(self, user_id, **params):
+        task_type = self.get_task_type()
+        task_id = self.request.id
+        started = time.time()
+        logger.info(f"TASK START: {task_type} for user {user_id}")
+
+        try:
+            chunks = self.split(task_type, params)
+            if chunks is not None:
+                result = lookup_cached(task_type, params)
+                if result is None:
+                    self.fan_out(user_id, task_type, task_id, params, chunks, started)
+                    return None
+                cached = True
+            else:
+                stream = self.request.progress_stream = ProgressStream(
+                    lambda progress, partials: self.publish_progress(user_id, task_type, task_id, progress, partials),
+                    config.progress_settings.get('min_interval_ms', 250)
+                )
+                try:
+                    result, cached = run_cached(task_type, params, lambda: self.execute(user_id, params))
+                finally:
+                    # Updates still held back by the throttle go out before the final result
+                    stream.flush()
+
+            self.deliver(user_id, task_type, task_id, params, result, started, cached=cached)
+            return result
+        except SoftTimeLimitExceeded:
+            time_limit = (self.request.timelimit or (None, None))[1] or self.app.conf.task_soft_time_limit
+            logger.warning(f"{task_type} task ({task_id}) exceeded its soft time limit of {time_limit} seconds")
+            try:
+                redis_client.publish_timeout(user_id, task_type, task_id, time_limit=time_limit)
+                finish_flight(task_type, params, task_id, error=f"Task exceeded its time limit of {time_limit} seconds")
+            except Exception as redis_error:
+                logger.error(f"Failed to publish timeout to Redis: {redis_error}")
+            raise
+        except Exception as e:
+            logger.error(f"Error in {task_type} task: {e}", exc_info=True)
+            self.publish_failure(user_id, task_type, task_id, params, str(e))
+            raise
+        finally:
+            # Feed the worker throughput estimates used by admission control and autoscaling
+            record_completion(self.request)
+
+    def execute(self, user_id, params):
+        """Run the task function, streaming what a generator task yields"""
+        if not inspect.isgeneratorfunction(self.run):
+            return self.run(user_id, **params)
+
+        generator = self.run(user_id, **params)
+        last_partial = None
+        while True:
+            try:
+                item = next(generator)
+            except StopIteration as stop:
+                result = stop.value
+                break
+            if isinstance(item, Progress):
+                self.report_progress(item.percent, item.message)
+            elif item is not None:
+                last_partial = item
+                self.report_progress(partial=item)
+        return result if result is not None else last_partial
+
+    def report_progress(self, percent=None, message=None, partial=None):
+        """Stream progress (0-100), a status message and/or a partial result to the user
+
+        Updates are coalesced and published at most once per `progress.min_interval_ms`.
+        Outside a user-facing run (e.g. in a map/reduce chunk) they are ignored.
+        """
+        stream = getattr(self.request, 'progress_stream', None)
+        if stream is not None:
+            stream.update(percent, message, partial)
+
+    def publish_progress(self, user_id, task_type, task_id, progress, partials):
+        """Publish one progress frame"""
+        extra = {"progress": progress}
+        if partials:
+            extra["partial_results"] = partials
+        redis_client.publish_task_result(
+            user_id=user_id,
+            task_id=task_id,
+            task_type=task_type,
+            status="progress",
+            extra=extra
+        )
+
+    def deliver(self, user_id, task_type, task_id, params, result, started, cached=False):
+        """Publish a task's result and share it with the requests coalesced into it
+
+        Args:
+            started (float): Wall-clock time the task started, for `duration_ms`
+        """
+        duration_ms = round((time.time() - started) * 1000, 3)
+        logger.info(f"TASK DONE: {task_type} ({task_id}) in {duration_ms} ms{' (cached)' if cached else ''}")
+
+        extra = {"duration_ms": duration_ms}
+        if cached:
+            extra["cached"] = True
+        redis_client.publish_task_result(
+            user_id=user_id,
+            task_id=task_id,
+            task_type=task_type,
+            result=result,
+            extra=extra
+        )
+
+        # Share the result with identical requests that arrived while this one ran
+        finish_flight(task_type, params, task_id, result=result)
+
+    def split(self, task_type, params):
+        """Cut a splittable task's input into chunk parameters, or None to run it whole"""
+        spec = get_task_spec(task_type)
+        if spec is None or spec.split is None or self.combine is None:
+            return None
+        return spec.split.chunks(params)
+
+    def fan_out(self, user_id, task_type, task_id, params, chunks, started):
+        """Run the chunks of a large input in parallel and reduce them to one published result"""
+        # Chunks stay in the lane the task was dispatched to
+        queue = (self.request.delivery_info or {}).get('routing_key')
+        options = {'queue': queue} if queue else {}
+        chunk_ids = [uuid() for _ in chunks]
+        header = [
+            map_chunk.signature((self.name, user_id, task_id, index, len(chunks), chunk),
+                                task_id=chunk_id, **options)
+            for index, (chunk_id, chunk) in enumerate(zip(chunk_ids, chunks))
+        ]
+        body_id = uuid()
+        body = reduce_chunks.signature((self.name, user_id, task_id, params, started),
+                                       task_id=body_id, **options)
+        body.on_error(fan_out_failed.signature((self.name, user_id, task_id, params)))
+        # Recorded before the chord is sent, so a cancellation can always find its tasks
+        redis_client.client.set(
+            FAN_OUT_KEY.format(task_id=task_id),
+            json.dumps({"task_type": task_type, "task_ids": chunk_ids + [body_id]}),
+            ex=PROGRESS_TTL
+        )
+        chord(header, body).apply_async()
+        logger.info(f"Fanned out {task_type} ({task_id}) into {len(chunks)} chunks")
+
+    def publish_chunk_progress(self, user_id, task_type, task_id, total):
+        """Count a completed chunk and publish the task's progress to its user"""
+        key = f"map_reduce:{task_id}:completed"
+        pipe = redis_client.client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, PROGRESS_TTL)
+        completed = pipe.execute()[0]
+        self.publish_progress(user_id, task_type, task_id, {
+            "percent": round(100 * completed / total, 2),
+            "completed": completed,
+            "total": total,
+        }, None)
+
+    def publish_failure(self, user_id, task_type, task_id, params, error):
+        """Report a failed task to its user and to the requests coalesced into it"""
+        try:
+            redis_client.publish_error(
+                user_id=user_id,
+                task_type=task_type,
+                error_message=error,
+                task_id=task_id
+            )
+            finish_flight(task_type, params, task_id, error=error)
+        except Exception as redis_error:
+            logger.error(f"Failed to publish error to Redis: {redis_error}")
+
+
+@shared_task(bind=True, ignore_result=False)
+def map_chunk(self, task_name, user_id, task_id, index, total, params):
+    """Run one chunk of a fanned-out task; its result is collected by `reduce_chunks`"""
+    task = self.app.tasks[task_name]
+    task_type = task.get_task_type()
+    try:
+        result = task.execute(user_id, params)
+        spec = get_task_spec(task_type)
+        if spec.split.progress:
+            try:
+                task.publish_chunk_progress(user_id, task_type, task_id, total)
+            except Exception as e:
+                logger.warning(f"Failed to publish progress of {task_type} ({task_id}): {e}")
+        return result
+    finally:
+        record_completion(self.request)
+
+
+@shared_task(bind=True, ignore_result=True)
+def reduce_chunks(self, results, task_name, user_id, task_id, params, started):
+    """Combine the chunk results of a fanned-out task and publish the result"""
+    task = self.app.tasks[task_name]
+    task_type = task.get_task_type()
+    try:
+        result = task.combine(params, results)
+        store_cached(task_type, params, result)
+        # Finished: a later cancellation has nothing left to revoke
+        redis_client.client.delete(FAN_OUT_KEY.format(task_id=task_id))
+        task.deliver(user_id, task_type, task_id, params, result, started)
+    except Exception as e:
+        logger.error(f"Error reducing {task_type} task: {e}", exc_info=True)
+        task.publish_failure(user_id, task_type, task_id, params, str(e))
+        raise
+    finally:
+        record_completion(self.request)
+
+
+@shared_task(bind=True, ignore_result=True)
+def fan_out_failed(self, request, exc, traceback, task_name, user_id, task_id, params):
+    """Report a fanned-out task whose chunks failed to its user"""
+    task = self.app.tasks[task_name]
+    task_type = task.get_task_type()
+    redis_client.client.delete(FAN_OUT_KEY.format(task_id=task_id))
+    if redis_client.client.exists(FAN_OUT_CANCELLED_KEY.format(task_id=task_id)):
+        # Its chunks were revoked; the user was told it was cancelled
+        finish_flight(task_type, params, task_id, error="Shared task was cancelled")
+        return
+    logger.error(f"Chunk of {task_type} ({task_id}) failed: {exc}")
+    task.publish_failure(user_id, task_type, task_id, params, str(exc))
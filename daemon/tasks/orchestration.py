@@ -0,0 +1,225 @@
+"""
+Worker-side execution of workflow DAGs declared in `workflow.py`.
+
+The daemon dispatches a workflow as one `run_workflow` task. It records the
+workflow's state in a Redis hash and dispatches the steps without
+dependencies as `workflow_step` tasks. Each step runs its registered task
+function, stores its result in the hash and, in the same transaction,
+decrements the pending-dependency count of the steps that depend on it; the
+step that brings a count to zero dispatches that step. The step that
+completes the last one publishes the workflow result, so intermediate
+results never leave the worker tier. With `step_events`, every completed
+step also publishes a progress frame.
+
+The state hash `workflow:<id>` holds `remaining` (steps not yet completed),
+`pending:<step>` (dependencies a step still waits for), `result:<step>`
+(encoded step results) and `failed` (the first step that failed, or
+`cancelled`, after which no further steps are started). It expires after
+`workflow.ttl_s`. Each step runs under its task type's time limits; a step
+that exceeds one fails the workflow and it is reported as `timeout`.
+"""
+import logging
+import time
+from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.worker.request import Request
+from ..utils.config import config
+from .base import redis_client, record_completion, run_cached
+from .registry import get_task_spec
+from .workflow import WORKFLOW_TASK_TYPE, Workflow
+
+logger = logging.getLogger(__name__)
+
+
+def _key(workflow_id):
+    return f"workflow:{workflow_id}"
+
+
+def _ttl():
+    return int(config.workflow_settings.get('ttl_s', 3600))
+
+
+def dispatch_step(user_id, workflow_id, workflow, step_id, queue, started):
+    """Queue one step of a workflow in the lane the workflow runs in"""
+    options = {'queue': queue} if queue else {}
+    spec = get_task_spec(workflow['steps'][step_id]['task_type'])
+    if spec is not None:
+        options.update(spec.time_limit_options())
+    workflow_step.apply_async((user_id, workflow_id, workflow, step_id, queue, started), **options)
+
+
+def fail_workflow(user_id, workflow_id, step_id, error, time_limit=None):
+    """Mark a workflow failed and report it to the user, once
+
+    With `time_limit`, the step hit that limit and the workflow is reported as `timeout`.
+    """
+    key = _key(workflow_id)
+    if not redis_client.client.hsetnx(key, 'failed', step_id):
+        return
+    redis_client.client.expire(key, _ttl())
+    if time_limit is not None:
+        redis_client.publish_timeout(user_id, WORKFLOW_TASK_TYPE, workflow_id, time_limit=time_limit)
+        return
+    redis_client.publish_error(
+        user_id=user_id,
+        task_type=WORKFLOW_TASK_TYPE,
+        error_message=error,
+        task_id=workflow_id
+    )
+
+
+@shared_task(bind=True, ignore_result=True, task_type=WORKFLOW_TASK_TYPE)
+def run_workflow(self, user_id, workflow):
+    """Record a workflow's state and dispatch the steps that have no dependencies"""
+    workflow_id = self.request.id
+    started = time.time()
+    try:
+        flow = Workflow(workflow['steps'], workflow.get('output'), workflow.get('step_events', False))
+        state = {'remaining': len(flow.steps)}
+        state.update({f'pending:{step_id}': len(deps) for step_id, deps in flow.dependencies.items()})
+        pipe = redis_client.client.pipeline()
+        pipe.hset(_key(workflow_id), mapping=state)
+        pipe.expire(_key(workflow_id), _ttl())
+        pipe.execute()
+
+        # Steps stay in the lane the workflow was dispatched to
+        queue = (self.request.delivery_info or {}).get('routing_key')
+        for step_id in flow.roots:
+            dispatch_step(user_id, workflow_id, workflow, step_id, queue, started)
+        logger.info(f"Started workflow {workflow_id} for user {user_id}: {len(flow.steps)} steps, "
+                    f"{len(flow.roots)} ready")
+    except Exception as e:
+        logger.error(f"Error starting workflow {workflow_id}: {e}", exc_info=True)
+        fail_workflow(user_id, workflow_id, '', f"Failed to start workflow: {e}")
+        raise
+    finally:
+        record_completion(self.request)
+
+
+class WorkflowStepRequest(Request):
+    """Worker-side request of a workflow step, failing its workflow at the hard time limit
+
+    The step is killed with its worker process, so the report is made from
+    the worker's main process instead.
+    """
+
+    def on_timeout(self, soft, timeout):
+        super().on_timeout(soft, timeout)
+        # Soft limits are raised inside the step and reported by workflow_step
+        if soft:
+            return
+
+        user_id, workflow_id, workflow, step_id = self.args[:4]
+        task_type = workflow['steps'][step_id]['task_type']
+        try:
+            fail_workflow(user_id, workflow_id, step_id,
+                          f"Step '{step_id}' ({task_type}) exceeded its time limit of {timeout} seconds",
+                          time_limit=timeout)
+            record_completion(self)
+        except Exception as e:
+            logger.error(f"Failed to report timeout of step {step_id} of workflow {workflow_id}: {e}")
+
+
+@shared_task(bind=True, ignore_result=True, Request='daemon.tasks.orchestration:WorkflowStepRequest')
+def workflow_step(self, user_id, workflow_id, workflow, step_id, queue, started):
+    """Run one step of a workflow and start the steps it unblocks"""
+    flow = Workflow(workflow['steps'], workflow.get('output'), workflow.get('step_events', False))
+    task_type = flow.steps[step_id]['task_type']
+    key = _key(workflow_id)
+    try:
+        dependencies = flow.dependencies[step_id]
+        failed, *encoded = redis_client.raw_client.hmget(
+            key, ['failed'] + [f'result:{dependency}' for dependency in dependencies]
+        )
+        if failed is not None:
+            logger.info(f"Skipping step {step_id} of failed workflow {workflow_id}")
+            return
+        results = {
+            dependency: redis_client.codec.decode(value)
+            for dependency, value in zip(dependencies, encoded)
+        }
+
+        spec = get_task_spec(task_type)
+        params = spec.compile_validator()(flow.resolve_parameters(step_id, results))
+        task = self.app.tasks[spec.celery_task]
+        result, cached = run_cached(task_type, params, lambda: task.execute(user_id, params))
+        logger.info(f"Workflow {workflow_id}: step {step_id} ({task_type}) completed"
+                    f"{' from cache' if cached else ''}")
+
+        advance(user_id, workflow_id, flow, workflow, step_id, result, queue, started)
+    except SoftTimeLimitExceeded:
+        time_limit = (self.request.timelimit or (None, None))[1] or self.app.conf.task_soft_time_limit
+        logger.warning(f"Step {step_id} of workflow {workflow_id} exceeded its soft time limit "
+                       f"of {time_limit} seconds")
+        fail_workflow(user_id, workflow_id, step_id,
+                      f"Step '{step_id}' ({task_type}) exceeded its time limit of {time_limit} seconds",
+                      time_limit=time_limit)
+        raise
+    except Exception as e:
+        logger.error(f"Error in step {step_id} of workflow {workflow_id}: {e}", exc_info=True)
+        fail_workflow(user_id, workflow_id, step_id, f"Step '{step_id}' ({task_type}) failed: {e}")
+        raise
+    finally:
+        record_completion(self.request)
+
+
+def advance(user_id, workflow_id, flow, workflow, step_id, result, queue, started):
+    """Store a step result, start the steps it unblocks and finish the workflow after its last step"""
+    key = _key(workflow_id)
+    dependents = flow.dependents[step_id]
+
+    pipe = redis_client.raw_client.pipeline()
+    pipe.hset(key, f'result:{step_id}', redis_client.codec.encode(result))
+    for dependent in dependents:
+        pipe.hincrby(key, f'pending:{dependent}', -1)
+    pipe.hincrby(key, 'remaining', -1)
+    pipe.expire(key, _ttl())
+    pipe.hget(key, 'failed')
+    replies = pipe.execute()
+    pending = replies[1:1 + len(dependents)]
+    remaining = replies[1 + len(dependents)]
+    # Another step failed or the workflow was cancelled while this one ran
+    if replies[-1] is not None:
+        logger.info(f"Not advancing failed workflow {workflow_id} past step {step_id}")
+        return
+
+    total = len(flow.steps)
+    if flow.step_events:
+        completed = total - remaining
+        redis_client.publish_task_result(
+            user_id=user_id,
+            task_id=workflow_id,
+            task_type=WORKFLOW_TASK_TYPE,
+            status="progress",
+            extra={
+                "progress": {"percent": round(100 * completed / total, 2), "completed": completed, "total": total},
+                "step": {"id": step_id, "task_type": flow.steps[step_id]['task_type'], "result": result},
+            }
+        )
+
+    # Exactly one completed dependency sees a dependent's count reach zero
+    for dependent, count in zip(dependents, pending):
+        if count == 0:
+            dispatch_step(user_id, workflow_id, workflow, dependent, queue, started)
+
+    if remaining == 0:
+        finish(user_id, workflow_id, flow, started)
+
+
+def finish(user_id, workflow_id, flow, started):
+    """Publish the workflow result and drop its state"""
+    key = _key(workflow_id)
+    outputs = [flow.output] if flow.output is not None else flow.sinks
+    encoded = redis_client.raw_client.hmget(key, [f'result:{step_id}' for step_id in outputs])
+    results = {step_id: redis_client.codec.decode(value) for step_id, value in zip(outputs, encoded)}
+
+    duration_ms = round((time.time() - started) * 1000, 3)
+    redis_client.publish_task_result(
+        user_id=user_id,
+        task_id=workflow_id,
+        task_type=WORKFLOW_TASK_TYPE,
+        result=flow.result(results),
+        extra={"duration_ms": duration_ms}
+    )
+    redis_client.client.delete(key)
+    logger.info(f"Workflow {workflow_id} completed in {duration_ms} ms")
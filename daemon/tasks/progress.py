@@ -0,0 +1,70 @@
+"""
+Progress updates and partial results streamed from running tasks.
+
+A task reports progress either by yielding from a generator - `Progress`
+items for progress, anything else as a partial result - or by calling
+`report_progress` on a bound task. Updates go through a `ProgressStream`,
+which publishes at most one frame per `min_interval_ms`: updates arriving
+in between are coalesced, keeping the latest percentage and message and
+every partial result, so a tight loop costs one Redis publish (and one
+WebSocket frame) per interval instead of one per update.
+"""
+import time
+
+
+class Progress:
+    """A progress update yielded by a generator task"""
+
+    def __init__(self, percent=None, message=None):
+        """
+        Args:
+            percent (float): Completion from 0 to 100
+            message (str): Short description of the current step
+        """
+        self.percent = percent
+        self.message = message
+
+
+class ProgressStream:
+    """Coalesce a task's progress updates and partial results into throttled frames"""
+
+    def __init__(self, publish, min_interval_ms=250):
+        """
+        Args:
+            publish (callable): Called as `publish(progress, partial_results)` for each frame
+            min_interval_ms (int): Minimum time between two frames
+        """
+        self.publish = publish
+        self.min_interval = min_interval_ms / 1000
+        self._published_at = None
+        self._percent = None
+        self._message = None
+        self._partials = []
+        self._pending = False
+
+    def update(self, percent=None, message=None, partial=None):
+        """Record an update and publish a frame if the interval has passed since the last one"""
+        if percent is not None:
+            self._percent = round(min(max(float(percent), 0.0), 100.0), 2)
+        if message is not None:
+            self._message = message
+        if partial is not None:
+            self._partials.append(partial)
+        self._pending = True
+
+        if self._published_at is None or time.monotonic() - self._published_at >= self.min_interval:
+            self.flush()
+
+    def flush(self):
+        """Publish the coalesced updates, if any"""
+        if not self._pending:
+            return
+        progress = {}
+        if self._percent is not None:
+            progress['percent'] = self._percent
+        if self._message is not None:
+            progress['message'] = self._message
+        partials, self._partials = self._partials, []
+        self._pending = False
+        self._published_at = time.monotonic()
+        self.publish(progress, partials)
@@ -0,0 +1,221 @@
+"""
+Declarative registry of the tasks that can be submitted through the API.
+
+Each task declares its parameter schema, defaults and Celery target once.
+The daemon compiles the registry into a dispatch table with precompiled
+validators, and the Django backend generates its DRF serializers and the
+OpenAPI task enum from the same declarations.
+"""
+
+
+class TaskValidationError(ValueError):
+    """Raised when task parameters do not match the declared schema"""
+
+
+# Sentinel for parameters without a default value
+REQUIRED = object()
+
+
+class Param:
+    """Declaration of a single task parameter"""
+
+    TYPES = {
+        'integer': int,
+        'string': str,
+    }
+
+    def __init__(self, name, type='string', default=REQUIRED, description='',
+                 max_length=None, min_value=None, max_value=None):
+        if type not in self.TYPES:
+            raise ValueError(f"Unsupported parameter type for '{name}': {type}")
+        self.name = name
+        self.type = type
+        self.default = default
+        self.description = description
+        self.max_length = max_length
+        self.min_value = min_value
+        self.max_value = max_value
+
+    @property
+    def required(self):
+        """Whether the parameter must be supplied by the caller"""
+        return self.default is REQUIRED
+
+    def compile(self):
+        """Build a function that validates and normalizes a single value"""
+        name = self.name
+        python_type = self.TYPES[self.type]
+        max_length = self.max_length
+        min_value = self.min_value
+        max_value = self.max_value
+
+        def validate(value):
+            if python_type is int:
+                # Reject bools and floats with a fractional part, accept numeric strings
+                if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+                    raise TaskValidationError(f"Invalid value for '{name}': expected integer")
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    raise TaskValidationError(f"Invalid value for '{name}': expected integer")
+            elif not isinstance(value, str):
+                raise TaskValidationError(f"Invalid value for '{name}': expected string")
+            elif not value:
+                raise TaskValidationError(f"Missing '{name}' parameter")
+
+            if max_length is not None and len(value) > max_length:
+                raise TaskValidationError(f"'{name}' exceeds maximum length of {max_length}")
+            if min_value is not None and value < min_value:
+                raise TaskValidationError(f"'{name}' must be at least {min_value}")
+            if max_value is not None and value > max_value:
+                raise TaskValidationError(f"'{name}' must be at most {max_value}")
+            return value
+
+        return validate
+
+
+class Split:
+    """Declaration of how a large task input is cut into chunks processed in parallel
+
+    The task runs once per chunk with the chunk in place of the input, and its
+    `combine` function reduces the chunk results, in order, to the final result.
+    """
+
+    def __init__(self, param, chunk_size, progress=True):
+        """
+        Args:
+            param (str): Parameter holding the input to cut (a string or a list)
+            chunk_size (int): Maximum length of a chunk; inputs no longer than
+                this run as a single task
+            progress (bool): Publish a progress frame as each chunk completes
+        """
+        self.param = param
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+    def chunks(self, params):
+        """Cut validated parameters into per-chunk parameters, or None if the input fits in one chunk"""
+        value = params.get(self.param)
+        if value is None or len(value) <= self.chunk_size:
+            return None
+        return [
+            dict(params, **{self.param: value[start:start + self.chunk_size]})
+            for start in range(0, len(value), self.chunk_size)
+        ]
+
+
+class TaskSpec:
+    """Declaration of a task type: its parameters and the Celery task that runs it"""
+
+    def __init__(self, name, description, celery_task, params=(), cacheable=False, cache_ttl=None,
+                 priority=None, single_flight=False, latency_sensitive=False, split=None,
+                 soft_time_limit=None, time_limit=None):
+        """
+        Args:
+            name (str): Task type used by the API and in task envelopes
+            description (str): Human readable description listed by the API
+            celery_task (str): Registered name of the Celery task that runs it
+            params (iterable): Param declarations, in call order
+            cacheable (bool): The task is a pure function of its parameters, so its
+                result may be memoized and served without running it again
+            cache_ttl (int): Seconds a cached result stays valid (default from config)
+            priority (str): Lane used when a submission does not choose one
+                (default: the configured default lane)
+            single_flight (bool): Identical requests arriving while one is running
+                attach to it and receive its result instead of running again
+            latency_sensitive (bool): Workers publish results immediately instead
+                of buffering them for a pipelined flush
+            split (Split): Large inputs fan out across workers in chunks and
+                are reduced to one result
+            soft_time_limit (float): Seconds after which the task is interrupted and
+                reported as timed out (default from config)
+            time_limit (float): Seconds after which the worker process running the
+                task is killed (default from config)
+        """
+        self.name = name
+        self.description = description
+        self.celery_task = celery_task
+        self.params = tuple(params)
+        self.cacheable = cacheable
+        self.cache_ttl = cache_ttl
+        self.priority = priority
+        self.single_flight = single_flight
+        self.latency_sensitive = latency_sensitive
+        self.split = split
+        self.soft_time_limit = soft_time_limit
+        self.time_limit = time_limit
+
+    def time_limit_options(self):
+        """Get the apply_async options for the declared time limits"""
+        options = {}
+        if self.soft_time_limit is not None:
+            options['soft_time_limit'] = self.soft_time_limit
+        if self.time_limit is not None:
+            options['time_limit'] = self.time_limit
+        return options
+
+    def compile_validator(self):
+        """Build a function mapping raw request parameters to validated task kwargs
+
+        The per-parameter checks are resolved once here, so validating a message
+        is a single pass over the declared parameters.
+        """
+        fields = [(param.name, param.default, param.compile()) for param in self.params]
+
+        def validate(parameters):
+            if parameters is None:
+                parameters = {}
+            elif not isinstance(parameters, dict):
+                raise TaskValidationError("Task parameters must be an object")
+
+            validated = {}
+            for name, default, validate_value in fields:
+                value = parameters.get(name)
+                if value is None:
+                    if default is REQUIRED:
+                        raise TaskValidationError(f"Missing '{name}' parameter")
+                    validated[name] = default
+                else:
+                    validated[name] = validate_value(value)
+            return validated
+
+        return validate
+
+
+TASKS = (
+    TaskSpec(
+        name='generate_random_number',
+        description='Generate a random number between a min and max value',
+        celery_task='daemon.tasks.tasks.generate_random_number',
+        params=[
+            Param('min_value', type='integer', default=1),
+            Param('max_value', type='integer', default=100),
+        ],
+        soft_time_limit=5,
+        time_limit=10,
+    ),
+    TaskSpec(
+        name='reverse_string',
+        description='Reverse a given text string',
+        celery_task='daemon.tasks.tasks.reverse_string',
+        params=[
+            Param('text', type='string', max_length=10000),
+        ],
+        cacheable=True,
+        priority='interactive',
+        single_flight=True,
+        latency_sensitive=True,
+        split=Split('text', chunk_size=1000),
+        soft_time_limit=10,
+        time_limit=15,
+    ),
+    # Add more task declarations here
+)
+
+# Task registry - maps task_type to its declaration
+TASK_REGISTRY = {spec.name: spec for spec in TASKS}
+
+
+def get_task_spec(task_type):
+    """Get the declaration for a task type, or None if it is not registered"""
+    return TASK_REGISTRY.get(task_type)
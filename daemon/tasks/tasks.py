@@ -3,34 +3,74 @@ Celery task definitions for the daemon.
 
 This module defines all the async tasks that can be executed by Celery.
 These tasks are imported and executed by the processor.py module.
+
+Tasks derive from `EventTask` (see `base.py`), so each one only computes
+its result payload; publishing, caching and error reporting are shared.
+
+Importing it is cheap: configuration, the Redis connection and the caches
+are set up on first use, so worker children come online without any I/O.
 """
-import json
 import random
-import datetime
 import logging
-from celery import Celery, current_task
+from celery import Celery
 from ..utils.config import config
-from ..utils.redis_client import RedisClient
+from ..utils.priority import PriorityLanes
+from ..utils.compression import KOMBU_COMPRESSION, create_compressor, register_kombu_compression
+from .base import EventTask
+# Registers the tasks that run workflow DAGs
+from . import orchestration  # noqa: F401
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Initialize Redis client
-redis_client = RedisClient()
 
-# Initialize Celery app with config
+def celery_settings():
+    """Celery settings from config.json, resolved when Celery first reads its configuration"""
+    pool = config.redis_pool_settings
+    # Broker and result backend connections follow the same pool limits as RedisClient
+    redis_options = {
+        'max_connections': pool.get('max_connections', 50),
+        'health_check_interval': pool.get('health_check_interval_s', 30),
+        'socket_keepalive': pool.get('socket_keepalive', True),
+        'socket_timeout': pool.get('socket_timeout_s'),
+        'socket_connect_timeout': pool.get('socket_connect_timeout_s', 5),
+    }
+    # Task and result messages above the codec threshold are compressed as well
+    compressor = create_compressor(config.codec_settings)
+    compression = None
+    if compressor is not None:
+        register_kombu_compression(compressor)
+        compression = KOMBU_COMPRESSION
+    return {
+        'broker_url': config.celery_broker_url,
+        'result_backend': config.celery_result_backend,
+        'task_serializer': 'json',
+        'accept_content': ['json'],
+        'result_serializer': 'json',
+        'task_compression': compression,
+        'result_compression': compression,
+        # Defaults for tasks whose declaration sets no time limits
+        'task_soft_time_limit': config.time_limit_settings.get('soft_s'),
+        'task_time_limit': config.time_limit_settings.get('hard_s'),
+        'enable_utc': True,
+        # Tasks sent without a lane go to the default lane's queue
+        'task_default_queue': PriorityLanes(config.priority_settings).get().queue,
+        'broker_transport_options': redis_options,
+        'redis_max_connections': redis_options['max_connections'],
+        'redis_socket_keepalive': redis_options['socket_keepalive'],
+        'redis_socket_timeout': redis_options['socket_timeout'],
+        'redis_socket_connect_timeout': redis_options['socket_connect_timeout'],
+        'redis_backend_health_check_interval': redis_options['health_check_interval'],
+    }
+
+
+# Initialize Celery app; its configuration is loaded lazily
 app = Celery('tasks')
-app.conf.update(
-    broker_url=config.celery_broker_url,
-    result_backend=config.celery_result_backend,
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
-    enable_utc=True,
-)
+app.add_defaults(celery_settings)
 logger.info("Celery app initialized")
 
-@app.task
+
+@app.task(base=EventTask, ignore_result=True)
 def generate_random_number(user_id, min_value=1, max_value=100):
     """
     Example task that generates a random number.
@@ -41,51 +81,17 @@ def generate_random_number(user_id, min_value=1, max_value=100):
         max_value (int): Maximum value for the random number
         
     Returns:
-        dict: Task result with user_id, task_id, and result
+        dict: Result payload published to the user
     """
-    logger.info(f"TASK START: generate_random_number for user {user_id}")
-    logger.info(f"Parameters: min_value={min_value}, max_value={max_value}")
-    
-    try:
-        # Generate random number
-        result = random.randint(int(min_value), int(max_value))
-        logger.info(f"Generated random number: {result}")
-        
-        # Get task ID from Celery
-        task_id = current_task.request.id
-        
-        # Publish result to Redis
-        redis_client.publish_task_result(
-            user_id=user_id,
-            task_id=task_id,
-            task_type="generate_random_number",
-            result={"number": result}
-        )
-        
-        # Return result (stored in Celery's result backend)
-        return {
-            'task_id': task_id,
-            'user_id': user_id,
-            'result': result
-        }
-    except Exception as e:
-        logger.error(f"Error in generate_random_number task: {e}", exc_info=True)
-        
-        # Publish error to Redis
-        try:
-            redis_client.publish_error(
-                user_id=user_id,
-                task_type="generate_random_number",
-                error_message=str(e),
-                task_id=current_task.request.id
-            )
-        except Exception as redis_error:
-            logger.error(f"Failed to publish error to Redis: {redis_error}")
-        
-        # Re-raise the exception
-        raise
+    result = random.randint(int(min_value), int(max_value))
+    logger.info(f"Generated random number: {result}")
+    return {"number": result}
+
+def combine_reversed(params, results):
+    """Reversed chunks in reverse order make the reversed text"""
+    return {"reversed_text": "".join(result["reversed_text"] for result in reversed(results))}
 
-@app.task
+@app.task(base=EventTask, ignore_result=True, combine=staticmethod(combine_reversed))
 def reverse_string(user_id, text):
     """
     Example task that reverses a string.
@@ -95,49 +101,11 @@ def reverse_string(user_id, text):
         text (str): Text to reverse
         
     Returns:
-        dict: Task result with user_id, task_id, and result
+        dict: Result payload published to the user
     """
-    logger.info(f"TASK START: reverse_string for user {user_id}")
-    logger.info(f"Text to reverse: {text}")
-    
-    try:
-        # Simple string reversal
-        result = text[::-1]
-        logger.info(f"Reversed text: {result}")
-        
-        # Get task ID from Celery
-        task_id = current_task.request.id
-        
-        # Publish result to Redis
-        redis_client.publish_task_result(
-            user_id=user_id,
-            task_id=task_id,
-            task_type="reverse_string",
-            result={"reversed_text": result}
-        )
-        
-        # Return result (stored in Celery's result backend)
-        return {
-            'task_id': task_id,
-            'user_id': user_id,
-            'result': result
-        }
-    except Exception as e:
-        logger.error(f"Error in reverse_string task: {e}", exc_info=True)
-        
-        # Publish error to Redis
-        try:
-            redis_client.publish_error(
-                user_id=user_id,
-                task_type="reverse_string",
-                error_message=str(e),
-                task_id=current_task.request.id
-            )
-        except Exception as redis_error:
-            logger.error(f"Failed to publish error to Redis: {redis_error}")
-        
-        # Re-raise the exception
-        raise
+    result = text[::-1]
+    logger.info(f"Reversed text of {len(result)} characters")
+    return {"reversed_text": result}
 
 # Print when module is loaded
 logger.info("Tasks module loaded and tasks registered with Celery")
@@ -0,0 +1,209 @@
+"""
+Declarations of workflows: DAGs of registered tasks with data dependencies.
+
+A workflow is submitted as one request and runs entirely in the worker tier
+(see `orchestration.py`); the user receives its final result and, if asked,
+an event per completed step. Steps are keyed by an id chosen by the client:
+
+    {
+        "steps": {
+            "first": {"task_type": "reverse_string", "parameters": {"text": "hello"}},
+            "second": {"task_type": "reverse_string",
+                       "parameters": {"text": {"$ref": "first.reversed_text"}}}
+        },
+        "output": "second",
+        "step_events": true
+    }
+
+A parameter of the form `{"$ref": "<step>.<field>"}` takes the named field
+of another step's result (`{"$ref": "<step>"}` takes the whole result) and
+makes the step depend on it; `"after": [...]` adds dependencies without
+passing data. `output` names the step whose result is the workflow result;
+without it, a workflow with a single final step returns that step's result
+and otherwise an object mapping each final step to its result.
+"""
+from .registry import TaskValidationError, get_task_spec
+
+# Task type of workflow envelopes sent from the API to the daemon
+WORKFLOW_TASK_TYPE = 'workflow'
+
+REF_KEY = '$ref'
+
+
+class WorkflowValidationError(TaskValidationError):
+    """Raised when a workflow declaration is malformed"""
+
+
+def is_ref(value):
+    """Whether a parameter value refers to another step's result"""
+    return isinstance(value, dict) and REF_KEY in value
+
+
+class Workflow:
+    """A validated workflow DAG"""
+
+    def __init__(self, steps, output=None, step_events=False):
+        """
+        Args:
+            steps (dict): Step id -> {"task_type", "parameters", "after"}
+            output (str): Step whose result is the workflow result
+            step_events (bool): Publish an event to the user as each step completes
+        """
+        self.steps = steps
+        self.output = output
+        self.step_events = step_events
+        self.dependencies = {step_id: self._dependencies(step) for step_id, step in steps.items()}
+        self.dependents = {step_id: [] for step_id in steps}
+        for step_id, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                self.dependents[dependency].append(step_id)
+
+    @staticmethod
+    def _dependencies(step):
+        dependencies = set(step.get('after', []))
+        for value in step['parameters'].values():
+            if is_ref(value):
+                dependencies.add(str(value[REF_KEY]).split('.', 1)[0])
+        return sorted(dependencies)
+
+    @classmethod
+    def from_dict(cls, data, max_steps=None):
+        """Validate a workflow declaration
+
+        Literal parameters are validated against the task declarations here;
+        parameters taken from other steps are validated when the step runs.
+
+        Raises:
+            WorkflowValidationError: If the declaration is malformed, refers to
+                unknown task types or steps, or has a cycle
+        """
+        if not isinstance(data, dict):
+            raise WorkflowValidationError("Workflow must be an object")
+        steps = data.get('steps')
+        if not isinstance(steps, dict) or not steps:
+            raise WorkflowValidationError("Workflow must declare at least one step in 'steps'")
+        if max_steps is not None and len(steps) > max_steps:
+            raise WorkflowValidationError(f"Workflow has {len(steps)} steps, the maximum is {max_steps}")
+
+        normalized = {}
+        for step_id, step in steps.items():
+            if not step_id or '.' in step_id:
+                raise WorkflowValidationError(f"Invalid step id '{step_id}': must be non-empty without '.'")
+            if not isinstance(step, dict):
+                raise WorkflowValidationError(f"Step '{step_id}' must be an object")
+            normalized[step_id] = cls._validate_step(step_id, step, steps)
+
+        output = data.get('output')
+        if output is not None and output not in steps:
+            raise WorkflowValidationError(f"Output step '{output}' is not declared")
+
+        workflow = cls(normalized, output, bool(data.get('step_events', False)))
+        workflow.order()
+        return workflow
+
+    @staticmethod
+    def _validate_step(step_id, step, steps):
+        task_type = step.get('task_type')
+        spec = get_task_spec(task_type)
+        if spec is None:
+            raise WorkflowValidationError(f"Step '{step_id}': unknown task type {task_type}")
+
+        parameters = step.get('parameters') or {}
+        if not isinstance(parameters, dict):
+            raise WorkflowValidationError(f"Step '{step_id}': parameters must be an object")
+        after = step.get('after') or []
+        if not isinstance(after, list) or not all(isinstance(dependency, str) for dependency in after):
+            raise WorkflowValidationError(f"Step '{step_id}': 'after' must be a list of step ids")
+
+        declared = {param.name: param for param in spec.params}
+        for name, value in parameters.items():
+            param = declared.get(name)
+            if param is None:
+                raise WorkflowValidationError(f"Step '{step_id}': unknown parameter '{name}' for {task_type}")
+            if is_ref(value):
+                if not isinstance(value[REF_KEY], str):
+                    raise WorkflowValidationError(f"Step '{step_id}': '{name}' must refer to '<step>.<field>'")
+                source = value[REF_KEY].split('.', 1)[0]
+                if source not in steps:
+                    raise WorkflowValidationError(f"Step '{step_id}': '{name}' refers to unknown step '{source}'")
+            elif value is not None:
+                try:
+                    param.compile()(value)
+                except TaskValidationError as e:
+                    raise WorkflowValidationError(f"Step '{step_id}': {e}")
+        # Required parameters must be given, either literally or from another step
+        for param in spec.params:
+            if param.required and parameters.get(param.name) is None:
+                raise WorkflowValidationError(f"Step '{step_id}': Missing '{param.name}' parameter")
+        for dependency in after:
+            if dependency not in steps:
+                raise WorkflowValidationError(f"Step '{step_id}' runs after unknown step '{dependency}'")
+
+        return {'task_type': task_type, 'parameters': parameters, 'after': list(after)}
+
+    def order(self):
+        """Get the step ids in an order that respects their dependencies
+
+        Raises:
+            WorkflowValidationError: If the dependencies form a cycle
+        """
+        pending = {step_id: len(dependencies) for step_id, dependencies in self.dependencies.items()}
+        ready = [step_id for step_id, count in pending.items() if count == 0]
+        order = []
+        while ready:
+            step_id = ready.pop()
+            order.append(step_id)
+            for dependent in self.dependents[step_id]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self.steps):
+            cycle = sorted(step_id for step_id, count in pending.items() if count)
+            raise WorkflowValidationError(f"Workflow steps form a cycle: {', '.join(cycle)}")
+        return order
+
+    @property
+    def roots(self):
+        """Steps that can start immediately"""
+        return [step_id for step_id, dependencies in self.dependencies.items() if not dependencies]
+
+    @property
+    def sinks(self):
+        """Steps no other step depends on"""
+        return [step_id for step_id, dependents in self.dependents.items() if not dependents]
+
+    def resolve_parameters(self, step_id, results):
+        """Substitute the results of earlier steps into a step's parameters
+
+        Args:
+            results (dict): Step id -> result of every step this one depends on
+
+        Raises:
+            WorkflowValidationError: If a referenced field is missing from a result
+        """
+        parameters = {}
+        for name, value in self.steps[step_id]['parameters'].items():
+            if is_ref(value):
+                source, _, field = str(value[REF_KEY]).partition('.')
+                value = results[source]
+                if field:
+                    if not isinstance(value, dict) or field not in value:
+                        raise WorkflowValidationError(
+                            f"Step '{step_id}': result of '{source}' has no field '{field}'"
+                        )
+                    value = value[field]
+            parameters[name] = value
+        return parameters
+
+    def result(self, results):
+        """Build the workflow result from the results of its steps"""
+        if self.output is not None:
+            return results[self.output]
+        sinks = self.sinks
+        if len(sinks) == 1:
+            return results[sinks[0]]
+        return {step_id: results[step_id] for step_id in sinks}
+
+    def to_dict(self):
+        """Serialize the validated workflow for the task envelope"""
+        return {'steps': self.steps, 'output': self.output, 'step_events': self.step_events}
@@ -1,3 +1,8 @@
 """
 Utility modules for the daemon processor
+
+Modules that the Django API imports as well (codec, compression, claim_check,
+redis_pool, admission, idempotency, priority, cancellation) take their
+section of config.json as arguments instead of reading `config`: the API
+passes the values from its Django settings and the daemon from `config`.
 """
@@ -0,0 +1,132 @@
+"""
+Queue-depth-aware admission control shared by the Django API and the daemon.
+
+The controller periodically samples the length of the Celery broker queues
+and the number of tasks completed by the workers. Once the backlog crosses
+the high watermark it starts rejecting new work until the backlog drains
+below the low watermark, and estimates how long a client should wait
+before retrying from the observed worker throughput.
+"""
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Redis key incremented by the workers every time a task finishes
+COMPLETED_COUNTER_KEY = 'admission:completed'
+
+
+class ThroughputEstimator:
+    """Smoothed tasks-per-second rate derived from samples of a completion counter"""
+
+    def __init__(self):
+        self.completed = None
+        self.sampled_at = 0.0
+        self.rate = 0.0
+
+    def update(self, completed, now):
+        """Record a counter sample taken at `now` (monotonic seconds) and return the rate"""
+        completed = int(completed or 0)
+        if self.completed is not None and now > self.sampled_at:
+            rate = max(completed - self.completed, 0) / (now - self.sampled_at)
+            # Smooth the rate so a single quiet interval does not swing the estimate
+            self.rate = rate if self.rate == 0 else 0.7 * self.rate + 0.3 * rate
+        self.completed = completed
+        self.sampled_at = now
+        return self.rate
+
+
+class AdmissionDecision:
+    """Outcome of an admission check"""
+
+    def __init__(self, admitted, queue_depth=0, throughput=0.0, retry_after=0):
+        self.admitted = admitted
+        self.queue_depth = queue_depth
+        self.throughput = throughput
+        self.retry_after = retry_after
+
+    def __bool__(self):
+        return self.admitted
+
+    def __repr__(self):
+        return (f"AdmissionDecision(admitted={self.admitted}, queue_depth={self.queue_depth}, "
+                f"throughput={self.throughput:.1f}/s, retry_after={self.retry_after})")
+
+
+class AdmissionController:
+    """Decide whether new tasks should be accepted given the current broker backlog"""
+
+    def __init__(self, redis_client, settings=None):
+        """
+        Args:
+            redis_client: Synchronous redis-py client connected to the broker
+            settings (dict): The `admission` section of config.json
+        """
+        settings = settings or {}
+        self.redis = redis_client
+        self.enabled = bool(settings.get('enabled', False))
+        self.queues = list(settings.get('queues', ['celery']))
+        self.high_watermark = int(settings.get('high_watermark', 10000))
+        self.low_watermark = int(settings.get('low_watermark', self.high_watermark // 2))
+        self.sample_interval = settings.get('sample_interval_ms', 500) / 1000
+        self.reject_status = int(settings.get('reject_status', 503))
+        self.min_retry_after = int(settings.get('min_retry_after_s', 1))
+        self.max_retry_after = int(settings.get('max_retry_after_s', 300))
+
+        self._lock = threading.Lock()
+        self._sampled_at = 0.0
+        self._depth = 0
+        self._estimator = ThroughputEstimator()
+        self._throughput = 0.0
+        self._shedding = False
+
+    def _sample(self, now):
+        """Read queue lengths and the completion counter in one round trip"""
+        pipe = self.redis.pipeline(transaction=False)
+        for queue in self.queues:
+            pipe.llen(queue)
+        pipe.get(COMPLETED_COUNTER_KEY)
+        *lengths, completed = pipe.execute()
+
+        self._throughput = self._estimator.update(completed, now)
+        self._depth = sum(lengths)
+        self._sampled_at = now
+
+        # Hysteresis: start shedding at the high watermark, stop at the low one
+        if self._depth >= self.high_watermark:
+            self._shedding = True
+        elif self._depth <= self.low_watermark:
+            self._shedding = False
+
+    def retry_after(self):
+        """Estimate how many seconds the backlog needs to drain below the low watermark"""
+        excess = max(self._depth - self.low_watermark, 0)
+        if self._throughput <= 0:
+            return self.max_retry_after
+        seconds = math.ceil(excess / self._throughput)
+        return min(max(seconds, self.min_retry_after), self.max_retry_after)
+
+    def check(self):
+        """Return an AdmissionDecision for one new task
+
+        Broker state is sampled at most once per `sample_interval_ms`. If the
+        broker cannot be reached the task is admitted, so admission control
+        never becomes a point of failure on its own.
+        """
+        if not self.enabled:
+            return AdmissionDecision(True)
+
+        with self._lock:
+            now = time.monotonic()
+            if now - self._sampled_at >= self.sample_interval:
+                try:
+                    self._sample(now)
+                except Exception as e:
+                    logger.warning(f"Admission control sampling failed, admitting task: {e}")
+                    return AdmissionDecision(True)
+
+            if not self._shedding:
+                return AdmissionDecision(True, self._depth, self._throughput)
+            return AdmissionDecision(False, self._depth, self._throughput, self.retry_after())
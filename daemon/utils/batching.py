@@ -0,0 +1,89 @@
+"""
+Size- and time-bounded buffering shared by the batch dispatcher and the
+buffered result publisher.
+
+Items are collected until `max_items` are waiting or the oldest has waited
+`max_wait_ms`, then handed to a flush callback as one batch. A background
+thread flushes batches that reach their time limit; size-triggered and
+forced flushes happen on the caller's thread. The thread is started on
+first use, so a buffer created before a fork works in the child.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FlushBuffer:
+    """Collect items and flush them in batches by size or age"""
+
+    def __init__(self, flush_batch, max_items=100, max_wait_ms=10, name='flush-buffer'):
+        """
+        Args:
+            flush_batch (callable): Called with a list of `(queued_at, item)` per batch,
+                `queued_at` being the `time.monotonic()` the item was added
+            max_items (int): Flush once this many items are buffered
+            max_wait_ms (float): Flush once the oldest item has waited this long
+            name (str): Name of the timer thread, for logs
+        """
+        self.flush_batch = flush_batch
+        self.max_items = max_items
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def add(self, item, force=False):
+        """Buffer an item, flushing at once if the batch is full or `force` is set"""
+        with self._cond:
+            if self._closed:
+                # Nothing flushes on a timer any more
+                force = True
+            elif self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._buffer.append((time.monotonic(), item))
+            full = len(self._buffer) >= self.max_items
+            if len(self._buffer) == 1:
+                # Wake the timer thread so it starts counting down for this batch
+                self._cond.notify()
+        if force or full:
+            self.flush()
+
+    def flush(self):
+        """Hand everything currently buffered to the flush callback"""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._buffer = self._buffer, []
+            if batch:
+                self.flush_batch(batch)
+
+    def _run(self):
+        """Flush batches whose oldest item has waited `max_wait` seconds"""
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                remaining = self._buffer[0][0] + self.max_wait - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing {self.name} batch: {e}", exc_info=True)
+
+    def close(self):
+        """Stop the timer thread and flush anything still buffered"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
@@ -0,0 +1,50 @@
+"""
+Task ownership and cancellation requests, shared by the Django API and the daemon.
+
+The API records the user that submitted each task under `task_owner:<id>`
+when it queues the task, in the same round trip. A cancellation request
+from the REST API or the WebSocket is accepted only from that user and
+travels to the daemon like a task, as an envelope with `"action": "cancel"`.
+The daemon drops the task if it has not dispatched it yet and revokes it in
+Celery otherwise, terminating it if it is already running. Workers report
+`cancelled` to the user when they discard or terminate a revoked task.
+"""
+# `action` of the envelope asking the daemon to cancel a task
+CANCEL_ACTION = 'cancel'
+
+
+def cancel_envelope(user_id, task_id):
+    """Build the envelope asking the daemon to cancel a task"""
+    return {"action": CANCEL_ACTION, "user_id": user_id, "task_id": task_id}
+
+
+class TaskOwners:
+    """Which user submitted each task, so only they can cancel it"""
+
+    def __init__(self, redis_client, ttl=86400):
+        """
+        Args:
+            redis_client: Synchronous redis-py client (or pipeline, for `record`)
+            ttl (int): Seconds a task can be cancelled after it was submitted
+        """
+        self.redis = redis_client
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(task_id):
+        return f"task_owner:{task_id}"
+
+    def record(self, task_id, user_id, pipe=None):
+        """Record the owner of a task, on `pipe` if given"""
+        (pipe or self.redis).set(self._key(task_id), str(user_id), ex=self.ttl)
+
+    def get(self, task_id):
+        """Get the id of the user that submitted a task, as a string, or None if unknown"""
+        owner = self.redis.get(self._key(task_id))
+        if isinstance(owner, bytes):
+            owner = owner.decode()
+        return owner
+
+    def owns(self, task_id, user_id):
+        """Whether a user submitted a task"""
+        return user_id is not None and self.get(task_id) == str(user_id)
@@ -0,0 +1,110 @@
+"""
+Claim-check offload for large task results.
+
+A result published inline through pub/sub is copied to every subscriber
+connection. Results whose encoded size exceeds `threshold_bytes` are instead
+stored once, under a Redis key with a TTL or in a local spool file, and the
+published envelope only carries a small reference:
+
+    {"user_id": ..., "task_id": ..., "status": "completed",
+     "claim_check": {"store": "redis", "id": "<uuid>", "size": 123456}}
+
+The WebSocket consumer fetches the payload when it delivers the message to
+the owning user. Stored payloads are keyed by user id, and consumers look
+them up with their own user id, so one user cannot fetch another's result.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class ClaimCheck:
+    """Store large results out of band and resolve the references published in their place"""
+
+    def __init__(self, codec, redis_client=None, settings=None):
+        """
+        Args:
+            codec: Codec the payloads are encoded with
+            redis_client: Synchronous redis-py client with decode_responses=False,
+                needed to offload to Redis
+            settings (dict): The `claim_check` section of config.json
+        """
+        settings = settings or {}
+        self.codec = codec
+        self.redis = redis_client
+        self.enabled = bool(settings.get('enabled', True))
+        self.threshold = int(settings.get('threshold_bytes', 65536))
+        self.ttl = int(settings.get('ttl_s', 3600))
+        self.store = settings.get('store', 'redis')
+        if self.store not in ('redis', 'spool'):
+            raise ValueError(f"Unsupported claim-check store: {self.store}")
+        self.spool_dir = settings.get('spool_dir') or os.path.join(os.getcwd(), 'claim_check_spool')
+        self._last_sweep = 0.0
+
+    @staticmethod
+    def _key(user_id, claim_id):
+        return f"claim_check:{user_id}:{claim_id}"
+
+    def _spool_path(self, user_id, claim_id):
+        # Ids are UUIDs; the user id only namespaces the directory
+        return os.path.join(self.spool_dir, str(user_id).replace(os.sep, '_'), f"{claim_id}.bin")
+
+    def offload(self, user_id, result):
+        """Store a result out of band if it is over the size threshold
+
+        Returns:
+            dict or None: The claim-check reference to publish instead of the
+            result, or None if the result is small enough to publish inline.
+        """
+        if not self.enabled or result is None:
+            return None
+        payload = self.codec.encode(result)
+        if len(payload) <= self.threshold:
+            return None
+
+        claim_id = str(uuid.uuid4())
+        if self.store == 'redis':
+            self.redis.set(self._key(user_id, claim_id), payload, ex=self.ttl)
+        else:
+            path = self._spool_path(user_id, claim_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(payload)
+            self.sweep_spool()
+
+        logger.info(f"Offloaded {len(payload)} byte result for user {user_id} to {self.store} ({claim_id})")
+        return {'store': self.store, 'id': claim_id, 'size': len(payload)}
+
+    def _read_spool(self, user_id, claim_id):
+        try:
+            with open(self._spool_path(user_id, claim_id), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def fetch_async(self, redis_client, user_id, reference):
+        """Load the result behind a reference with an asyncio Redis client, or None if it expired"""
+        if reference.get('store') == 'spool':
+            payload = await asyncio.to_thread(self._read_spool, user_id, reference['id'])
+        else:
+            payload = await redis_client.get(self._key(user_id, reference['id']))
+        return None if payload is None else self.codec.decode(payload)
+
+    def sweep_spool(self):
+        """Delete spool files older than the TTL, at most once a minute"""
+        now = time.time()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        for root, _, files in os.walk(self.spool_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if now - os.path.getmtime(path) > self.ttl:
+                        os.remove(path)
+                except OSError:
+                    pass
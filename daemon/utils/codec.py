@@ -0,0 +1,195 @@
+"""
+Wire codec for task and result envelopes.
+
+Envelopes travelling through Redis (task submissions from the API, results
+from the daemon and workers) are encoded by one codec. Each message starts
+with a small header naming the format it was encoded with:
+
+    byte 0   MAGIC (0xED), never the first byte of a JSON document
+    byte 1   header version
+    byte 2   content type (CONTENT_JSON or CONTENT_MSGPACK)
+    byte 3   flags; the low two bits name the compression algorithm
+
+followed by the encoded payload. When `compression` is configured, payloads
+of at least `compression_threshold_bytes` are compressed and flagged; smaller
+ones are sent as they are. Messages without the header are decoded as plain
+JSON, so untagged producers (and messages already queued before an upgrade)
+keep working.
+
+JSON uses orjson when it is installed and the standard library otherwise;
+msgpack needs the `msgpack` package and falls back to JSON without it.
+Readers of tagged messages must use Redis clients created with
+`decode_responses=False`. Result envelopes are published to the channel of
+the user they are addressed to, `<results channel>:<user_id>`.
+"""
+import json
+import logging
+
+from .compression import ALGORITHM_MASK, NONE, create_compressor, decompress
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0xED
+HEADER_VERSION = 1
+HEADER_SIZE = 4
+
+CONTENT_JSON = 1
+CONTENT_MSGPACK = 2
+
+CONTENT_TYPES = {
+    'json': CONTENT_JSON,
+    'msgpack': CONTENT_MSGPACK,
+}
+
+
+class CodecError(ValueError):
+    """Raised when a message cannot be decoded"""
+
+
+def dumps_json(obj):
+    """Serialize to a JSON string, e.g. for WebSocket text frames"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def user_results_channel(results_channel, user_id):
+    """Get the channel the results of one user are published to"""
+    return f"{results_channel}:{user_id}"
+
+
+def truncate_for_log(value, limit=200):
+    """Get the repr of a payload for log lines, cut to `limit` characters"""
+    text = repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+def _json_encode(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def _json_decode(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _msgpack_encode(obj):
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def _msgpack_decode(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+class Codec:
+    """Encode and decode envelopes in the configured format"""
+
+    def __init__(self, format='json', tagged=True, compressor=None):
+        """
+        Args:
+            format (str): 'json' or 'msgpack' for encoding; decoding accepts both
+            tagged (bool): Prefix encoded messages with the versioned header.
+                Untagged messages are plain JSON regardless of `format`.
+            compressor (Compressor): Compresses large payloads of tagged messages
+        """
+        if format not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported codec format: {format}")
+        if format == 'msgpack' and msgpack is None:
+            logger.warning("msgpack is not installed, encoding envelopes as JSON")
+            format = 'json'
+        if format == 'msgpack' and not tagged:
+            raise ValueError("msgpack envelopes must be tagged")
+        self.format = format
+        self.tagged = tagged
+        self.content_type = CONTENT_TYPES[format]
+        self._encode = _msgpack_encode if format == 'msgpack' else _json_encode
+        # The compression flag lives in the header, so untagged messages are never compressed
+        self.compressor = compressor if tagged else None
+
+    def header(self, flags=0):
+        """Get the header prefixed to messages encoded by this codec"""
+        return bytes((MAGIC, HEADER_VERSION, self.content_type, flags))
+
+    def encode(self, obj):
+        """Encode an envelope to bytes"""
+        payload = self._encode(obj)
+        if not self.tagged:
+            return payload
+        flags = NONE
+        if self.compressor is not None:
+            payload, flags = self.compressor.maybe_compress(payload)
+        return self.header(flags) + payload
+
+    def decode(self, data):
+        """Decode an envelope, tagged or plain JSON
+
+        Raises:
+            CodecError: If the message is malformed or uses an unknown version or content type
+        """
+        if data is None:
+            raise CodecError("Empty message")
+        if isinstance(data, str):
+            # Clients with decode_responses=True can only carry plain JSON
+            data = data.encode()
+
+        if not data or data[0] != MAGIC:
+            try:
+                return _json_decode(data)
+            except ValueError as e:
+                raise CodecError(f"Invalid JSON message: {e}") from e
+
+        if len(data) < HEADER_SIZE:
+            raise CodecError("Truncated message header")
+        version, content_type, flags = data[1], data[2], data[3]
+        if version > HEADER_VERSION:
+            raise CodecError(f"Unsupported message version: {version}")
+
+        payload = memoryview(data)[HEADER_SIZE:]
+        try:
+            if flags & ALGORITHM_MASK:
+                payload = decompress(payload, flags & ALGORITHM_MASK)
+            if content_type == CONTENT_JSON:
+                return _json_decode(bytes(payload))
+            if content_type == CONTENT_MSGPACK:
+                if msgpack is None:
+                    raise CodecError("msgpack message received but msgpack is not installed")
+                return _msgpack_decode(payload)
+        except CodecError:
+            raise
+        except Exception as e:
+            raise CodecError(f"Invalid message payload: {e}") from e
+        raise CodecError(f"Unknown content type: {content_type}")
+
+
+_codecs = {}
+
+
+def get_codec(settings=None):
+    """Get the shared codec for the `codec` section of config.json"""
+    settings = settings or {}
+    key = (
+        settings.get('format', 'json'),
+        bool(settings.get('tagged', True)),
+        settings.get('compression'),
+        settings.get('compression_threshold_bytes'),
+        settings.get('compression_level'),
+    )
+    codec = _codecs.get(key)
+    if codec is None:
+        codec = _codecs[key] = Codec(key[0], key[1], create_compressor(settings))
+    return codec
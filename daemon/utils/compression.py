@@ -0,0 +1,118 @@
+"""
+Threshold-based compression for payloads stored in or sent through Redis.
+
+Small messages are left as they are; payloads of at least `threshold_bytes`
+are compressed and flagged so the reader knows to decompress them. The
+codec records the algorithm in the flags byte of its header, and Celery
+messages use a kombu compression scheme with a one-byte flag prefix.
+
+zlib is always available; zstd needs the `zstandard` package.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Algorithm ids stored in the low bits of the codec flags byte
+NONE = 0
+ZLIB = 1
+ZSTD = 2
+ALGORITHM_MASK = 0x03
+
+ALGORITHMS = {
+    'zlib': ZLIB,
+    'zstd': ZSTD,
+}
+
+# Name of the kombu compression scheme used for Celery task and result messages
+KOMBU_COMPRESSION = 'threshold'
+KOMBU_CONTENT_TYPE = 'application/x-threshold-compressed'
+
+
+def compress(data, algorithm_id, level=None):
+    """Compress bytes with the given algorithm id"""
+    if algorithm_id == ZLIB:
+        return zlib.compress(data, -1 if level is None else level)
+    if algorithm_id == ZSTD:
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+    raise ValueError(f"Unknown compression algorithm id: {algorithm_id}")
+
+
+def decompress(data, algorithm_id):
+    """Decompress bytes compressed with the given algorithm id"""
+    if algorithm_id == NONE:
+        return bytes(data)
+    if algorithm_id == ZLIB:
+        return zlib.decompress(data)
+    if algorithm_id == ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd-compressed message received but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"Unknown compression algorithm id: {algorithm_id}")
+
+
+class Compressor:
+    """Compress payloads at or above a size threshold"""
+
+    def __init__(self, algorithm='zlib', threshold_bytes=4096, level=None):
+        """
+        Args:
+            algorithm (str): 'zlib' or 'zstd' (falls back to zlib without zstandard)
+            threshold_bytes (int): Smaller payloads are left uncompressed
+            level (int): Compression level, or None for the algorithm's default
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported compression algorithm: {algorithm}")
+        if algorithm == 'zstd' and zstandard is None:
+            algorithm = 'zlib'
+        self.algorithm = algorithm
+        self.algorithm_id = ALGORITHMS[algorithm]
+        self.threshold = threshold_bytes
+        self.level = level
+
+    def maybe_compress(self, data):
+        """Compress `data` if it is large enough
+
+        Returns:
+            tuple: (payload, algorithm_id), with NONE if left uncompressed
+        """
+        if len(data) < self.threshold:
+            return data, NONE
+        compressed = compress(data, self.algorithm_id, self.level)
+        # Incompressible data is sent as is
+        if len(compressed) >= len(data):
+            return data, NONE
+        return compressed, self.algorithm_id
+
+
+def create_compressor(settings=None):
+    """Create the compressor for a settings dict, or None if compression is off"""
+    settings = settings or {}
+    algorithm = settings.get('compression')
+    if not algorithm:
+        return None
+    return Compressor(
+        algorithm,
+        threshold_bytes=int(settings.get('compression_threshold_bytes', 4096)),
+        level=settings.get('compression_level')
+    )
+
+
+def register_kombu_compression(compressor):
+    """Register the threshold compression scheme with kombu for Celery messages
+
+    Bodies are prefixed with one byte holding the algorithm id, so small
+    messages are not compressed and any worker can decode any message.
+    """
+    from kombu import compression as kombu_compression
+
+    def encode(body):
+        payload, algorithm_id = compressor.maybe_compress(body)
+        return bytes((algorithm_id,)) + payload
+
+    def decode(body):
+        return decompress(memoryview(body)[1:], body[0])
+
+    kombu_compression.register(encode, decode, KOMBU_CONTENT_TYPE, aliases=[KOMBU_COMPRESSION])
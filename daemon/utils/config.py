@@ -1,31 +1,40 @@
 """
 Configuration loader for the daemon processor.
 Handles reading from config.json and provides environment-specific overrides.
+
+config.json is read on first access rather than at import, so importing the
+daemon modules (e.g. in every Celery worker child) does no file I/O. Logging
+is configured by the entry points, not here.
 """
 import os
 import json
 import logging
+import threading
 from pathlib import Path
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class Config:
     """Configuration manager for the daemon processor"""
     _instance = None
-    _config = None
+    _data = None
+    _lock = threading.Lock()
     
     def __new__(cls):
         """Singleton pattern to ensure only one config instance exists"""
         if cls._instance is None:
             cls._instance = super(Config, cls).__new__(cls)
-            cls._instance._load_config()
         return cls._instance
     
+    @property
+    def _config(self):
+        """The parsed configuration, loaded on first use"""
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._load_config()
+        return self._data
+    
     def _load_config(self):
         """Load configuration from JSON file"""
         # Find the project root (where config.json is located)
@@ -36,26 +45,27 @@ class Config:
         
         try:
             with open(config_file) as f:
-                self._config = json.load(f)
+                data = json.load(f)
             logger.info(f"Config loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load config: {e}")
             raise
         
         # Apply any environment variable overrides
-        self._apply_env_overrides()
+        self._apply_env_overrides(data)
+        self._data = data
     
-    def _apply_env_overrides(self):
+    def _apply_env_overrides(self, data):
         """Override configuration with environment variables if available"""
         # Redis host and port can be overridden with environment variables
         if os.environ.get('REDIS_HOST'):
-            self._config['redis']['host'] = os.environ.get('REDIS_HOST')
-            logger.info(f"Overrode Redis host from environment: {self._config['redis']['host']}")
+            data['redis']['host'] = os.environ.get('REDIS_HOST')
+            logger.info(f"Overrode Redis host from environment: {data['redis']['host']}")
             
         if os.environ.get('REDIS_PORT'):
             try:
-                self._config['redis']['port'] = int(os.environ.get('REDIS_PORT'))
-                logger.info(f"Overrode Redis port from environment: {self._config['redis']['port']}")
+                data['redis']['port'] = int(os.environ.get('REDIS_PORT'))
+                logger.info(f"Overrode Redis port from environment: {data['redis']['port']}")
             except ValueError:
                 logger.warning(f"Invalid REDIS_PORT environment variable: {os.environ.get('REDIS_PORT')}")
     
@@ -79,6 +89,221 @@ class Config:
         """Get Redis results queue channel name"""
         return self._config['redis']['channels']['results_queue']
     
+    @property
+    def redis_streams(self):
+        """Get Redis Streams ingestion settings"""
+        return self._config['redis'].get('streams', {})
+
+    @property
+    def redis_streams_enabled(self):
+        """Whether tasks are ingested from a Redis Stream instead of pub/sub"""
+        return bool(self.redis_streams.get('enabled', False))
+
+    @property
+    def redis_tasks_stream(self):
+        """Get Redis tasks stream name"""
+        return self.redis_streams.get('tasks_stream', 'tasks_stream')
+
+    @property
+    def redis_consumer_group(self):
+        """Get the consumer group shared by all daemon instances"""
+        return self.redis_streams.get('consumer_group', 'task_processors')
+
+    @property
+    def redis_stream_batch_size(self):
+        """Get the maximum number of stream entries read per round trip"""
+        return int(self.redis_streams.get('batch_size', 100))
+
+    @property
+    def redis_stream_block_ms(self):
+        """Get how long a stream read blocks waiting for new entries"""
+        return int(self.redis_streams.get('block_ms', 5000))
+
+    @property
+    def redis_stream_claim_idle_ms(self):
+        """Get the idle time after which pending entries are reclaimed"""
+        return int(self.redis_streams.get('claim_idle_ms', 60000))
+
+    @property
+    def redis_stream_maxlen(self):
+        """Get the approximate maximum length of the tasks stream"""
+        return int(self.redis_streams.get('maxlen', 100000))
+
+    @property
+    def daemon_settings(self):
+        """Get daemon tuning settings"""
+        return self._config.get('daemon', {})
+
+    @property
+    def dispatch_batch_enabled(self):
+        """Whether Celery dispatches are collected into micro-batches"""
+        return bool(self.daemon_settings.get('dispatch', {}).get('batch_enabled', False))
+
+    @property
+    def dispatch_batch_max_messages(self):
+        """Get the number of queued tasks that triggers a batch flush"""
+        return int(self.daemon_settings.get('dispatch', {}).get('batch_max_messages', 100))
+
+    @property
+    def dispatch_batch_max_wait_ms(self):
+        """Get the longest a task may wait in a batch before it is flushed"""
+        return float(self.daemon_settings.get('dispatch', {}).get('batch_max_wait_ms', 10))
+
+    @property
+    def asyncio_settings(self):
+        """Get settings for the asyncio task processor"""
+        return self.daemon_settings.get('asyncio', {})
+
+    @property
+    def asyncio_enabled(self):
+        """Whether the daemon runs the asyncio task processor"""
+        return bool(self.asyncio_settings.get('enabled', False))
+
+    @property
+    def asyncio_intake_queue_size(self):
+        """Get the number of raw messages buffered between the reader and validation"""
+        return int(self.asyncio_settings.get('intake_queue_size', 1000))
+
+    @property
+    def asyncio_dispatch_queue_size(self):
+        """Get the number of validated tasks buffered ahead of the dispatchers"""
+        return int(self.asyncio_settings.get('dispatch_queue_size', 1000))
+
+    @property
+    def asyncio_validators(self):
+        """Get the number of concurrent validators"""
+        return int(self.asyncio_settings.get('validators', 4))
+
+    @property
+    def asyncio_dispatchers(self):
+        """Get the number of concurrent Celery dispatchers"""
+        return int(self.asyncio_settings.get('dispatchers', 8))
+
+    @property
+    def supervisor_settings(self):
+        """Get settings for the multi-process supervisor"""
+        return self.daemon_settings.get('supervisor', {})
+
+    @property
+    def supervisor_workers(self):
+        """Get the number of processor workers, 0 meaning one per CPU core"""
+        return int(self.supervisor_settings.get('workers', 0))
+
+    @property
+    def supervisor_queue_size(self):
+        """Get the number of tasks buffered for each worker"""
+        return int(self.supervisor_settings.get('queue_size', 1000))
+
+    @property
+    def supervisor_restart_delay(self):
+        """Get the delay in seconds before a crashed worker is restarted"""
+        return float(self.supervisor_settings.get('restart_delay_s', 1))
+
+    @property
+    def metrics_interval(self):
+        """Get the interval in seconds between daemon metrics reports"""
+        return float(self.daemon_settings.get('metrics_interval_s', 60))
+
+    @property
+    def admission_settings(self):
+        """Get queue-depth admission control settings"""
+        return self._config.get('admission', {})
+
+    @property
+    def idempotency_ttl(self):
+        """Get how long idempotency keys are remembered, in seconds"""
+        return int(self._config.get('idempotency', {}).get('ttl_s', 86400))
+
+    @property
+    def result_cache_settings(self):
+        """Get settings for the task result cache"""
+        return self._config.get('result_cache', {})
+
+    @property
+    def result_cache_enabled(self):
+        """Whether results of cacheable tasks are memoized"""
+        return bool(self.result_cache_settings.get('enabled', True))
+
+    @property
+    def priority_settings(self):
+        """Get priority lane and deadline settings"""
+        return self._config.get('priority', {})
+
+    @property
+    def worker_pool_settings(self):
+        """Get per-task-type worker pool and autoscaling settings"""
+        return self._config.get('worker_pools', {})
+
+    @property
+    def progress_settings(self):
+        """Get settings for streaming task progress and partial results"""
+        return self._config.get('progress', {})
+
+    @property
+    def workflow_settings(self):
+        """Get settings for workflow DAGs run in the worker tier"""
+        return self._config.get('workflow', {})
+
+    @property
+    def time_limit_settings(self):
+        """Get default soft and hard time limits of Celery tasks"""
+        return self._config.get('time_limits', {})
+
+    @property
+    def cancellation_settings(self):
+        """Get settings for task ownership and cancellation"""
+        return self._config.get('cancellation', {})
+
+    @property
+    def single_flight_settings(self):
+        """Get settings for coalescing identical in-flight tasks"""
+        return self._config.get('single_flight', {})
+
+    @property
+    def single_flight_enabled(self):
+        """Whether identical requests of single-flight tasks share one execution"""
+        return bool(self.single_flight_settings.get('enabled', True))
+
+    @property
+    def single_flight_lease_ttl(self):
+        """Seconds a flight is held for its leader task"""
+        return int(self.single_flight_settings.get('lease_ttl_s', 300))
+
+    @property
+    def redis_pool_settings(self):
+        """Get Redis connection pool settings"""
+        return self._config['redis'].get('pool', {})
+
+    @property
+    def result_publisher_settings(self):
+        """Get settings for buffered result publishing in Celery workers"""
+        return self._config.get('result_publisher', {})
+
+    @property
+    def result_publisher_buffered(self):
+        """Whether workers buffer results and publish them in pipelined batches"""
+        return bool(self.result_publisher_settings.get('buffered', False))
+
+    @property
+    def result_publisher_max_messages(self):
+        """Buffered results that trigger a flush"""
+        return int(self.result_publisher_settings.get('max_messages', 100))
+
+    @property
+    def result_publisher_max_wait_ms(self):
+        """Milliseconds a buffered result may wait before it is flushed"""
+        return float(self.result_publisher_settings.get('max_wait_ms', 5))
+
+    @property
+    def codec_settings(self):
+        """Get wire codec settings for task and result envelopes"""
+        return self._config.get('codec', {})
+
+    @property
+    def claim_check_settings(self):
+        """Get settings for offloading large results out of band"""
+        return self._config.get('claim_check', {})
+
     @property
     def celery_broker_url(self):
         """Get Celery broker URL"""
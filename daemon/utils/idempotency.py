@@ -0,0 +1,73 @@
+"""
+Idempotency keys for task submissions, shared by the Django API and the daemon.
+
+A client may send an `Idempotency-Key` header with a task submission. The
+first submission with a given key claims it atomically in Redis together
+with the id of the task it created; repeats within the TTL get the original
+task id and status back instead of creating duplicate work.
+"""
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Longest idempotency key accepted from clients
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+    """Atomic claim and lookup of idempotency keys, scoped per user"""
+
+    def __init__(self, redis_client, ttl=86400):
+        """
+        Args:
+            redis_client: Synchronous redis-py client
+            ttl (int): Seconds a key is remembered after its first use
+        """
+        self.redis = redis_client
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(user_id, idempotency_key):
+        return f"idempotency:{user_id}:{idempotency_key}"
+
+    def get(self, user_id, idempotency_key):
+        """Get the record stored for a key, or None if it is unused"""
+        raw = self.redis.get(self._key(user_id, idempotency_key))
+        return json.loads(raw) if raw else None
+
+    def claim(self, user_id, idempotency_key, task_id, status='submitted'):
+        """Claim a key for a task
+
+        Returns:
+            dict or None: None if the key now belongs to `task_id` (including
+            when it was already claimed for that same task), otherwise the
+            record of the task that claimed it first.
+        """
+        record = json.dumps({'task_id': task_id, 'status': status})
+        key = self._key(user_id, idempotency_key)
+
+        # Retry once in case the existing record expires between SET and GET
+        for _ in range(2):
+            if self.redis.set(key, record, nx=True, ex=self.ttl):
+                return None
+            existing = self.get(user_id, idempotency_key)
+            if existing is not None:
+                return None if existing.get('task_id') == task_id else existing
+        return None
+
+    def update_status(self, user_id, idempotency_key, task_id, status):
+        """Update the status stored for a claimed key, keeping its TTL"""
+        record = json.dumps({'task_id': task_id, 'status': status})
+        self.redis.set(self._key(user_id, idempotency_key), record, xx=True, keepttl=True)
+
+    def release(self, user_id, idempotency_key, task_id=None):
+        """Forget a key, e.g. when the task it claimed could not be queued
+
+        With `task_id`, the key is only forgotten while it is claimed for that task.
+        """
+        if task_id is not None:
+            existing = self.get(user_id, idempotency_key)
+            if existing is None or existing.get('task_id') != task_id:
+                return
+        self.redis.delete(self._key(user_id, idempotency_key))
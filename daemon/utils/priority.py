@@ -0,0 +1,90 @@
+"""
+Priority lanes and deadlines for task submissions, shared by the Django API and the daemon.
+
+Every task runs in a lane. Each lane maps to its own Celery queue, so
+workers can be dedicated to a lane and a burst of batch work never sits in
+front of interactive tasks. A submission may also carry a deadline (a Unix
+timestamp); tasks whose deadline has passed are dropped instead of being
+dispatched, and inside a lane the earliest deadline is dispatched first.
+"""
+import math
+import time
+from datetime import datetime, timezone
+
+
+class Lane:
+    """A priority class and the Celery queue its tasks are routed to"""
+
+    def __init__(self, name, queue, broker_priority=None, rank=0):
+        self.name = name
+        self.queue = queue
+        self.broker_priority = broker_priority
+        # Position in config.json; lanes listed first are dispatched first
+        self.rank = rank
+
+    def apply_async_options(self):
+        """Get the Celery apply_async options routing a task to this lane"""
+        options = {'queue': self.queue}
+        if self.broker_priority is not None:
+            options['priority'] = self.broker_priority
+        return options
+
+
+class PriorityLanes:
+    """The configured lanes, resolved from the `priority` section of config.json"""
+
+    def __init__(self, settings=None):
+        """
+        Args:
+            settings (dict): The `priority` section of config.json
+        """
+        settings = settings or {}
+        lanes = settings.get('lanes') or {'default': {'queue': 'celery'}}
+        self.lanes = {
+            name: Lane(name, lane.get('queue', 'celery'), lane.get('broker_priority'), rank)
+            for rank, (name, lane) in enumerate(lanes.items())
+        }
+        self.default = settings.get('default_lane', 'default')
+        if self.default not in self.lanes:
+            raise ValueError(f"Default priority lane '{self.default}' is not configured")
+        self.max_deadline = settings.get('max_deadline_s', 3600)
+
+    def __contains__(self, name):
+        return name in self.lanes
+
+    @property
+    def names(self):
+        """Names of all configured lanes"""
+        return list(self.lanes)
+
+    @property
+    def queues(self):
+        """Celery queues of all lanes, without duplicates"""
+        return list(dict.fromkeys(lane.queue for lane in self.lanes.values()))
+
+    def get(self, name=None, fallback=None):
+        """Get a lane by name, falling back to `fallback` and then the default lane
+
+        Raises:
+            KeyError: If `name` is given but is not a configured lane
+        """
+        if name:
+            return self.lanes[name]
+        return self.lanes.get(fallback) or self.lanes[self.default]
+
+
+def is_expired(deadline, now=None):
+    """Whether a task deadline (Unix timestamp, or None for no deadline) has passed"""
+    if deadline is None:
+        return False
+    return deadline <= (now if now is not None else time.time())
+
+
+def deadline_sort_key(deadline):
+    """Sort key putting the earliest deadline first and tasks without a deadline last"""
+    return deadline if deadline is not None else math.inf
+
+
+def deadline_to_datetime(deadline):
+    """Convert a deadline to the aware datetime Celery expects for `expires`"""
+    return datetime.fromtimestamp(deadline, tz=timezone.utc)
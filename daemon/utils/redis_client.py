@@ -1,88 +1,174 @@
 """
 Redis client wrapper for the daemon processor.
 Handles connection and pub/sub operations.
+
+The connection is created on first use, so constructing a RedisClient at
+module level costs nothing until a command is actually sent.
 """
-import json
 import logging
+import threading
 import redis
 from .config import config
+from .redis_pool import get_redis
+from .codec import get_codec, user_results_channel
+from .claim_check import ClaimCheck
+from .worker_pools import record_pool_completion
 
 logger = logging.getLogger(__name__)
 
 class RedisClient:
     """Redis client wrapper with connection management and pub/sub capabilities"""
     
-    def __init__(self, host=None, port=None, decode_responses=True):
-        """Initialize Redis client with config or explicit connection details"""
-        self.host = host or config.redis_host
-        self.port = port or config.redis_port
+    def __init__(self, host=None, port=None, decode_responses=True, publisher_factory=None):
+        """Initialize Redis client with config or explicit connection details
+        
+        Nothing is read from config.json and no connection is made until the
+        client is first used.
+        
+        Args:
+            publisher_factory (callable): Returns the BufferedResultPublisher that
+                results go through, or None to publish each result directly
+        """
+        self.publisher_factory = publisher_factory
+        self._host = host
+        self._port = port
         self.decode_responses = decode_responses
-        self.tasks_channel = config.redis_tasks_channel
-        self.results_channel = config.redis_results_channel
         self._client = None
+        self._raw_client = None
+        self._claim_check = None
         self._pubsub = None
-        
-        # Create Redis client
-        self._connect()
+        self._lock = threading.Lock()
+    
+    @property
+    def host(self):
+        """Redis host, from config.json unless given explicitly"""
+        return self._host or config.redis_host
+    
+    @property
+    def port(self):
+        """Redis port, from config.json unless given explicitly"""
+        return self._port or config.redis_port
+    
+    @property
+    def tasks_channel(self):
+        """Tasks pub/sub channel name"""
+        return config.redis_tasks_channel
+    
+    @property
+    def results_channel(self):
+        """Prefix of the per-user results pub/sub channels"""
+        return config.redis_results_channel
+    
+    def user_results_channel(self, user_id):
+        """Results pub/sub channel of one user"""
+        return user_results_channel(self.results_channel, user_id)
+    
+    @property
+    def tasks_stream(self):
+        """Tasks stream name"""
+        return config.redis_tasks_stream
+    
+    @property
+    def consumer_group(self):
+        """Consumer group reading the tasks stream"""
+        return config.redis_consumer_group
     
     def _connect(self):
-        """Establish connection to Redis server"""
+        """Create the redis-py client on the process-wide connection pool"""
+        self._client = get_redis(
+            self.host,
+            self.port,
+            config.redis_pool_settings,
+            decode_responses=self.decode_responses
+        )
+        logger.info(f"Redis client created for {self.host}:{self.port}")
+    
+    def test_connection(self):
+        """Test if Redis connection is working properly"""
         try:
-            self._client = redis.Redis(
-                host=self.host,
-                port=self.port,
-                decode_responses=self.decode_responses
-            )
-            logger.info(f"Redis client created for {self.host}:{self.port}")
-            
-            # Test connection
-            self.test_connection()
+            self.client.ping()
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}")
             raise
-    
-    def test_connection(self):
-        """Test if Redis connection is working properly"""
-        test_key = "daemon_test_key"
-        test_value = "daemon_test_value"
-        
-        # Test SET
-        self._client.set(test_key, test_value)
         
-        # Test GET
-        result = self._client.get(test_key)
+        logger.info("Redis connection test successful")
+    
+    @property
+    def client(self):
+        """Get the underlying redis-py client, creating it on first use"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._connect()
+        return self._client
+    
+    @property
+    def raw_client(self):
+        """Get a client returning bytes, for reading codec-encoded envelopes"""
+        if self._raw_client is None:
+            with self._lock:
+                if self._raw_client is None:
+                    self._raw_client = get_redis(
+                        self.host, self.port, config.redis_pool_settings, decode_responses=False
+                    )
+        return self._raw_client
+    
+    @property
+    def codec(self):
+        """Codec used for task and result envelopes"""
+        return get_codec(config.codec_settings)
+    
+    @property
+    def claim_check(self):
+        """Out-of-band store for results too large to publish inline"""
+        if self._claim_check is None:
+            self._claim_check = ClaimCheck(self.codec, self.raw_client, config.claim_check_settings)
+        return self._claim_check
+    
+    def record_task_completion(self, pool=None):
+        """Count a finished task towards the throughput seen by admission control
         
-        # Clean up
-        self._client.delete(test_key)
+        Args:
+            pool (WorkerPool): Worker pool that ran the task, for its autoscaler
+        """
+        try:
+            record_pool_completion(self.client, pool)
+        except Exception as e:
+            logger.warning(f"Failed to record task completion: {e}")
+    
+    def publish_task_result(self, user_id, task_id, task_type, result=None, status="completed", error=None,
+                            extra=None):
+        """Publish task results to Redis
         
-        if result != test_value:
-            raise ConnectionError(f"Redis test failed. Expected {test_value}, got {result}")
+        Results over the claim-check threshold are stored out of band and
+        replaced by a reference in the published envelope.
+        """
+        try:
+            reference = self.claim_check.offload(user_id, result)
+        except Exception as e:
+            logger.warning(f"Claim-check offload failed, publishing result inline: {e}")
+            reference = None
+        if reference is not None:
+            result = None
+            extra = dict(extra or {}, claim_check=reference)
         
-        logger.info("Redis connection test successful")
-    
-    def publish_task_result(self, user_id, task_id, task_type, result=None, status="completed", error=None):
-        """Publish task results to Redis"""
-        result_data = {
-            "user_id": user_id,
-            "task_id": task_id,
-            "task_type": task_type,
-            "status": status,
-            "timestamp": import_datetime_from_function(),  # Using helper function
-        }
+        result_data = build_result_envelope(user_id, task_id, task_type, result, status, error, extra)
+        # Only the ASGI processes with a socket of this user are subscribed
+        channel = self.user_results_channel(user_id)
         
-        # Add result or error based on status
-        if status == "completed" and result is not None:
-            result_data["result"] = result
-        elif status == "error" and error is not None:
-            result_data["error"] = error
+        # Hand off to the buffered publisher, which pipelines results in batches
+        publisher = self.publisher_factory() if self.publisher_factory else None
+        if publisher is not None:
+            publisher.publish(channel, self.codec.encode(result_data), task_type)
+            return None
         
         # Publish to Redis
         try:
-            publish_result = self._client.publish(
-                self.results_channel,
-                json.dumps(result_data)
+            publish_result = self.client.publish(
+                channel,
+                self.codec.encode(result_data)
             )
-            logger.info(f"Published result to {self.results_channel}: {publish_result}")
+            logger.info(f"Published result to {channel}: {publish_result}")
             return publish_result
         except Exception as e:
             logger.error(f"Failed to publish to Redis: {e}")
@@ -98,10 +184,33 @@ class RedisClient:
             error=error_message
         )
     
+    def publish_cancelled(self, user_id, task_type, task_id, terminated=False):
+        """Convenience method to report a task cancelled at its user's request"""
+        return self.publish_task_result(
+            user_id=user_id,
+            task_id=task_id,
+            task_type=task_type,
+            status="cancelled",
+            extra={"terminated": terminated}
+        )
+    
+    def publish_timeout(self, user_id, task_type, task_id, time_limit=None):
+        """Convenience method to report a task stopped by its time limit"""
+        return self.publish_task_result(
+            user_id=user_id,
+            task_id=task_id,
+            task_type=task_type,
+            status="timeout",
+            extra={"time_limit": time_limit}
+        )
+    
     def create_pubsub(self):
-        """Create and return a pubsub object subscribed to the tasks channel"""
+        """Create and return a pubsub object subscribed to the tasks channel
+        
+        Messages are returned as bytes; decode them with `codec`.
+        """
         if not self._pubsub:
-            self._pubsub = self._client.pubsub()
+            self._pubsub = self.raw_client.pubsub()
             self._pubsub.subscribe(self.tasks_channel)
             logger.info(f"Subscribed to Redis channel: {self.tasks_channel}")
         return self._pubsub
@@ -110,6 +219,97 @@ class RedisClient:
         """Get the current pubsub object or create a new one"""
         return self._pubsub or self.create_pubsub()
 
+    def create_consumer_group(self):
+        """Create the consumer group on the tasks stream if it does not exist yet"""
+        try:
+            self.client.xgroup_create(
+                self.tasks_stream,
+                self.consumer_group,
+                id='0',
+                mkstream=True
+            )
+            logger.info(f"Created consumer group {self.consumer_group} on stream {self.tasks_stream}")
+        except redis.ResponseError as e:
+            # BUSYGROUP means another daemon instance already created it
+            if 'BUSYGROUP' not in str(e):
+                raise
+            logger.info(f"Consumer group {self.consumer_group} already exists on stream {self.tasks_stream}")
+
+    def read_task_batch(self, consumer_name, count, block_ms):
+        """Read up to `count` new entries from the tasks stream for this consumer
+
+        Returns a list of (entry_id, fields) tuples, empty if the read timed out.
+        Entry ids and fields are bytes; the envelope is under b'data'.
+        """
+        response = self.raw_client.xreadgroup(
+            self.consumer_group,
+            consumer_name,
+            {self.tasks_stream: '>'},
+            count=count,
+            block=block_ms
+        )
+        if not response:
+            return []
+        # Response is [(stream_name, [(entry_id, fields), ...])]
+        return response[0][1]
+
+    def claim_stale_tasks(self, consumer_name, min_idle_ms, count):
+        """Take over pending entries whose consumer stopped without acking them
+
+        Returns a list of (entry_id, fields) tuples now owned by this consumer.
+        """
+        response = self.raw_client.xautoclaim(
+            self.tasks_stream,
+            self.consumer_group,
+            consumer_name,
+            min_idle_time=min_idle_ms,
+            start_id='0-0',
+            count=count
+        )
+        # Response is [next_start_id, [(entry_id, fields), ...], (deleted_ids on Redis 7+)]
+        entries = [(entry_id, fields) for entry_id, fields in response[1] if fields]
+
+        # Redis 6.2 returns entries trimmed from the stream with empty fields;
+        # they can never be processed, so drop them from the pending list
+        trimmed = [entry_id for entry_id, fields in response[1] if not fields]
+        if trimmed:
+            self.ack_tasks(trimmed)
+
+        return entries
+
+    def ack_tasks(self, entry_ids):
+        """Acknowledge processed stream entries so they leave the pending list"""
+        if not entry_ids:
+            return 0
+        return self.client.xack(self.tasks_stream, self.consumer_group, *entry_ids)
+
+
+def build_result_envelope(user_id, task_id, task_type, result=None, status="completed", error=None, extra=None):
+    """Build the result message delivered to the user's WebSocket
+    
+    `extra` holds additional top-level fields, such as `cached` for results
+    served from the result cache.
+    """
+    result_data = {
+        "user_id": user_id,
+        "task_id": task_id,
+        "task_type": task_type,
+        "status": status,
+        "timestamp": import_datetime_from_function(),  # Using helper function
+    }
+    
+    # Add result or error based on status
+    if status == "error":
+        if error is not None:
+            result_data["error"] = error
+    elif result is not None:
+        result_data["result"] = result
+    
+    if extra:
+        result_data.update(extra)
+    
+    return result_data
+
 
 def import_datetime_from_function():
     """Helper function to import datetime and return ISO-formatted current time
@@ -0,0 +1,117 @@
+"""
+Shared Redis connection pools for the Django API, the daemon and the workers.
+
+Every Redis client in a process is created through `get_redis` (synchronous)
+or `get_async_redis` (asyncio), which hand out clients backed by one pool
+per server and decoding mode. Clients are cheap; connections are reused
+across requests and tasks, and each pool blocks for up to `pool_timeout_s`
+instead of opening more than `max_connections`, so a process never holds
+more Redis connections than configured.
+
+Pools are safe to use after a fork: redis-py discards a pool's connections
+when it is first used from a different process.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+
+import redis
+import redis.asyncio
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+# Event loop -> its asyncio pools, dropped with the loop or once it is closed
+_loop_pools = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def pool_options(settings=None, asyncio_pool=False):
+    """Translate the `redis.pool` settings into redis-py connection pool arguments"""
+    settings = settings or {}
+    max_connections = settings.get('async_max_connections' if asyncio_pool else 'max_connections')
+    return {
+        'max_connections': int(max_connections or settings.get('max_connections', 50)),
+        'timeout': settings.get('pool_timeout_s', 5),
+        'health_check_interval': settings.get('health_check_interval_s', 30),
+        'socket_keepalive': bool(settings.get('socket_keepalive', True)),
+        'socket_timeout': settings.get('socket_timeout_s'),
+        'socket_connect_timeout': settings.get('socket_connect_timeout_s', 5),
+    }
+
+
+def _get_pool(key, factory, pools=None):
+    pools = _pools if pools is None else pools
+    pool = pools.get(key)
+    if pool is None:
+        with _lock:
+            pool = pools.get(key)
+            if pool is None:
+                pool = pools[key] = factory()
+    return pool
+
+
+def _get_loop_pools(loop):
+    """Get the asyncio pools of an event loop, forgetting those of closed loops"""
+    pools = _loop_pools.get(loop)
+    if pools is None:
+        with _lock:
+            for closed in [other for other in _loop_pools.keys() if other.is_closed()]:
+                del _loop_pools[closed]
+            pools = _loop_pools.setdefault(loop, {})
+    return pools
+
+
+def get_redis(host, port, settings=None, decode_responses=True, db=0):
+    """Get a synchronous client backed by the process-wide pool for this server
+
+    Args:
+        host (str): Redis host
+        port (int): Redis port
+        settings (dict): The `redis.pool` section of config.json
+        decode_responses (bool): Return str instead of bytes
+        db (int): Redis database number
+    """
+    def create_pool():
+        options = pool_options(settings)
+        logger.info(f"Creating Redis connection pool for {host}:{port}/{db} "
+                    f"(max {options['max_connections']} connections)")
+        return redis.BlockingConnectionPool(
+            host=host, port=port, db=db, decode_responses=decode_responses, **options
+        )
+
+    pool = _get_pool(('sync', host, port, db, decode_responses), create_pool)
+    return redis.Redis(connection_pool=pool)
+
+
+def get_async_redis(host, port, settings=None, decode_responses=True, db=0, health_check=True):
+    """Get an asyncio client backed by the pool for this server and the running event loop
+
+    Asyncio connections belong to the loop that opened them, so each event loop
+    gets its own pool, bounded by `async_max_connections`. Pools are dropped
+    when their loop is closed.
+
+    Args:
+        health_check (bool): PING idle connections before reuse. Disable it for
+            subscriptions whose connection a listener is blocked reading, where
+            the PING reply would race the listener's read.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    def create_pool():
+        options = pool_options(settings, asyncio_pool=True)
+        if not health_check:
+            options['health_check_interval'] = 0
+        logger.info(f"Creating asyncio Redis connection pool for {host}:{port}/{db} "
+                    f"(max {options['max_connections']} connections)")
+        return redis.asyncio.BlockingConnectionPool(
+            host=host, port=port, db=db, decode_responses=decode_responses, **options
+        )
+
+    key = ('async', host, port, db, decode_responses, health_check)
+    pool = _get_pool(key, create_pool, _get_loop_pools(loop) if loop is not None else None)
+    return redis.asyncio.Redis(connection_pool=pool)
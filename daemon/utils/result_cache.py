@@ -0,0 +1,153 @@
+"""
+Two-tier memoization cache for the results of deterministic tasks.
+
+Results are keyed by a hash of the task type and its validated parameters.
+Each process keeps a small LRU in front of a Redis tier shared by the
+daemon and all workers: the daemon answers hits without dispatching to
+Celery, and workers store what they compute.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def task_fingerprint(task_type, params):
+    """Stable hash identifying a task type called with specific parameters"""
+    canonical = json.dumps([task_type, params], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    """Per-process LRU in front of a shared Redis cache, with hit/miss counters"""
+
+    def __init__(self, redis_client, max_entries=1024, default_ttl=3600,
+                 max_result_bytes=65536, report_interval=60):
+        """
+        Args:
+            redis_client: Synchronous redis-py client for the shared tier
+            max_entries (int): Size of the local LRU; the least recently used entry is evicted
+            default_ttl (int): Seconds a result stays cached when the task declares no TTL
+            max_result_bytes (int): Larger results are not cached
+            report_interval (float): Seconds between logged statistics
+        """
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_result_bytes = max_result_bytes
+        self.report_interval = report_interval
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_report = time.monotonic()
+        self.counters = {
+            'local_hits': 0,
+            'redis_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+        }
+
+    @staticmethod
+    def _key(task_type, fingerprint):
+        return f"result_cache:{task_type}:{fingerprint}"
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _store_local(self, key, result, expires_at):
+        with self._lock:
+            self._local[key] = (expires_at, result)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def get(self, task_type, params):
+        """Return the cached result for a call, or None on a miss"""
+        key = self._key(task_type, task_fingerprint(task_type, params))
+        now = time.time()
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._local.move_to_end(key)
+                    self.counters['local_hits'] += 1
+                    return result
+                del self._local[key]
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            raw, ttl = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Result cache lookup failed: {e}")
+            raw = None
+
+        if raw is None:
+            self._count('misses')
+            return None
+
+        result = json.loads(raw)
+        # Keep the local copy no longer than the shared one
+        self._store_local(key, result, now + (ttl if ttl and ttl > 0 else self.default_ttl))
+        self._count('redis_hits')
+        return result
+
+    def set(self, task_type, params, result, ttl=None):
+        """Cache the result of a call in both tiers"""
+        ttl = ttl or self.default_ttl
+        encoded = json.dumps(result)
+        if len(encoded) > self.max_result_bytes:
+            return
+        key = self._key(task_type, task_fingerprint(task_type, params))
+        self._store_local(key, result, time.time() + ttl)
+        try:
+            self.redis.set(key, encoded, ex=ttl)
+        except Exception as e:
+            logger.warning(f"Result cache store failed: {e}")
+            return
+        self._count('stores')
+
+    def stats(self):
+        """Get a copy of the hit/miss counters with the overall hit ratio"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['local_entries'] = len(self._local)
+        lookups = stats['local_hits'] + stats['redis_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['local_hits'] + stats['redis_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def report_if_due(self):
+        """Log the counters once per reporting interval"""
+        now = time.monotonic()
+        if now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+        logger.info("Result cache: {local_hits} local hits, {redis_hits} Redis hits, {misses} misses "
+                    "(hit ratio {hit_ratio:.1%}), {stores} stores, {evictions} evictions, "
+                    "{local_entries} local entries".format(**self.stats()))
+
+
+def create_result_cache(redis_client):
+    """Create a result cache configured from config.json, or None if caching is disabled"""
+    # Imported here so the Django backend can import this module without the daemon config
+    from .config import config
+
+    if not config.result_cache_enabled:
+        return None
+    settings = config.result_cache_settings
+    return ResultCache(
+        redis_client,
+        max_entries=int(settings.get('local_max_entries', 1024)),
+        default_ttl=int(settings.get('default_ttl_s', 3600)),
+        max_result_bytes=int(settings.get('max_result_bytes', 65536)),
+        report_interval=config.metrics_interval
+    )
@@ -0,0 +1,82 @@
+"""
+Buffered result publishing for Celery workers.
+
+Instead of one blocking PUBLISH round trip per result, workers buffer
+result envelopes and send them through a single Redis pipeline once
+`max_messages` are waiting or the oldest has waited `max_wait_ms`.
+Latency-sensitive task types are published at once, together with
+whatever is already buffered so results keep their order.
+"""
+import atexit
+import logging
+
+from .batching import FlushBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedResultPublisher:
+    """Collect outgoing messages and publish them in pipelined batches"""
+
+    def __init__(self, redis_client, max_messages=100, max_wait_ms=5, strict_task_types=()):
+        """
+        Args:
+            redis_client: Synchronous redis-py client
+            max_messages (int): Flush once this many messages are buffered
+            max_wait_ms (float): Flush once the oldest message has waited this long
+            strict_task_types (iterable): Task types whose results are published immediately
+        """
+        self.redis = redis_client
+        self.strict_task_types = frozenset(strict_task_types)
+        self._buffer = FlushBuffer(self._publish_batch, max_messages, max_wait_ms, name='result-publisher')
+
+    def publish(self, channel, message, task_type=None):
+        """Buffer a message, or publish it at once if `task_type` is strict"""
+        self._buffer.add((channel, message), force=task_type in self.strict_task_types)
+
+    def flush(self):
+        """Publish everything currently buffered in one pipeline"""
+        self._buffer.flush()
+
+    def _publish_batch(self, batch):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for _, (channel, message) in batch:
+                pipe.publish(channel, message)
+            pipe.execute()
+            logger.debug(f"Published {len(batch)} buffered results")
+            return
+        except Exception as e:
+            logger.error(f"Failed to publish {len(batch)} buffered results in a pipeline, "
+                         f"publishing them one by one: {e}")
+
+        # Users must not lose their results to one failed round trip
+        for _, (channel, message) in batch:
+            try:
+                self.redis.publish(channel, message)
+            except Exception as e:
+                logger.error(f"Failed to publish result to {channel}: {e}")
+
+    def close(self):
+        """Stop the timer thread and publish anything still buffered"""
+        self._buffer.close()
+
+
+def create_result_publisher(redis_client):
+    """Create the result publisher configured in config.json, or None to publish directly
+
+    The publisher is flushed when the process exits.
+    """
+    from .config import config
+    from ..tasks.registry import TASKS
+
+    if not config.result_publisher_buffered:
+        return None
+    publisher = BufferedResultPublisher(
+        redis_client,
+        max_messages=config.result_publisher_max_messages,
+        max_wait_ms=config.result_publisher_max_wait_ms,
+        strict_task_types=[spec.name for spec in TASKS if spec.latency_sensitive]
+    )
+    atexit.register(publisher.close)
+    return publisher
@@ -0,0 +1,179 @@
+"""
+Single-flight coalescing of identical in-flight tasks.
+
+The first request for a task type and parameters becomes the leader of a
+flight and is dispatched to Celery. Identical requests arriving while it
+runs attach to the flight as waiters instead of being dispatched again;
+when the leader's worker finishes it takes the waiter list and publishes
+the same outcome to every waiting user.
+
+Joining and completing a flight are Lua scripts, so a request can never
+attach to a flight after its leader has collected the waiters.
+
+A cancelled request leaves its flight: a waiter is taken off the waiter
+list, and a leader hands the flight to its first waiter, which the daemon
+then dispatches in its place. Each request records the flight it belongs to
+under `single_flight:task:<task_id>`, and each flight keeps its task type,
+parameters and lane so a successor can be dispatched.
+"""
+import json
+import logging
+
+from .result_cache import task_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# KEYS: flight key, waiters key, flight task key, request key.
+# ARGV: task id, waiter record, lease seconds, flight task record
+# Returns nil if the caller became the leader, otherwise the leader's task id
+JOIN_SCRIPT = """
+local leader = redis.call('GET', KEYS[1])
+if leader == ARGV[1] then
+    -- A redelivered leader must not wait on its own flight
+    return leader
+end
+redis.call('HSET', KEYS[4], 'flight', KEYS[1], 'waiter', ARGV[2])
+redis.call('EXPIRE', KEYS[4], ARGV[3])
+if not leader then
+    -- Waiters left by a leader whose lease ran out are served by the new leader
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    redis.call('SET', KEYS[3], ARGV[4], 'EX', ARGV[3])
+    return false
+end
+redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return leader
+"""
+
+# KEYS: flight key, waiters key, flight task key, request key. ARGV: task id, lease seconds
+# Returns {'waiter', flight task record} if the caller left the waiter list, {'leader',
+# flight task record} or {'leader', flight task record, successor record} if it led
+# the flight, or nil
+LEAVE_SCRIPT = """
+local waiter = redis.call('HGET', KEYS[4], 'waiter')
+redis.call('DEL', KEYS[4])
+if not waiter then
+    return false
+end
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    if redis.call('LREM', KEYS[2], 1, waiter) > 0 then
+        return {'waiter', redis.call('GET', KEYS[3])}
+    end
+    return false
+end
+local task = redis.call('GET', KEYS[3])
+local successor = redis.call('LPOP', KEYS[2])
+if not successor then
+    redis.call('DEL', KEYS[1], KEYS[3])
+    return {'leader', task}
+end
+redis.call('SET', KEYS[1], cjson.decode(successor)['task_id'], 'EX', ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+return {'leader', task, successor}
+"""
+
+# KEYS: flight key, waiters key, flight task key. ARGV: leader task id
+# Returns the waiter records if the caller still leads the flight
+COMPLETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return {}
+end
+local waiters = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+return waiters
+"""
+
+
+class SingleFlight:
+    """Coalesce identical requests onto one execution, tracked in Redis"""
+
+    def __init__(self, redis_client, lease_ttl=300):
+        """
+        Args:
+            redis_client: Synchronous redis-py client
+            lease_ttl (int): Seconds a flight is held for its leader. If the
+                leader's worker dies, new requests start a fresh flight once
+                the lease runs out.
+        """
+        self.redis = redis_client
+        self.lease_ttl = lease_ttl
+        self._join = redis_client.register_script(JOIN_SCRIPT)
+        self._complete = redis_client.register_script(COMPLETE_SCRIPT)
+        self._leave = redis_client.register_script(LEAVE_SCRIPT)
+
+    @staticmethod
+    def _flight_keys(key):
+        return [key, f"{key}:waiters", f"{key}:task"]
+
+    @classmethod
+    def _keys(cls, task_type, params):
+        return cls._flight_keys(f"single_flight:{task_type}:{task_fingerprint(task_type, params)}")
+
+    @staticmethod
+    def _request_key(task_id):
+        return f"single_flight:task:{task_id}"
+
+    def join(self, task_type, params, user_id, task_id, lane=None):
+        """Lead a new flight or attach to the one in progress
+
+        Args:
+            lane (str): Priority lane the flight is dispatched to, kept for a successor
+
+        Returns:
+            str or None: None if `task_id` leads the flight and must be
+            dispatched, otherwise the task id of the leader it attached to.
+        """
+        waiter = json.dumps({'user_id': user_id, 'task_id': task_id})
+        task = json.dumps({'task_type': task_type, 'params': params, 'lane': lane})
+        leader = self._join(
+            keys=self._keys(task_type, params) + [self._request_key(task_id)],
+            args=[task_id, waiter, self.lease_ttl, task]
+        )
+        if isinstance(leader, bytes):
+            leader = leader.decode()
+        if leader is None or leader == task_id:
+            return None
+        return leader
+
+    def complete(self, task_type, params, task_id):
+        """End the flight led by `task_id` and take its waiters
+
+        Returns:
+            list: The {user_id, task_id} records of the requests that attached
+            to the flight (empty if `task_id` no longer leads it).
+        """
+        waiters = self._complete(keys=self._keys(task_type, params), args=[task_id])
+        return [json.loads(waiter) for waiter in waiters]
+
+    def leave(self, task_id):
+        """Take a cancelled request out of its flight
+
+        Returns:
+            tuple or None: None if `task_id` is not part of a flight in
+            progress, otherwise `(role, task, successor)`: `role` is 'waiter'
+            or 'leader', `task` the flight's {task_type, params, lane} and
+            `successor` the {user_id, task_id} of the waiter now leading the
+            flight (None unless a leader left and somebody was waiting).
+        """
+        request_key = self._request_key(task_id)
+        flight = self.redis.hget(request_key, 'flight')
+        if flight is None:
+            return None
+        if isinstance(flight, bytes):
+            flight = flight.decode()
+        reply = self._leave(keys=self._flight_keys(flight) + [request_key], args=[task_id, self.lease_ttl])
+        if not reply:
+            return None
+        role, *records = [value.decode() if isinstance(value, bytes) else value for value in reply]
+        task = json.loads(records[0]) if records and records[0] else None
+        successor = json.loads(records[1]) if len(records) > 1 else None
+        return role, task, successor
+
+
+def create_single_flight(redis_client):
+    """Create the single-flight tracker configured in config.json, or None if disabled"""
+    from .config import config
+
+    if not config.single_flight_enabled:
+        return None
+    return SingleFlight(redis_client, lease_ttl=config.single_flight_lease_ttl)
@@ -0,0 +1,121 @@
+"""
+Per-task-type Celery worker pools.
+
+Each pool declared in the `worker_pools` section of config.json runs the
+task types it lists, with its own Celery pool type, concurrency, prefetch
+and max-tasks-per-child. Tasks keep their priority lane: a task in pool
+`fast` dispatched to the `interactive` lane goes to the queue
+`interactive.fast`, and the pool's workers consume one such queue per lane.
+Task types not listed by any pool stay on the plain lane queues, which the
+default pool consumes.
+
+`daemon/pools.py` launches the workers and scales each pool between its
+`min_workers` and `max_workers` from the queue depth and the completion
+counters kept here.
+"""
+from .admission import COMPLETED_COUNTER_KEY
+
+# Redis key incremented by a pool's workers every time a task finishes
+POOL_COMPLETED_KEY = 'worker_pools:completed:{pool}'
+
+POOL_TYPES = ('prefork', 'threads', 'solo', 'gevent', 'eventlet')
+
+
+class WorkerPool:
+    """A pool of Celery workers dedicated to some task types"""
+
+    def __init__(self, name, settings):
+        """
+        Args:
+            name (str): Pool name, used in its queue and worker names
+            settings (dict): The pool's entry in `worker_pools.pools`
+        """
+        self.name = name
+        self.tasks = list(settings.get('tasks', []))
+        self.pool = settings.get('pool', 'prefork')
+        if self.pool not in POOL_TYPES:
+            raise ValueError(f"Unsupported Celery pool type for '{name}': {self.pool}")
+        self.concurrency = int(settings.get('concurrency', 1))
+        self.prefetch_multiplier = int(settings.get('prefetch_multiplier', 4))
+        self.max_tasks_per_child = settings.get('max_tasks_per_child')
+        self.min_workers = int(settings.get('min_workers', 1))
+        self.max_workers = max(int(settings.get('max_workers', self.min_workers)), self.min_workers)
+        self.target_latency = settings.get('target_latency_ms', 1000) / 1000
+        # Filled in by WorkerPools: the lane queues this pool consumes
+        self.queues = []
+
+    @property
+    def completed_key(self):
+        """Redis key counting the tasks this pool has finished"""
+        return POOL_COMPLETED_KEY.format(pool=self.name)
+
+    def worker_args(self, index):
+        """Arguments of `celery worker` for one worker process of this pool"""
+        args = [
+            '-Q', ','.join(self.queues),
+            '--pool', self.pool,
+            '--concurrency', str(self.concurrency),
+            '--prefetch-multiplier', str(self.prefetch_multiplier),
+            '-n', f'{self.name}-{index}@%h',
+        ]
+        # Child recycling only applies to processes
+        if self.max_tasks_per_child and self.pool == 'prefork':
+            args += ['--max-tasks-per-child', str(self.max_tasks_per_child)]
+        return args
+
+
+class WorkerPools:
+    """The configured worker pools and the routing of task types to their queues"""
+
+    def __init__(self, settings=None, lanes=None):
+        """
+        Args:
+            settings (dict): The `worker_pools` section of config.json
+            lanes (PriorityLanes): Priority lanes, whose queues each pool consumes
+        """
+        settings = settings or {}
+        self.enabled = bool(settings.get('enabled', False))
+        self.autoscale_interval = settings.get('autoscale_interval_s', 5)
+        self.scale_down_after = settings.get('scale_down_after_s', 60)
+
+        self.pools = {name: WorkerPool(name, pool) for name, pool in (settings.get('pools') or {}).items()}
+        self.default = settings.get('default_pool')
+        if self.default is not None and self.default not in self.pools:
+            raise ValueError(f"Default worker pool '{self.default}' is not configured")
+
+        self._by_task = {}
+        for pool in self.pools.values():
+            for task_type in pool.tasks:
+                if task_type in self._by_task:
+                    raise ValueError(f"Task type '{task_type}' is assigned to more than one worker pool")
+                self._by_task[task_type] = pool
+
+        lane_queues = lanes.queues if lanes is not None else ['celery']
+        self._by_queue = {}
+        for pool in self.pools.values():
+            if pool.name == self.default:
+                pool.queues = list(lane_queues)
+            else:
+                pool.queues = [f"{queue}.{pool.name}" for queue in lane_queues]
+            for queue in pool.queues:
+                self._by_queue[queue] = pool
+
+    def queue_for(self, task_type, lane):
+        """Get the queue a task type is dispatched to in a lane"""
+        pool = self._by_task.get(task_type) if self.enabled else None
+        if pool is None or pool.name == self.default:
+            return lane.queue
+        return f"{lane.queue}.{pool.name}"
+
+    def pool_for_queue(self, queue):
+        """Get the pool consuming a queue, or None"""
+        return self._by_queue.get(queue) if self.enabled else None
+
+
+def record_pool_completion(redis_client, pool=None):
+    """Count a finished task for admission control and, if given, its worker pool"""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.incr(COMPLETED_COUNTER_KEY)
+    if pool is not None:
+        pipe.incr(pool.completed_key)
+    pipe.execute()
@@ -5,14 +5,14 @@ setup(
     version="0.1.0",
     packages=find_packages(),
     include_package_data=True,
-    python_requires=">=3.8",
+    python_requires=">=3.9",
     description="Event-Driven Architecture Template with Django, React, Celery and Redis",
     author="Juan Del Monte",
     author_email="delmontejuan92@gmail.com",
     url="https://github.com/juandelmonte/eventdriven_template",
     classifiers=[
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],